@@ -2,7 +2,8 @@ import warnings
 import unittest
 from unittest.mock import patch, call
 
-from vasppy.band import Band, handle_occupancy
+import numpy as np
+from vasppy.band import Band, handle_occupancy, handle_occupancies
 
 class BandTestCase( unittest.TestCase ):
     """Tests for procar.Band class"""
@@ -40,5 +41,18 @@ class BandTestCase( unittest.TestCase ):
     def test_handle_occupancy_zeros_occupancies_if_negative_occupancies_is_zero( self ):
         self.assertEqual( handle_occupancy( -0.1, negative_occupancies='zero' ), 0.0 )
 
+    def test_handle_occupancies_warns_once_about_negative_occupancies( self ):
+        with warnings.catch_warnings( record=True ) as w:
+            warnings.simplefilter( 'always' )
+            handle_occupancies( [ -0.1, 1.0, -0.2 ], negative_occupancies='warn' )
+            self.assertEqual( len(w), 1 )
+
+    def test_handle_occupancies_raises_exception_if_negative_occupancies_is_raise( self ):
+        with self.assertRaises( ValueError ):
+            handle_occupancies( [ 1.0, -0.1 ], negative_occupancies='raise' )
+
+    def test_handle_occupancies_zeros_occupancies_if_negative_occupancies_is_zero( self ):
+        np.testing.assert_array_equal( handle_occupancies( [ 1.0, -0.1 ], negative_occupancies='zero' ), [ 1.0, 0.0 ] )
+
 if __name__ == '__main__':
     unittest.main()
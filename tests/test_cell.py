@@ -1,5 +1,5 @@
 import unittest
-from vasppy.cell import angle, rotation_matrix, Cell
+from vasppy.cell import angle, rotation_matrix, Cell, neighbour_pairs, perpendicular_widths
 from unittest.mock import patch, Mock
 import numpy as np
 import math
@@ -120,5 +120,48 @@ class Test_Cell_Support_Functions( unittest.TestCase ):
         axis = np.array( [ 1.0, 1.0, 1.0 ] )
         np.testing.assert_almost_equal( rotation_matrix( axis, angle ), test_matrix )
 
+class Test_NeighbourPairs( unittest.TestCase ):
+
+    def setUp( self ):
+        self.matrix = np.array( [ [ 6.0, 0.0, 0.0 ],
+                                  [ 1.0, 5.0, 0.0 ],
+                                  [ 0.5, 0.5, 7.0 ] ] )
+        self.frac_coords = np.random.random( ( 8, 3 ) )
+
+    def brute_force_pairs( self, frac_coords_i, frac_coords_j, r_max, exclude_self ):
+        pairs = []
+        translations = np.array( [ [ i, j, k ] for i in range( -3, 4 ) 
+                                   for j in range( -3, 4 ) for k in range( -3, 4 ) ] )
+        for i, r_i in enumerate( frac_coords_i ):
+            for j, r_j in enumerate( frac_coords_j ):
+                d = np.linalg.norm( ( r_j + translations - r_i ).dot( self.matrix ), axis=1 )
+                for t, d_ij in zip( translations, d ):
+                    if exclude_self and i == j and not np.any( t ):
+                        continue
+                    if d_ij <= r_max:
+                        pairs.append( ( i, j, round( d_ij, 8 ) ) )
+        return sorted( pairs )
+
+    def test_perpendicular_widths( self ):
+        np.testing.assert_array_almost_equal( perpendicular_widths( np.diag( [ 2.0, 3.0, 4.0 ] ) ), [ 2.0, 3.0, 4.0 ] )
+        cell = Cell( self.matrix )
+        np.testing.assert_array_almost_equal( cell.perpendicular_widths(), 
+            cell.volume() / np.linalg.norm( np.cross( self.matrix[[1,2,0]], self.matrix[[2,0,1]] ), axis=1 ) )
+
+    def test_neighbour_pairs_matches_brute_force( self ):
+        frac_coords_j = np.random.random( ( 5, 3 ) )
+        for r_max in [ 1.5, 2.5, 6.0 ]:
+            for frac_coords_j, exclude_self in [ ( self.frac_coords, True ), ( frac_coords_j, False ) ]:
+                i, j, d = neighbour_pairs( self.matrix, self.frac_coords, frac_coords_j, r_max, exclude_self=exclude_self )
+                self.assertEqual( sorted( zip( i.tolist(), j.tolist(), np.round( d, 8 ).tolist() ) ),
+                                  self.brute_force_pairs( self.frac_coords, frac_coords_j, r_max, exclude_self ) )
+
+    def test_cell_neighbour_pairs( self ):
+        cell = Cell( np.eye( 3 ) * 10.0 )
+        frac_coords = np.array( [ [ 0.05, 0.5, 0.5 ], [ 0.95, 0.5, 0.5 ], [ 0.5, 0.5, 0.5 ] ] )
+        i, j, d = cell.neighbour_pairs( frac_coords, frac_coords, 2.0, exclude_self=True )
+        self.assertEqual( sorted( zip( i.tolist(), j.tolist() ) ), [ ( 0, 1 ), ( 1, 0 ) ] )
+        np.testing.assert_array_almost_equal( d, [ 1.0, 1.0 ] )
+
 if __name__ == '__main__':
     unittest.main() 
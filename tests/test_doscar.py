@@ -0,0 +1,264 @@
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+
+import numpy as np
+from vasppy.doscar import Doscar, parse_numeric_rows, broaden, broadening_kernel, energy_window_rows, detect_layout
+
+def write_doscar( filename, energy, tdos, pdos, efermi=0.5 ):
+    """Write a DOSCAR file with a total DOS array [ energy, columns ] and
+    a projected DOS array [ atom, energy, channels ]."""
+    n_atoms = pdos.shape[0]
+    block_header = '{:16.8f}{:16.8f}{:6d}{:16.8f}{:16.8f}\n'.format(
+        energy[-1], energy[0], len( energy ), efermi, 1.0 )
+    with open( filename, 'w' ) as f:
+        f.write( '{:4d}{:4d}{:4d}{:4d}\n'.format( n_atoms, n_atoms, 1, 0 ) )
+        f.write( '  0.1000000E+02  0.1000000E-09  0.1000000E-09  0.1000000E-09  0.5000000E-15\n' )
+        f.write( '  1.0000000000000000E-004\n' )
+        f.write( '  CAR \n' )
+        f.write( ' test\n' )
+        f.write( block_header )
+        for e, row in zip( energy, tdos ):
+            f.write( '{:12.3f}'.format( e ) + ''.join( '{:12.4E}'.format( v ) for v in row ) + '\n' )
+        for atom in pdos:
+            f.write( block_header )
+            for e, row in zip( energy, atom ):
+                f.write( '{:12.3f}'.format( e ) + ''.join( '{:12.4E}'.format( v ) for v in row ) + '\n' )
+
+class DoscarTestCase( unittest.TestCase ):
+
+    def setUp( self ):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join( self.tmp_dir.name, 'DOSCAR' )
+        self.energy = np.linspace( -2.0, 2.0, 5 )
+        self.tdos = np.arange( 20, dtype=float ).reshape( 5, 4 ) / 10.0
+        self.pdos = np.arange( 3 * 5 * 18, dtype=float ).reshape( 3, 5, 18 ) / 100.0
+        write_doscar( self.filename, self.energy, self.tdos, self.pdos )
+
+    def tearDown( self ):
+        self.tmp_dir.cleanup()
+
+    def test_header_is_read( self ):
+        doscar = Doscar( self.filename )
+        self.assertEqual( doscar.number_of_atoms, 3 )
+        self.assertEqual( doscar.number_of_data_points, 5 )
+        self.assertEqual( doscar.efermi, 0.5 )
+
+    def test_total_dos_is_read( self ):
+        doscar = Doscar( self.filename )
+        np.testing.assert_array_almost_equal( doscar.energy, self.energy )
+        np.testing.assert_array_almost_equal( doscar.tdos.up.values, self.tdos[:,0] )
+        np.testing.assert_array_almost_equal( doscar.tdos.int_down.values, self.tdos[:,3] )
+
+    def test_projected_dos_is_read( self ):
+        doscar = Doscar( self.filename )
+        self.assertEqual( doscar.pdos.shape, ( 3, 5, 9, 2 ) )
+        np.testing.assert_array_almost_equal( doscar.pdos, self.pdos.reshape( 3, 5, 9, 2 ) )
+
+    def test_projected_dos_is_not_read_if_read_pdos_is_False( self ):
+        doscar = Doscar( self.filename, read_pdos=False )
+        self.assertEqual( doscar.pdos, None )
+
+    def test_energy_range_keeps_only_rows_inside_window( self ):
+        doscar = Doscar( self.filename, energy_range=[ -1.5, 1.0 ] )
+        self.assertEqual( doscar.number_of_data_points, 3 )
+        np.testing.assert_array_almost_equal( doscar.energy, [ -1.0, 0.0, 1.0 ] )
+        np.testing.assert_array_almost_equal( doscar.tdos.up.values, self.tdos[1:4,0] )
+        np.testing.assert_array_almost_equal( doscar.pdos, self.pdos.reshape( 3, 5, 9, 2 )[:,1:4] )
+
+    def test_energy_range_without_pdos( self ):
+        doscar = Doscar( self.filename, energy_range=[ 0.0, 10.0 ], read_pdos=False )
+        np.testing.assert_array_almost_equal( doscar.tdos.values[:,1:], self.tdos[2:] )
+        self.assertEqual( doscar.pdos, None )
+
+    def test_energy_range_raises_ValueError_if_empty( self ):
+        with self.assertRaises( ValueError ):
+            Doscar( self.filename, energy_range=[ 3.0, 4.0 ] )
+
+    def test_energy_window_rows( self ):
+        self.assertEqual( energy_window_rows( -2.0, 2.0, 5, [ -1.5, 1.0 ] ), ( 1, 4 ) )
+        self.assertEqual( energy_window_rows( -2.0, 2.0, 5, [ -10.0, 10.0 ] ), ( 0, 5 ) )
+        self.assertEqual( energy_window_rows( -2.0, 2.0, 5, [ 3.0, 4.0 ] ), ( 5, 5 ) )
+
+    def test_channel_index( self ):
+        doscar = Doscar( self.filename, read_pdos=False )
+        np.testing.assert_array_equal( doscar.channel_index(), np.arange( 9 ) )
+        np.testing.assert_array_equal( doscar.channel_index( l='p' ), [ 1, 2, 3 ] )
+        np.testing.assert_array_equal( doscar.channel_index( l='p', m=[ 'x' ] ), [ 3 ] )
+        np.testing.assert_array_equal( doscar.channel_index( l='d', m=[ 'xz', 'xy' ] ), [ 4, 7 ] )
+        with self.assertRaises( ValueError ):
+            doscar.channel_index( l='f' )
+
+    def test_spin_index_raises_ValueError_for_invalid_spin( self ):
+        doscar = Doscar( self.filename, read_pdos=False )
+        with self.assertRaises( ValueError ):
+            doscar.spin_index( 'sideways' )
+
+    def test_species_indices( self ):
+        doscar = Doscar( self.filename, read_pdos=False, species=[ 'Fe', 'O', 'Fe' ] )
+        np.testing.assert_array_equal( doscar.species_indices( 'Fe' ), [ 0, 2 ] )
+        np.testing.assert_array_equal( doscar.species_indices( 'O' ), [ 1 ] )
+
+    def test_pdos_select( self ):
+        doscar = Doscar( self.filename )
+        pdos = self.pdos.reshape( 3, 5, 9, 2 )
+        np.testing.assert_array_almost_equal( doscar.pdos_select(), pdos )
+        np.testing.assert_array_almost_equal( doscar.pdos_select( atoms=[ 0, 2 ], spin='down', l='d' ),
+                                              pdos[ [ 0, 2 ] ][ :, :, 4:9, 1: ] )
+
+    def test_pdos_sum( self ):
+        doscar = Doscar( self.filename )
+        pdos = self.pdos.reshape( 3, 5, 9, 2 )
+        np.testing.assert_array_almost_equal( doscar.pdos_sum(), pdos.sum( axis=( 0, 2, 3 ) ) )
+        np.testing.assert_array_almost_equal( doscar.pdos_sum( atoms=[ 1, 1 ], spin='up', l='p', m=[ 'y', 'z' ] ),
+                                              2.0 * pdos[ 1, :, 1:3, 0 ].sum( axis=1 ) )
+
+    def test_broaden_caches_results( self ):
+        doscar = Doscar( self.filename )
+        broadened = doscar.broaden( 0.5 )
+        self.assertEqual( broadened.shape, ( 3, 5, 9, 2 ) )
+        self.assertIs( doscar.broaden( 0.5 ), broadened )
+        both = doscar.broaden( [ 0.5, 2.0 ], kernel='lorentzian' )
+        self.assertEqual( both.shape, ( 2, 3, 5, 9, 2 ) )
+        np.testing.assert_array_equal( both[1], doscar.broaden( 2.0, kernel='lorentzian' ) )
+        self.assertEqual( doscar.broaden( 0.5, projected=False ).shape, ( 5, 4 ) )
+
+    def test_parse_numeric_rows( self ):
+        lines = [ '  1.0 2.0\n', ' 3.0  -4.0E-01\n' ]
+        np.testing.assert_array_equal( parse_numeric_rows( lines ), np.array( [ [ 1.0, 2.0 ], [ 3.0, -0.4 ] ] ) )
+
+    def test_parse_numeric_rows_raises_ValueError_for_ragged_rows( self ):
+        for lines in [ [ ' 1.0 2.0\n', ' 3.0\n' ], [ ' 1.0 2.0\n', ' 3.0 4.0 5.0 6.0\n' ], [ ' 1.0 2.0\n', '\n' ] ]:
+            with self.assertRaisesRegex( ValueError, 'projected DOS' ):
+                parse_numeric_rows( lines, block='projected DOS' )
+
+class DoscarLayoutTestCase( unittest.TestCase ):
+
+    def setUp( self ):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join( self.tmp_dir.name, 'DOSCAR' )
+        self.energy = np.linspace( -2.0, 2.0, 5 )
+
+    def tearDown( self ):
+        self.tmp_dir.cleanup()
+
+    def test_non_spin_polarised_layout_is_detected( self ):
+        pdos = np.random.random( ( 2, 5, 16 ) )
+        write_doscar( self.filename, self.energy, np.ones( ( 5, 2 ) ), pdos )
+        doscar = Doscar( self.filename )
+        self.assertEqual( ( doscar.ispin, doscar.lmax, doscar.spin_orbit_coupling ), ( 1, 3, False ) )
+        self.assertEqual( list( doscar.tdos.columns ), [ 'energy', 'dos', 'int_dos' ] )
+        np.testing.assert_array_almost_equal( doscar.pdos, pdos.reshape( 2, 5, 16, 1 ), decimal=4 )
+        np.testing.assert_array_almost_equal( doscar.pdos_sum( l='s' ), pdos[:,:,0].sum( axis=0 ), decimal=4 )
+        with self.assertRaises( ValueError ):
+            doscar.pdos_sum( spin='up' )
+
+    def test_non_collinear_layout_is_detected( self ):
+        pdos = np.random.random( ( 2, 5, 36 ) )
+        write_doscar( self.filename, self.energy, np.ones( ( 5, 2 ) ), pdos )
+        doscar = Doscar( self.filename )
+        self.assertEqual( ( doscar.ispin, doscar.lmax, doscar.spin_orbit_coupling ), ( 1, 2, True ) )
+        self.assertEqual( doscar.pdos.shape, ( 2, 5, 9, 4 ) )
+        np.testing.assert_array_almost_equal( doscar.pdos, pdos.reshape( 2, 5, 9, 4 ), decimal=4 )
+        np.testing.assert_array_almost_equal( doscar.pdos_sum(), pdos.reshape( 2, 5, 9, 4 )[...,0].sum( axis=( 0, 2 ) ), 
+                                              decimal=4 )
+        np.testing.assert_array_equal( doscar.spin_index( 'mz' ), [ 3 ] )
+
+    def test_layout_is_detected_without_reading_pdos( self ):
+        write_doscar( self.filename, self.energy, np.ones( ( 5, 2 ) ), np.ones( ( 2, 5, 36 ) ) )
+        doscar = Doscar( self.filename, read_pdos=False, energy_range=[ 0.0, 1.0 ] )
+        self.assertEqual( ( doscar.ispin, doscar.lmax, doscar.spin_orbit_coupling ), ( 1, 2, True ) )
+
+    def test_inconsistent_settings_raise_ValueError( self ):
+        write_doscar( self.filename, self.energy, np.ones( ( 5, 2 ) ), np.ones( ( 2, 5, 9 ) ) )
+        with self.assertRaises( ValueError ):
+            Doscar( self.filename, ispin=2 )
+        with self.assertRaises( ValueError ):
+            Doscar( self.filename, spin_orbit_coupling=True )
+
+    def test_detect_layout( self ):
+        self.assertEqual( detect_layout( '1.0 2.0 3.0 4.0 5.0', ' '.join( [ '0.0' ] * 33 ) ),
+                          { 'ispin': 2, 'spin_orbit_coupling': False, 'lmax': 3 } )
+        self.assertEqual( detect_layout( '1.0 2.0 3.0' ),
+                          { 'ispin': 1, 'spin_orbit_coupling': None, 'lmax': None } )
+        with self.assertRaises( ValueError ):
+            detect_layout( '1.0 2.0 3.0', ' '.join( [ '0.0' ] * 19 ) )
+        with self.assertRaises( ValueError ):
+            detect_layout( '1.0 2.0 3.0 4.0' )
+
+class DoscarCacheTestCase( unittest.TestCase ):
+
+    def setUp( self ):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join( self.tmp_dir.name, 'DOSCAR' )
+        self.pdos = np.arange( 2 * 5 * 18, dtype=float ).reshape( 2, 5, 18 ) / 100.0
+        write_doscar( self.filename, np.linspace( -2.0, 2.0, 5 ), np.ones( ( 5, 4 ) ), self.pdos )
+
+    def tearDown( self ):
+        self.tmp_dir.cleanup()
+
+    def test_cache_is_written_and_reloaded( self ):
+        doscar = Doscar( self.filename, cache=True )
+        self.assertTrue( os.path.isfile( os.path.join( self.filename + '.cache', 'metadata.yaml' ) ) )
+        with patch( 'vasppy.doscar.Doscar.read_lines' ) as mock_read_lines:
+            cached_doscar = Doscar( self.filename, cache=True )
+            mock_read_lines.assert_not_called()
+        self.assertIsInstance( cached_doscar.pdos, np.memmap )
+        np.testing.assert_array_equal( cached_doscar.pdos, doscar.pdos )
+        np.testing.assert_array_equal( cached_doscar.energy, doscar.energy )
+        np.testing.assert_array_equal( cached_doscar.tdos.values, doscar.tdos.values )
+        self.assertEqual( list( cached_doscar.tdos.columns ), list( doscar.tdos.columns ) )
+        self.assertEqual( cached_doscar.number_of_atoms, 2 )
+        self.assertEqual( cached_doscar.efermi, doscar.efermi )
+
+    def test_cache_without_pdos_is_not_used_to_read_pdos( self ):
+        Doscar( self.filename, read_pdos=False, cache=True )
+        self.assertFalse( Doscar( self.filename, read_pdos=False ).read_from_cache( read_pdos=True ) )
+        doscar = Doscar( self.filename, cache=True )
+        np.testing.assert_array_almost_equal( doscar.pdos, self.pdos.reshape( 2, 5, 9, 2 ) )
+
+    def test_cache_is_not_used_for_a_different_energy_range( self ):
+        Doscar( self.filename, cache=True )
+        doscar = Doscar( self.filename, cache=True, energy_range=[ 0.0, 2.0 ] )
+        self.assertEqual( doscar.pdos.shape, ( 2, 3, 9, 2 ) )
+        self.assertFalse( Doscar( self.filename, read_pdos=False ).read_from_cache() )
+
+    def test_cache_is_ignored_if_doscar_changes( self ):
+        doscar = Doscar( self.filename, cache=True )
+        with open( self.filename, 'a' ) as f:
+            f.write( '\n' )
+        self.assertFalse( doscar.read_from_cache() )
+
+class BroadeningTestCase( unittest.TestCase ):
+
+    def test_broadening_kernel_is_normalised( self ):
+        for kernel in [ 'gaussian', 'lorentzian' ]:
+            k = broadening_kernel( kernel, width=0.1, energy_spacing=0.01 )
+            self.assertEqual( len( k ) % 2, 1 )
+            self.assertAlmostEqual( k.sum(), 1.0 )
+            np.testing.assert_array_almost_equal( k, k[::-1] )
+
+    def test_broadening_kernel_raises_ValueError_for_invalid_kernel( self ):
+        with self.assertRaises( ValueError ):
+            broadening_kernel( 'foo', width=0.1, energy_spacing=0.01 )
+
+    def test_broaden_direct_and_fft_agree( self ):
+        dos = np.random.random( ( 4, 200, 3 ) )
+        for kernel in [ 'gaussian', 'lorentzian' ]:
+            k = broadening_kernel( kernel, width=0.05, energy_spacing=0.01, max_half_width=199 )
+            h = len( k ) // 2
+            expected = np.apply_along_axis( lambda v: np.convolve( v, k )[ h : h + 200 ], 1, dos )
+            for fft_threshold in [ 1, 10000 ]:
+                np.testing.assert_array_almost_equal( 
+                    broaden( dos, 0.01, 0.05, kernel=kernel, axis=1, fft_threshold=fft_threshold ), expected )
+
+    def test_broaden_preserves_integral_away_from_edges( self ):
+        dos = np.zeros( 401 )
+        dos[200] = 1.0
+        broadened = broaden( dos, 0.01, [ 0.02, 0.2 ] )
+        self.assertEqual( broadened.shape, ( 2, 401 ) )
+        np.testing.assert_array_almost_equal( broadened.sum( axis=1 ), [ 1.0, 1.0 ] )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from vasppy.msd import ( unwrap_trajectory, frame_displacements, unwrapped_positions, msd_fft, tracer_msd, 
+                         collective_msd, MeanSquaredDisplacement )
+from vasppy.xdatcar import Xdatcar
+
+test_data_dir = 'test_data'
+test_xdatcar_filename = os.path.join( os.path.dirname( __file__ ), test_data_dir, 'XDATCAR_test' )
+
+def brute_force_msd( positions ):
+    n_frames = positions.shape[0]
+    msd = np.zeros( ( n_frames, positions.shape[1] ) )
+    for m in range( n_frames ):
+        dr = positions[m:] - positions[:n_frames-m]
+        msd[m] = np.sum( dr**2, axis=-1 ).mean( axis=0 )
+    return msd
+
+class TestUnwrapTrajectory( unittest.TestCase ):
+
+    def test_unwrap_trajectory_removes_boundary_jumps( self ):
+        true_path = np.array( [ [ [ 0.8, 0.5, 0.1 ] ],
+                                [ [ 0.95, 0.5, -0.05 ] ],
+                                [ [ 1.1, 0.5, -0.2 ] ],
+                                [ [ 1.3, 0.5, -0.3 ] ] ] )
+        wrapped = true_path % 1.0
+        np.testing.assert_array_almost_equal( unwrap_trajectory( wrapped ), true_path )
+
+class TestFrameDisplacements( unittest.TestCase ):
+
+    def test_frame_displacements( self ):
+        frac_coords = np.array( [ [ [ 0.95, 0.5, 0.5 ] ], [ [ 0.05, 0.4, 0.5 ] ], [ [ 0.1, 0.4, 0.5 ] ] ] )
+        lattice = np.diag( [ 10.0, 20.0, 30.0 ] )
+        expected = np.array( [ [ [ 1.0, -2.0, 0.0 ] ], [ [ 0.5, 0.0, 0.0 ] ] ] )
+        np.testing.assert_array_almost_equal( frame_displacements( frac_coords, lattice ), expected )
+
+    def test_frame_displacements_use_the_earlier_frame_lattice( self ):
+        frac_coords = np.array( [ [ [ 0.1, 0.1, 0.1 ] ], [ [ 0.2, 0.1, 0.1 ] ], [ [ 0.3, 0.1, 0.1 ] ] ] )
+        lattices = np.array( [ np.eye( 3 ) * 10.0, np.eye( 3 ) * 20.0, np.eye( 3 ) * 30.0 ] )
+        expected = np.array( [ [ [ 1.0, 0.0, 0.0 ] ], [ [ 2.0, 0.0, 0.0 ] ] ] )
+        np.testing.assert_array_almost_equal( frame_displacements( frac_coords, lattices ), expected )
+
+class TestUnwrappedPositions( unittest.TestCase ):
+
+    def test_unwrapped_positions( self ):
+        frac_coords = np.array( [ [ [ 0.9, 0.5, 0.5 ] ], [ [ 0.1, 0.5, 0.5 ] ], [ [ 0.2, 0.5, 0.5 ] ] ] )
+        lattices = np.array( [ np.eye( 3 ) * 10.0, np.eye( 3 ) * 20.0, np.eye( 3 ) * 20.0 ] )
+        expected = np.array( [ [ [ 9.0, 5.0, 5.0 ] ], [ [ 11.0, 5.0, 5.0 ] ], [ [ 13.0, 5.0, 5.0 ] ] ] )
+        np.testing.assert_array_almost_equal( unwrapped_positions( frac_coords, lattices ), expected )
+        np.testing.assert_array_almost_equal( unwrapped_positions( frac_coords, np.eye( 3 ) * 10.0 ), 
+                                              np.array( [ [ [ 9.0, 5.0, 5.0 ] ], [ [ 11.0, 5.0, 5.0 ] ], [ [ 12.0, 5.0, 5.0 ] ] ] ) )
+
+class TestMSDFunctions( unittest.TestCase ):
+
+    def setUp( self ):
+        rng = np.random.default_rng( 1 )
+        self.positions = np.cumsum( rng.normal( size=( 50, 6, 3 ) ), axis=0 )
+
+    def test_msd_fft_matches_brute_force( self ):
+        np.testing.assert_array_almost_equal( msd_fft( self.positions ),
+                                              brute_force_msd( self.positions ) )
+
+    def test_tracer_msd( self ):
+        np.testing.assert_array_almost_equal( tracer_msd( self.positions ),
+                                              brute_force_msd( self.positions ).mean( axis=1 ) )
+
+    def test_collective_msd( self ):
+        summed = self.positions.sum( axis=1, keepdims=True )
+        expected = brute_force_msd( summed )[:,0] / 6
+        np.testing.assert_array_almost_equal( collective_msd( self.positions ), expected )
+
+class TestMeanSquaredDisplacement( unittest.TestCase ):
+
+    def test_per_species_msd_and_diffusion_coefficient( self ):
+        lattice = np.diag( [ 10.0, 10.0, 10.0 ] )
+        n_frames = 20
+        # species A moves with constant velocity, species B is stationary
+        frac_coords = np.zeros( ( n_frames, 3, 3 ) )
+        frac_coords[:,0,0] = 0.9 + 0.03 * np.arange( n_frames )
+        frac_coords[:,1,1] = 0.5 + 0.03 * np.arange( n_frames )
+        frac_coords[:,2] = 0.25
+        msd = MeanSquaredDisplacement( frac_coords % 1.0, lattice, [ 'A', 'A', 'B' ], timestep=2.0 )
+        self.assertEqual( msd.species, [ 'A', 'B' ] )
+        lags = np.arange( n_frames )
+        np.testing.assert_array_almost_equal( msd.time, 2.0 * lags )
+        np.testing.assert_array_almost_equal( msd.tracer['A'], ( 0.3 * lags )**2 )
+        np.testing.assert_array_almost_equal( msd.tracer['B'], np.zeros( n_frames ) )
+        np.testing.assert_array_almost_equal( msd.collective['A'], ( 0.3 * lags )**2 )
+        d = msd.diffusion_coefficient( 'B' )
+        self.assertAlmostEqual( d, 0.0 )
+
+    def test_variable_cell_lattices( self ):
+        # an atom fixed at the cell centre, in a cell that expands each frame, does not move
+        frac_coords = np.full( ( 4, 1, 3 ), 0.5 )
+        lattices = np.array( [ np.eye( 3 ) * ( 10.0 + i ) for i in range( 4 ) ] )
+        msd = MeanSquaredDisplacement( frac_coords, lattices, [ 'A' ] )
+        np.testing.assert_array_almost_equal( msd.tracer['A'], np.zeros( 4 ) )
+
+    def test_diffusion_coefficient_raises_for_empty_fit_range( self ):
+        msd = MeanSquaredDisplacement( np.zeros( ( 5, 1, 3 ) ), np.eye( 3 ), [ 'A' ] )
+        with self.assertRaises( ValueError ):
+            msd.diffusion_coefficient( 'A', fit_range=( 10.0, 20.0 ) )
+
+    def test_from_xdatcar( self ):
+        xdatcar = Xdatcar()
+        xdatcar.read_from( test_xdatcar_filename )
+        msd = MeanSquaredDisplacement.from_xdatcar( xdatcar, timestep=0.5 )
+        self.assertEqual( msd.species, [ 'Li', 'O' ] )
+        np.testing.assert_array_almost_equal( msd.time, 0.5 * np.arange( 6 ) )
+        # the Li atom crosses the periodic boundary along x, and one O atom along z
+        positions = unwrap_trajectory( xdatcar.frames ) * 4.0
+        np.testing.assert_array_almost_equal( msd.tracer['Li'], brute_force_msd( positions[:,:1] )[:,0] )
+        np.testing.assert_array_almost_equal( msd.tracer['O'], brute_force_msd( positions[:,1:] ).mean( axis=1 ) )
+
+    def test_from_binary_xdatcar( self ):
+        xdatcar = Xdatcar()
+        xdatcar.read_from( test_xdatcar_filename )
+        expected = MeanSquaredDisplacement.from_xdatcar( xdatcar, timestep=0.5 )
+        path = tempfile.mkdtemp()
+        try:
+            xdatcar.write_binary( path, dtype=np.float64 )
+            msd = MeanSquaredDisplacement.from_xdatcar( Xdatcar.from_binary( path ), timestep=0.5 )
+        finally:
+            shutil.rmtree( path )
+        self.assertEqual( msd.species, expected.species )
+        for s in expected.species:
+            np.testing.assert_array_almost_equal( msd.tracer[s], expected.tracer[s] )
+            np.testing.assert_array_almost_equal( msd.collective[s], expected.collective[s] )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
 import os
+import io
+import shutil
+import tempfile
 from vasppy import procar
 import numpy as np
 from unittest.mock import patch, call
@@ -91,6 +94,155 @@ class ProcarTestCase( unittest.TestCase ):
         np.testing.assert_equal( [ b.occupancy for b in pcar._bands ],
                                  [ 1., 1., 1., 1., 1., 1., 1., -0.03191968 ] )
 
+    def test_procar_band_and_k_point_arrays( self ):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pcar = procar.Procar.from_file( test_procar_filename )
+        self.assertEqual( pcar.band_energies.shape, ( 1, 2, 4 ) )
+        np.testing.assert_array_equal( pcar.band_energies[0,1], 
+                                       [ -13.1849117, -13.1849117, -13.16621473, -13.16621472 ] )
+        np.testing.assert_array_equal( pcar.band_occupancies[0,1], [ 1., 1., 1., -0.03191968 ] )
+        np.testing.assert_array_equal( pcar.k_point_frac_coords, 
+                                       [ [ 0.5, 0.25, 0.75 ], [ 0.5, 0.25735294, 0.74264706 ] ] )
+        np.testing.assert_array_equal( pcar.k_point_weights, [ 0.00806452, 0.00806452 ] )
+        np.testing.assert_array_equal( pcar.occupancy[:4], 
+                                       [ [ 1., 1. ], [ 2., 1. ], [ 3., 1. ], [ 4., 1. ] ] )
+
+    def test_x_axis( self ):
+        pcar = procar.Procar()
+        pcar._k_point_frac_coords = np.array( [ [ 0.0, 0.0, 0.0 ], [ 0.5, 0.0, 0.0 ], [ 0.5, 0.5, 0.0 ] ] )
+        pcar._k_point_weights = np.zeros( 3 )
+        reciprocal_lattice = np.identity( 3 ) * 2.0
+        np.testing.assert_array_equal( pcar.x_axis(), [ 0, 1, 2 ] )
+        np.testing.assert_array_equal( pcar.x_axis( reciprocal_lattice ), [ 0.0, 1.0, 2.0 ] )
+
+    def test_weighted_band_structure( self ):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pcar = procar.Procar.from_file( test_procar_filename )
+        wbs = pcar.weighted_band_structure( ions=[ 0, 1 ], orbitals=[ 0 ], scaling=2.0, e_fermi=1.0 )
+        self.assertEqual( wbs.shape, ( 4, 2, 3 ) )
+        np.testing.assert_array_equal( wbs[ :, :, 0 ], [ [ 0, 1 ] ] * 4 )
+        np.testing.assert_array_equal( wbs[ :, :, 1 ], pcar.band_energies[0].T - 1.0 )
+        np.testing.assert_array_almost_equal( wbs[ :, :, 2 ], 
+                                              pcar._data[ :, :, :, [ 0, 1 ], 0 ].sum( axis=( 2, 3 ) ).T * 2.0 )
+
+    def test_print_weighted_band_structure( self ):
+        pcar = procar.Procar()
+        wbs = np.array( [ [ [ 0.0, -1.5, 0.25 ], [ 1.0, -1.0, 0.5 ] ] ] )
+        stream = io.StringIO()
+        with patch( 'vasppy.procar.Procar.weighted_band_structure' ) as mock_wbs:
+            mock_wbs.return_value = wbs
+            pcar.print_weighted_band_structure( stream=stream )
+        self.assertEqual( stream.getvalue(), '# band: 1\n0 -1.5 0.25\n1 -1 0.5\n\n' )
+
+    def test_lazy_procar_reads_projections_on_demand( self ):
+        pcar = procar.Procar.from_file( test_procar_spin_polarised_filename )
+        lazy_pcar = procar.Procar.from_file( test_procar_spin_polarised_filename, lazy=True )
+        np.testing.assert_array_equal( lazy_pcar.band_energies, pcar.band_energies )
+        self.assertEqual( lazy_pcar.number_of_bands, 112 )
+        self.assertEqual( lazy_pcar._projections_loaded.sum(), 0 )
+        np.testing.assert_array_equal( lazy_pcar.projections( k_points=[ 2, 5 ], bands=[ 3 ], ions=[ 0, 25 ] ),
+                                       pcar._data[ [ 2, 5 ] ][ :, [ 3 ] ][ :, :, :, [ 0, 25 ] ] )
+        self.assertEqual( lazy_pcar._projections_loaded.sum(), 4 )
+        np.testing.assert_array_equal( lazy_pcar._data, pcar._data )
+        self.assertTrue( lazy_pcar._projections_loaded.all() )
+
+    def test_from_file_selects_k_points_bands_ions_and_orbitals_while_reading( self ):
+        pcar = procar.Procar.from_file( test_procar_spin_polarised_filename )
+        selection = { 'k_points': [ 1, 6 ], 'bands': range( 10, 20 ), 'ions': [ 3, 0 ], 'orbitals': [ 0, 9 ] }
+        for kwargs in [ {}, { 'lazy': True } ]:
+            selected_pcar = procar.Procar.from_file( test_procar_spin_polarised_filename, **selection, **kwargs )
+            self.assertEqual( selected_pcar.number_of_k_points, 2 )
+            self.assertEqual( selected_pcar.number_of_bands, 10 )
+            self.assertEqual( selected_pcar.number_of_ions, 2 )
+            self.assertEqual( selected_pcar.number_of_projections, 2 )
+            self.assertEqual( selected_pcar.spin_channels, 2 )
+            np.testing.assert_array_equal( selected_pcar._data, 
+                pcar._data[ [ 1, 6 ] ][ :, 10:20 ][ :, :, :, [ 0, 3, 25 ] ][ :, :, :, :, [ 0, 9 ] ] )
+            np.testing.assert_array_equal( selected_pcar.band_energies, pcar.band_energies[ :, [ 1, 6 ], 10:20 ] )
+            np.testing.assert_array_equal( selected_pcar.k_point_frac_coords, pcar.k_point_frac_coords[ [ 1, 6 ] ] )
+            self.assertEqual( [ b.index for b in selected_pcar.bands[0,0] ], list( range( 11, 21 ) ) )
+
+    def test_from_file_raises_ValueError_for_out_of_range_selection( self ):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join( tmp_dir, 'PROCAR' )
+            shutil.copy( test_procar_spin_polarised_filename, filename )
+            for selection in [ { 'k_points': [ 8 ] }, { 'bands': [ 0, 112 ] }, { 'ions': [ -1 ] } ]:
+                for cache in [ False, True ]:
+                    with self.assertRaises( ValueError ):
+                        procar.Procar.from_file( filename, cache=cache, **selection )
+
+    def test_from_file_selects_zero_weighted_k_points_while_reading( self ):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join( tmp_dir, 'PROCAR' )
+            with open( test_procar_filename ) as f:
+                procar_string = f.read()
+            with open( filename, 'w' ) as f:
+                f.write( procar_string.replace( '0.74264706     weight = 0.00806452', '0.74264706     weight = 0.00000000' ) )
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                pcar = procar.Procar.from_file( filename )
+                selected_pcar = procar.Procar.from_file( filename, select_zero_weighted_k_points=True )
+                cached_pcar = procar.Procar.from_file( filename, select_zero_weighted_k_points=True, cache=True )
+        for p in [ selected_pcar, cached_pcar ]:
+            self.assertEqual( p.number_of_k_points, 1 )
+            np.testing.assert_array_equal( p._data, pcar._data[ [ 1 ] ] )
+            np.testing.assert_array_equal( p.k_point_weights, [ 0.0 ] )
+
+    def test_select_k_points( self ):
+        pcar = procar.Procar.from_file( test_procar_spin_polarised_filename )
+        selected_pcar = pcar.select_k_points( [ 3, 1 ] )
+        self.assertEqual( selected_pcar.number_of_k_points, 2 )
+        np.testing.assert_array_equal( selected_pcar._data, pcar._data[ [ 3, 1 ] ] )
+        np.testing.assert_array_equal( selected_pcar.band_energies, pcar.band_energies[ :, [ 3, 1 ] ] )
+        self.assertEqual( [ k.index for k in selected_pcar.k_points ], [ 1, 2 ] )
+
+    def test_effective_masses( self ):
+        pcar = procar.Procar()
+        pcar._number_of_bands = 2
+        pcar._k_point_blocks = 1
+        pcar._k_point_frac_coords = np.array( [ [ 0.0, 0.0, 0.0 ], [ 0.1, 0.0, 0.0 ], 
+                                                [ 0.2, 0.0, 0.0 ], [ 0.3, 0.0, 0.0 ], [ 0.0, 0.1, 0.0 ] ] )
+        reciprocal_lattice = np.identity( 3 )
+        cart_k_points = pcar._k_point_frac_coords * 2 * np.pi * procar.angstrom_to_bohr
+        k_squared = np.sum( cart_k_points**2, axis=1 )
+        pcar._band_energies = np.array( [ np.stack( [ k_squared * 2.0, 1.0 - k_squared * 3.0 ], axis=1 ) ] )
+        masses = pcar.effective_masses( [ [ 1, 2, 3, 4 ], [ 1, 5 ], [ 1, 2, 3 ] ], reciprocal_lattice )
+        self.assertEqual( masses.shape, ( 3, 2 ) )
+        for i, segment in enumerate( [ [ 1, 2, 3, 4 ], [ 1, 5 ], [ 1, 2, 3 ] ] ):
+            k = np.array( segment ) - 1
+            for b in range( 2 ):
+                if len( segment ) == 2:
+                    expected = procar.two_point_effective_mass( cart_k_points[ k ], pcar._band_energies[ 0, k, b ] )
+                else:
+                    expected = procar.least_squares_effective_mass( cart_k_points[ k ], pcar._band_energies[ 0, k, b ] )
+                self.assertAlmostEqual( masses[ i, b ], expected )
+        self.assertAlmostEqual( pcar.effective_mass_calc( [ 1, 2, 3 ], 2, reciprocal_lattice ), masses[ 2, 1 ] )
+
+    def test_effective_masses_raises_ValueError_if_k_points_are_not_collinear( self ):
+        pcar = procar.Procar()
+        pcar._number_of_bands = 1
+        pcar._k_point_frac_coords = np.array( [ [ 0.0, 0.0, 0.0 ], [ 0.1, 0.0, 0.0 ], [ 0.1, 0.1, 0.0 ] ] )
+        pcar._band_energies = np.zeros( ( 1, 3, 1 ) )
+        with self.assertRaises( ValueError ):
+            pcar.effective_masses( [ [ 1, 2, 3 ] ], np.identity( 3 ) )
+
+    def test_effective_masses_raises_ValueError_for_invalid_spin( self ):
+        pcar = procar.Procar()
+        pcar._number_of_bands = 1
+        pcar._k_point_frac_coords = np.array( [ [ 0.0, 0.0, 0.0 ], [ 0.1, 0.0, 0.0 ] ] )
+        pcar._band_energies = np.zeros( ( 2, 2, 1 ) )
+        for spin in [ 0, 3 ]:
+            with self.assertRaises( ValueError ):
+                pcar.effective_masses( [ [ 1, 2 ] ], np.identity( 3 ), spin=spin )
+
+    def test_band_edges( self ):
+        pcar = procar.Procar()
+        pcar._number_of_bands = 4
+        pcar._band_occupancies = np.array( [ [ [ 1.0, 1.0, 0.0, 0.0 ], [ 1.0, 1.0, 0.3, 0.0 ] ] ] )
+        self.assertEqual( pcar.band_edges(), ( 2, 3 ) )
+
     def test_spin_polarised_procar_is_read_from_file( self ):
         """Checking that `PROCAR_spin_polarised_test` is read"""
         pcar = procar.Procar()
@@ -135,6 +287,74 @@ class ProcarTestCase( unittest.TestCase ):
         self.assertEqual( combined_pcar.number_of_bands, 112 )
         self.assertEqual( combined_pcar.number_of_k_points, 16 )
 
+    def test_from_files( self ):
+        filenames = [ test_procar_filename ] * 3
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pcar = procar.Procar.from_files( filenames, n_jobs=2 )
+            serial_pcar = procar.Procar.from_files( filenames, n_jobs=1 )
+            single_pcar = procar.Procar.from_file( test_procar_filename )
+        self.assertEqual( pcar.number_of_k_points, 6 )
+        self.assertEqual( [ k.index for k in pcar.k_points ], [ 1, 2, 3, 4, 5, 6 ] )
+        np.testing.assert_array_equal( pcar._data, np.concatenate( [ single_pcar._data ] * 3 ) )
+        np.testing.assert_array_equal( pcar._data, serial_pcar._data )
+        np.testing.assert_array_equal( pcar._bands, serial_pcar._bands )
+
+    def test_from_files_raises_ValueError_for_unequal_procars( self ):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with self.assertRaises( ValueError ):
+                procar.Procar.from_files( [ test_procar_filename, test_procar_spin_polarised_filename ] )
+
+    def test_from_files_raises_ValueError_for_invalid_n_jobs( self ):
+        for n_jobs in [ 0, -2 ]:
+            with self.assertRaises( ValueError ):
+                procar.Procar.from_files( [ test_procar_filename ], n_jobs=n_jobs )
+
+    def test_concatenate_raises_ValueError_for_unequal_procars( self ):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pcar1 = procar.Procar.from_file( test_procar_filename )
+            pcar2 = procar.Procar.from_file( test_procar_spin_polarised_filename )
+        with self.assertRaises( ValueError ):
+            procar.Procar.concatenate( [ pcar1, pcar2 ] )
+
+class ProcarCacheTestCase( unittest.TestCase ):
+    """Tests for the Procar binary cache"""
+
+    def setUp( self ):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join( self.tmp_dir, 'PROCAR' )
+        shutil.copy( test_procar_spin_polarised_filename, self.filename )
+
+    def tearDown( self ):
+        shutil.rmtree( self.tmp_dir )
+
+    def test_from_file_with_cache_writes_and_reloads_cache( self ):
+        pcar = procar.Procar.from_file( self.filename, cache=True )
+        self.assertTrue( os.path.isfile( os.path.join( self.filename + '.cache', 'metadata.yaml' ) ) )
+        with patch( 'vasppy.procar.Procar._read_from_file' ) as mock_read_from_file:
+            cached_pcar = procar.Procar.from_file( self.filename, cache=True )
+            mock_read_from_file.assert_not_called()
+        self.assertIsInstance( cached_pcar._data, np.memmap )
+        np.testing.assert_array_equal( cached_pcar._data, pcar._data )
+        np.testing.assert_array_equal( cached_pcar._bands, pcar._bands )
+        for k1, k2 in zip( cached_pcar.k_points, pcar.k_points ):
+            self.assertEqual( k1, k2 )
+        self.assertEqual( cached_pcar.calculation, pcar.calculation )
+        self.assertEqual( cached_pcar.spin_channels, 2 )
+        self.assertEqual( cached_pcar.number_of_k_points, 8 )
+
+    def test_cache_is_ignored_if_procar_changes( self ):
+        procar.Procar.from_file( self.filename, cache=True )
+        with open( self.filename, 'a' ) as f:
+            f.write( '\n' )
+        self.assertFalse( procar.Procar()._read_from_cache( self.filename ) )
+
+    def test_save_cache_raises_ValueError_without_filename( self ):
+        with self.assertRaises( ValueError ):
+            procar.Procar().save_cache()
+
 class ParserTestCase( unittest.TestCase ):
     """Tests for VASP PROCAR parsers"""
 
@@ -169,6 +389,32 @@ class ParserTestCase( unittest.TestCase ):
         self.assertEqual( procar.projections_parser( procar_string ).tolist(),
             np.array( [ [ 1.0, 0.006, 0.0, 0.0, 0.006, 2.0, 0.009, 0.0, 0.0, 0.009, 0.0, 0.835, 0.021, 0.012, 0.868 ], [ 1.0, 0.006, 0.0, 0.0, 0.006, 2.0, 0.009, 0.0, 0.0, 0.009, 0.0, 0.835, 0.021, 0.012, 0.868 ] ] ).tolist() )
 
+    def test_stream_parser( self ):
+        """Checking that a PROCAR body is parsed in a single pass into preallocated arrays"""
+        procar_string = ( b" k-point    1 :    0.50000000 0.25000000 0.75000000     weight = 0.50000000\n\n"
+                          b"band   1 # energy  -13.17934476 # occ.  1.00000000\n\n"
+                          b"ion      s      p      d    tot\n  1  0.006  0.000  0.000  0.006\n  2  0.009  0.000  0.000  0.009\ntot  0.835  0.021  0.012  0.868\n\n"
+                          b"band   2 # energy  -12.00000000 # occ.  0.50000000\n\n"
+                          b"ion      s      p      d    tot\n  1  0.001  0.002  0.003  0.006\n  2  0.004  0.005  0.000  0.009\ntot  0.005  0.007  0.003  0.015\n\n" )
+        k_point_frac_coords, k_point_weights, energies, occupancies, projections = procar.stream_parser( io.BytesIO( procar_string ), 1, 2, 2 )[:5]
+        np.testing.assert_array_equal( k_point_frac_coords, [ [ 0.5, 0.25, 0.75 ] ] )
+        np.testing.assert_array_equal( k_point_weights, [ 0.5 ] )
+        np.testing.assert_array_equal( energies, [ [ [ -13.17934476, -12.0 ] ] ] )
+        np.testing.assert_array_equal( occupancies, [ [ [ 1.0, 0.5 ] ] ] )
+        self.assertEqual( projections.shape, ( 1, 1, 2, 1, 3, 4 ) )
+        np.testing.assert_array_equal( projections[ 0, 0, 1, 0, 2 ], [ 0.005, 0.007, 0.003, 0.015 ] )
+
+    def test_stream_parser_matches_projections_parser( self ):
+        """Checking that the streaming parser reads the same projections as the regex parser"""
+        with open( test_procar_spin_polarised_filename, 'rb' ) as f:
+            f.readline()
+            f.readline()
+            projections = procar.stream_parser( f, 8, 112, 25 )[4]
+        with open( test_procar_spin_polarised_filename ) as f:
+            expected = procar.projections_parser( f.read() )
+        np.testing.assert_array_equal( projections.ravel(), 
+                                       expected.reshape( -1, 26, 11 )[ :, :, 1: ].ravel() )
+
 class ProcarSupportFunctionsTestCase( unittest.TestCase ):
     """Test for the support functions in procar.py"""
 
@@ -1,5 +1,7 @@
 import unittest
-from vasppy.rdf import RadialDistributionFunction
+import os
+import tempfile
+from vasppy.rdf import RadialDistributionFunction, RDFAccumulator, PartialRadialDistributionFunctions, VanHoveAnalysis, MultiLagVanHoveAnalysis, share_array, attach_array, map_frame_chunks
 import numpy as np
 from unittest.mock import Mock, patch, call
 from pymatgen import Structure, Lattice
@@ -69,5 +71,236 @@ class TestRadialDistributionFunction(unittest.TestCase):
         np.testing.assert_array_almost_equal(rdf._RadialDistributionFunction__dr_ij(structure), 
                                              np.array([3.46410162]))
 
+    def test___dr_ij_with_neighbour_list_matches_all_distances(self):
+        lattice = Lattice.from_parameters(a=12.0, b=13.0, c=14.0, 
+                                          alpha=80, beta=95, gamma=100)
+        structure = Structure(lattice, ['Na']*20, np.random.random((20, 3)))
+        indices_i = list(range(10))
+        indices_j = list(range(10, 20))
+        for indices in [(indices_i, None), (indices_i, indices_j)]:
+            rdf = RadialDistributionFunction(structures=[structure], 
+                                             indices_i=indices[0], indices_j=indices[1],
+                                             r_max=5.0)
+            dr_ij = lattice.get_all_distances(structure.frac_coords[rdf.indices_i],
+                                              structure.frac_coords[rdf.indices_j])
+            if rdf.self_reference:
+                dr_ij = dr_ij[~np.eye(len(rdf.indices_i), dtype=bool)]
+            expected = np.sort(dr_ij[dr_ij <= 5.0])
+            np.testing.assert_array_almost_equal(np.sort(rdf._RadialDistributionFunction__dr_ij(structure)),
+                                                 expected)
+
+    def test_RadialDistributionFunction_with_n_jobs_matches_serial(self):
+        lattice = Lattice.from_parameters(a=12.0, b=12.0, c=12.0, 
+                                          alpha=90, beta=90, gamma=90)
+        structures = [Structure(lattice, ['Na']*20, np.random.random((20, 3))) for _ in range(5)]
+        for indices_j in [None, list(range(10, 20))]:
+            serial = RadialDistributionFunction(structures=structures, indices_i=list(range(10)),
+                indices_j=indices_j, r_max=5.0, weights=[1, 2, 3, 4, 5])
+            parallel = RadialDistributionFunction(structures=structures, indices_i=list(range(10)),
+                indices_j=indices_j, r_max=5.0, weights=[1, 2, 3, 4, 5], n_jobs=2)
+            np.testing.assert_array_almost_equal(serial.rdf, parallel.rdf)
+            np.testing.assert_array_almost_equal(serial.coordination_number, parallel.coordination_number)
+
+    def test_invalid_n_jobs_raises_ValueError(self):
+        lattice = Lattice.from_parameters(a=12.0, b=12.0, c=12.0, 
+                                          alpha=90, beta=90, gamma=90)
+        structures = [Structure(lattice, ['Na']*4, np.random.random((4, 3))) for _ in range(3)]
+        for n_jobs in [0, -2]:
+            with self.assertRaises(ValueError):
+                map_frame_chunks(len, 3, n_jobs)
+            with self.assertRaises(ValueError):
+                RadialDistributionFunction(structures=structures, indices_i=[0, 1], r_max=5.0, n_jobs=n_jobs)
+            with self.assertRaises(ValueError):
+                VanHoveAnalysis(structures, indices=[0, 1], d_steps=1, r_max=5.0, n_jobs=n_jobs)
+
+    def test_RadialDistributionFunction_from_trajectory(self):
+        lattice = Lattice.from_parameters(a=12.0, b=12.0, c=12.0, 
+                                          alpha=90, beta=90, gamma=90)
+        frac_coords = np.random.random((3, 20, 3))
+        structures = [Structure(lattice, ['Na']*20, f) for f in frac_coords]
+        expected = RadialDistributionFunction(structures=structures, indices_i=list(range(10)),
+            indices_j=list(range(10, 20)), r_max=5.0, weights=[1, 2, 3])
+        rdf = RadialDistributionFunction.from_trajectory(frac_coords.astype(np.float32), lattice.matrix,
+            indices_i=list(range(10)), indices_j=list(range(10, 20)), r_max=5.0, weights=[1, 2, 3])
+        np.testing.assert_array_almost_equal(rdf.rdf, expected.rdf, decimal=4)
+        np.testing.assert_array_almost_equal(rdf.coordination_number, expected.coordination_number, decimal=4)
+
+    def test_RadialDistributionFunction_from_trajectory_with_variable_cell(self):
+        lattices = [Lattice.from_parameters(a=a, b=12.0, c=12.0, alpha=90, beta=90, gamma=90)
+                    for a in [11.0, 12.0, 13.0]]
+        frac_coords = np.random.random((3, 20, 3))
+        structures = [Structure(l, ['Na']*20, f) for l, f in zip(lattices, frac_coords)]
+        expected = RadialDistributionFunction(structures=structures, indices_i=list(range(20)), r_max=5.0)
+        rdf = RadialDistributionFunction.from_trajectory(frac_coords, np.array([l.matrix for l in lattices]),
+            indices_i=list(range(20)), r_max=5.0)
+        np.testing.assert_array_almost_equal(rdf.rdf, expected.rdf)
+        np.testing.assert_array_almost_equal(rdf.coordination_number, expected.coordination_number)
+
+class TestRDFAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        self.lattice = Lattice.from_parameters(a=12.0, b=12.0, c=12.0, 
+                                               alpha=90, beta=90, gamma=90)
+        self.structures = [Structure(self.lattice, ['Na']*20, np.random.random((20, 3))) for _ in range(4)]
+
+    def test_accumulator_matches_RadialDistributionFunction(self):
+        for indices_j in [None, list(range(10, 20))]:
+            expected = RadialDistributionFunction(structures=self.structures, indices_i=list(range(10)),
+                indices_j=indices_j, r_max=5.0, weights=[1, 2, 3, 4])
+            accumulator = RDFAccumulator(list(range(10)), indices_j, r_max=5.0)
+            accumulator.partial_fit(self.structures[:2], weights=[1, 2])
+            accumulator.partial_fit(((s.frac_coords, s.lattice.matrix) for s in self.structures[2:3]), weights=[3])
+            accumulator.partial_fit(np.array([self.structures[3].frac_coords]), lattice=self.lattice, weights=[4])
+            rdf = accumulator.result()
+            self.assertEqual(accumulator.n_frames, 4)
+            np.testing.assert_array_almost_equal(rdf.rdf, expected.rdf)
+            np.testing.assert_array_almost_equal(rdf.coordination_number, expected.coordination_number)
+            np.testing.assert_array_almost_equal(rdf.r, expected.r)
+
+    def test_partial_fit_raises_ValueError_without_lattice_for_arrays(self):
+        with self.assertRaises(ValueError):
+            RDFAccumulator([0, 1]).partial_fit([np.random.random((2, 3))])
+
+    def test_partial_fit_raises_ValueError_if_weights_doesnt_match_frames(self):
+        for weights in [[1, 2], [1, 2, 3, 4, 5]]:
+            accumulator = RDFAccumulator(list(range(10)), r_max=5.0)
+            with self.assertRaises(ValueError):
+                accumulator.partial_fit(self.structures, weights=weights)
+            self.assertEqual(accumulator.n_frames, 0)
+        for weights in [[1, 2], [1, 2, 3, 4, 5]]:
+            accumulator = RDFAccumulator(list(range(10)), r_max=5.0)
+            with self.assertRaises(ValueError):
+                accumulator.partial_fit((s for s in self.structures), weights=iter(weights))
+
+    def test_accumulator_checkpoint_can_be_resumed(self):
+        expected = RDFAccumulator(list(range(10)), r_max=5.0).partial_fit(self.structures).result()
+        accumulator = RDFAccumulator(list(range(10)), r_max=5.0).partial_fit(self.structures[:2])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'rdf.npz')
+            accumulator.save(filename)
+            resumed = RDFAccumulator.load(filename)
+        resumed.partial_fit(self.structures[2:])
+        self.assertEqual(resumed.n_frames, 4)
+        np.testing.assert_array_almost_equal(resumed.result().rdf, expected.rdf)
+
+    def test_checkpoint_round_trip_without_suffix(self):
+        accumulator = RDFAccumulator(list(range(10)), r_max=5.0).partial_fit(self.structures)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'rdf_checkpoint')
+            accumulator.save(filename)
+            self.assertTrue(os.path.exists(filename))
+            resumed = RDFAccumulator.load(filename)
+        self.assertEqual(resumed.n_frames, 4)
+        np.testing.assert_array_almost_equal(resumed.result().rdf, accumulator.result().rdf)
+
+    def test_merge_raises_ValueError_for_different_bins(self):
+        with self.assertRaises(ValueError):
+            RDFAccumulator([0, 1], nbins=10).merge(RDFAccumulator([0, 1], nbins=20))
+
+class TestPartialRadialDistributionFunctions(unittest.TestCase):
+
+    def setUp(self):
+        lattice = Lattice.from_parameters(a=12.0, b=13.0, c=12.0, 
+                                          alpha=90, beta=95, gamma=90)
+        self.species = ['Na', 'Cl', 'K'] * 10
+        self.structures = [Structure(lattice, self.species, np.random.random((30, 3))) for _ in range(3)]
+
+    def test_partials_match_RadialDistributionFunction(self):
+        partials = PartialRadialDistributionFunctions(self.structures, nbins=50, r_max=5.0, weights=[1, 2, 3])
+        self.assertEqual(partials.species, ['Na', 'Cl', 'K'])
+        self.assertEqual(partials.rdf.shape, (3, 3, 50))
+        for a in partials.species:
+            for b in partials.species:
+                indices_i = [i for i, s in enumerate(self.species) if s == a]
+                indices_j = [i for i, s in enumerate(self.species) if s == b]
+                expected = RadialDistributionFunction(self.structures, indices_i, indices_j, 
+                                                      nbins=50, r_max=5.0, weights=[1, 2, 3])
+                rdf, coordination_number = partials.partial(a, b)
+                np.testing.assert_array_almost_equal(rdf, expected.rdf)
+                np.testing.assert_array_almost_equal(coordination_number, expected.coordination_number)
+
+    def test_partials_from_frac_coords_and_lattice(self):
+        expected = PartialRadialDistributionFunctions(self.structures, nbins=50, r_max=5.0)
+        frames = ((s.frac_coords, s.lattice.matrix) for s in self.structures)
+        partials = PartialRadialDistributionFunctions(frames, species=self.species, nbins=50, r_max=5.0)
+        np.testing.assert_array_almost_equal(partials.rdf, expected.rdf)
+
+    def test_partials_raise_ValueError_if_weights_doesnt_match_structures(self):
+        with self.assertRaises(ValueError):
+            PartialRadialDistributionFunctions(self.structures, weights=[1, 2])
+
+class TestVanHoveAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        lattice = Lattice.from_parameters(a=12.0, b=12.0, c=12.0, 
+                                          alpha=90, beta=90, gamma=90)
+        frac_coords = np.random.random((20, 3))
+        self.structures = [Structure(lattice, ['Na']*20, (frac_coords + 0.01*i) % 1.0) for i in range(6)]
+
+    def test_VanHoveAnalysis_self_part(self):
+        vh = VanHoveAnalysis(self.structures, indices=list(range(20)), d_steps=2, nbins=100, r_max=5.0)
+        # every atom moves by 0.02*sqrt(3)*12 between frames 2 steps apart
+        expected = np.zeros(100)
+        expected[int(0.02*np.sqrt(3)*12.0/0.05)] = 20.0 / (20 / 12.0**3) / 20.0
+        np.testing.assert_array_almost_equal(vh.gsrt, expected)
+
+    def test_VanHoveAnalysis_with_n_jobs_matches_serial(self):
+        serial = VanHoveAnalysis(self.structures, indices=list(range(20)), d_steps=2, r_max=5.0)
+        parallel = VanHoveAnalysis(self.structures, indices=list(range(20)), d_steps=2, r_max=5.0, n_jobs=2)
+        np.testing.assert_array_almost_equal(serial.gsrt, parallel.gsrt)
+        np.testing.assert_array_almost_equal(serial.gdrt, parallel.gdrt)
+
+class TestMultiLagVanHoveAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        self.lattice = Lattice.from_parameters(a=12.0, b=12.0, c=12.0, 
+                                               alpha=90, beta=90, gamma=90)
+        frac_coords = np.random.random((20, 3))
+        self.structures = []
+        for i in range(10):
+            frac_coords = (frac_coords + 0.01*np.random.standard_normal((20, 3))) % 1.0
+            self.structures.append(Structure(self.lattice, ['Na']*20, frac_coords))
+
+    def test_each_lag_matches_VanHoveAnalysis(self):
+        vh = MultiLagVanHoveAnalysis(self.structures, indices=list(range(20)), lags=[4, 1, 0],
+                                     nbins=100, r_max=5.0)
+        np.testing.assert_array_equal(vh.lags, [0, 1, 4])
+        np.testing.assert_array_equal(vh.n_origins, [10, 9, 6])
+        self.assertEqual(vh.gsrt.shape, (3, 100))
+        for k, lag in enumerate(vh.lags):
+            expected = VanHoveAnalysis(self.structures, indices=list(range(20)), d_steps=lag, 
+                                       nbins=100, r_max=5.0)
+            np.testing.assert_array_almost_equal(vh.gsrt[k], expected.gsrt)
+            np.testing.assert_array_almost_equal(vh.gdrt[k], expected.gdrt)
+
+    def test_time_origins_can_be_selected(self):
+        frames = (s.frac_coords for s in self.structures)
+        vh = MultiLagVanHoveAnalysis(frames, indices=list(range(20)), lags=[2, 5], origins=3,
+                                     lattice=self.lattice, r_max=5.0)
+        np.testing.assert_array_equal(vh.n_origins, [3, 2])
+        vh = MultiLagVanHoveAnalysis(self.structures, indices=list(range(20)), lags=[2], origins=[1, 7, 8],
+                                     r_max=5.0)
+        np.testing.assert_array_equal(vh.n_origins, [2])
+
+    def test_non_positive_integer_origins_raise_ValueError(self):
+        for origins in [0, -2]:
+            with self.assertRaises(ValueError):
+                MultiLagVanHoveAnalysis(self.structures, indices=list(range(20)), lags=[2], origins=origins,
+                                        r_max=5.0)
+
+class TestSharedArrays(unittest.TestCase):
+
+    def test_share_and_attach_array(self):
+        array = np.arange(12.0).reshape(3, 4)
+        shm, descriptor = share_array(array)
+        try:
+            attached_shm, attached = attach_array(descriptor)
+            np.testing.assert_array_equal(attached, array)
+            del attached
+            attached_shm.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,10 @@
 import unittest
 import hashlib
-from vasppy.utils import md5sum, file_md5, validate_checksum
+import os
+import tempfile
+import numpy as np
+from vasppy.utils import md5sum, file_md5, validate_checksum, write_array_cache, read_array_cache
+from vasppy.utils import write_arrays, read_arrays
 from unittest.mock import patch, mock_open
 
 class UtilsTestCase( unittest.TestCase ):
@@ -33,5 +37,44 @@ class UtilsTestCase( unittest.TestCase ):
                 with self.assertRaises( ValueError ):
                     validate_checksum( filename='foo', md5sum='abcdef' )                
 
+class ArrayCacheTestCase( unittest.TestCase ):
+
+    def setUp( self ):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join( self.tmp_dir.name, 'foo' )
+        with open( self.filename, 'w' ) as f:
+            f.write( 'abc\n' )
+
+    def tearDown( self ):
+        self.tmp_dir.cleanup()
+
+    def test_write_and_read_array_cache( self ):
+        arrays = { 'a': np.arange( 6 ).reshape( 2, 3 ), 'b': [ 1.0, 2.0 ] }
+        write_array_cache( self.filename, arrays, { 'bar': 3 } )
+        cached_arrays, metadata = read_array_cache( self.filename )
+        np.testing.assert_array_equal( cached_arrays['a'], arrays['a'] )
+        np.testing.assert_array_equal( cached_arrays['b'], arrays['b'] )
+        self.assertIsInstance( cached_arrays['a'], np.memmap )
+        self.assertEqual( metadata['bar'], 3 )
+
+    def test_write_and_read_arrays( self ):
+        directory = os.path.join( self.tmp_dir.name, 'arrays' )
+        write_arrays( directory, { 'a': np.arange( 3 ) }, { 'bar': 'baz' } )
+        arrays, metadata = read_arrays( directory )
+        np.testing.assert_array_equal( arrays['a'], np.arange( 3 ) )
+        self.assertEqual( metadata, { 'bar': 'baz', 'arrays': [ 'a' ] } )
+
+    def test_read_arrays_returns_None_if_no_metadata( self ):
+        self.assertEqual( read_arrays( self.tmp_dir.name ), None )
+
+    def test_read_array_cache_returns_None_if_no_cache( self ):
+        self.assertEqual( read_array_cache( self.filename ), None )
+
+    def test_read_array_cache_returns_None_if_source_changed( self ):
+        write_array_cache( self.filename, { 'a': np.zeros( 3 ) } )
+        with open( self.filename, 'a' ) as f:
+            f.write( 'abc\n' )
+        self.assertEqual( read_array_cache( self.filename ), None )
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,14 +1,230 @@
 import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
 from unittest.mock import Mock, patch
 
 from vasppy import xdatcar
 from vasppy.poscar import Poscar
 
+def write_xdatcar( filename, frames, frame_type='Direct', lattice=np.diag( [ 2.0, 2.0, 2.0 ] ), lattices=None, scaling=1.0 ):
+    # if lattices are given, write a variable-cell XDATCAR with a structure header for every frame
+    # the lattice vectors are written divided by the scaling factor
+    with open( filename, 'w' ) as f:
+        for i, frame in enumerate( frames, 1 ):
+            if i == 1 or lattices is not None:
+                f.write( 'Test\n {}\n'.format( scaling ) )
+                for row in ( lattice if lattices is None else lattices[ i - 1 ] ):
+                    f.write( ' '.join( str( e / scaling ) for e in row ) + '\n' )
+                f.write( ' A B\n 1 2\n' )
+            f.write( '{} configuration= {:5d}\n'.format( frame_type, i ) )
+            for row in frame:
+                f.write( ' '.join( '{:.8f}'.format( e ) for e in row ) + '\n' )
+
 class TestXdatcar( unittest.TestCase ):
 
+    def setUp( self ):
+        self.frames = np.random.default_rng( 3 ).random( ( 4, 3, 3 ) )
+        handle, self.filename = tempfile.mkstemp()
+        os.close( handle )
+        write_xdatcar( self.filename, self.frames )
+
+    def tearDown( self ):
+        os.remove( self.filename )
+        shutil.rmtree( self.filename + '.cache', ignore_errors=True )
+
     def test_xdatcar_is_initialised( self ):
         xd = xdatcar.Xdatcar()
         self.assertEqual( type( xd.poscar[0] ), Poscar )
 
+    def test_read_frames( self ):
+        xd = xdatcar.Xdatcar()
+        frames = xd.read_frames( self.filename )
+        np.testing.assert_array_almost_equal( frames, self.frames )
+        self.assertEqual( xd.poscar[0].atoms, [ 'A', 'B' ] )
+        self.assertEqual( xd.poscar[0].atom_numbers, [ 1, 2 ] )
+
+    def test_iter_frames( self ):
+        xd = xdatcar.Xdatcar()
+        frames = list( xd.iter_frames( self.filename ) )
+        self.assertEqual( len( frames ), 4 )
+        np.testing.assert_array_almost_equal( np.array( frames ), self.frames )
+
+    def test_incomplete_final_frame_is_skipped( self ):
+        with open( self.filename, 'a' ) as f:
+            f.write( 'Direct configuration=     5\n 0.1 0.2 0.3\n' )
+        xd = xdatcar.Xdatcar()
+        self.assertEqual( xd.read_frames( self.filename ).shape, ( 4, 3, 3 ) )
+        self.assertEqual( len( list( xd.iter_frames( self.filename ) ) ), 4 )
+
+    def test_cartesian_frames_are_converted_to_fractional( self ):
+        write_xdatcar( self.filename, self.frames * 2.0, frame_type='Cartesian' )
+        xd = xdatcar.Xdatcar()
+        np.testing.assert_array_almost_equal( xd.read_frames( self.filename ), self.frames )
+
+    def test_scaling_is_applied_to_the_cell( self ):
+        write_xdatcar( self.filename, self.frames, scaling=0.5 )
+        xd = xdatcar.Xdatcar()
+        np.testing.assert_array_almost_equal( xd.read_frames( self.filename ), self.frames )
+        np.testing.assert_array_almost_equal( xd.poscar[0].cell.matrix, np.diag( [ 2.0, 2.0, 2.0 ] ) )
+        np.testing.assert_array_almost_equal( xd.lattices, np.broadcast_to( np.diag( [ 2.0, 2.0, 2.0 ] ), ( 4, 3, 3 ) ) )
+        self.assertEqual( xd.poscar[0].scaling, 1.0 )
+
+    def test_negative_scaling_raises_ValueError( self ):
+        write_xdatcar( self.filename, self.frames, scaling=-8.0 )
+        with self.assertRaises( ValueError ):
+            xdatcar.Xdatcar().read_frames( self.filename )
+
+    def test_read_from( self ):
+        xd = xdatcar.Xdatcar()
+        xd.read_from( self.filename )
+        self.assertEqual( len( xd.poscar ), 4 )
+        for poscar, frame in zip( xd.poscar, self.frames ):
+            np.testing.assert_array_almost_equal( poscar.coordinates, frame )
+            self.assertIs( poscar.cell, xd.poscar[0].cell )
+
+    def test_indexed_frame_access( self ):
+        xd = xdatcar.Xdatcar()
+        xd.load_index( self.filename )
+        self.assertEqual( len( xd ), 4 )
+        np.testing.assert_array_almost_equal( xd[2], self.frames[2] )
+        np.testing.assert_array_almost_equal( xd[-1], self.frames[-1] )
+        np.testing.assert_array_almost_equal( xd[1:4:2], self.frames[1:4:2] )
+        np.testing.assert_array_almost_equal( xd[ [ 3, 0, 3 ] ], self.frames[ [ 3, 0, 3 ] ] )
+
+    def test_frame_index_is_cached( self ):
+        xd = xdatcar.Xdatcar()
+        xd.load_index( self.filename )
+        self.assertTrue( os.path.exists( self.filename + '.cache/frame_offsets.npy' ) )
+        with patch.object( xdatcar.Xdatcar, 'build_index' ) as mock_build_index:
+            cached = xdatcar.Xdatcar()
+            cached.load_index( self.filename )
+            mock_build_index.assert_not_called()
+        np.testing.assert_array_equal( cached.frame_offsets, xd.frame_offsets )
+        self.assertEqual( cached.poscar[0].atoms, [ 'A', 'B' ] )
+
+    def test_frame_index_skips_incomplete_final_frame( self ):
+        with open( self.filename, 'a' ) as f:
+            f.write( 'Direct configuration=     5\n 0.1 0.2 0.3\n' )
+        xd = xdatcar.Xdatcar()
+        self.assertEqual( len( xd.build_index( self.filename ) ), 4 )
+
+    def test_getitem_raises_without_index( self ):
+        with self.assertRaises( ValueError ):
+            xdatcar.Xdatcar()[0]
+
+    def test_write_and_read_binary( self ):
+        path = self.filename + '.bin'
+        xd = xdatcar.Xdatcar()
+        xd.read_from( self.filename )
+        xd.write_binary( path )
+        try:
+            binary = xdatcar.Xdatcar.from_binary( path )
+            self.assertIsInstance( binary.frames, np.memmap )
+            self.assertEqual( binary.frames.dtype, np.float32 )
+            self.assertEqual( len( binary ), 4 )
+            np.testing.assert_array_almost_equal( binary[1:3], self.frames[1:3], decimal=6 )
+            self.assertEqual( binary.poscar[0].atoms, [ 'A', 'B' ] )
+            self.assertEqual( binary.poscar[0].atom_numbers, [ 1, 2 ] )
+            np.testing.assert_array_equal( binary.poscar[0].cell.matrix, np.diag( [ 2.0, 2.0, 2.0 ] ) )
+        finally:
+            shutil.rmtree( path )
+
+    def test_write_binary_streams_from_indexed_file( self ):
+        path = self.filename + '.bin'
+        xd = xdatcar.Xdatcar()
+        xd.load_index( self.filename, cache=False )
+        xd.write_binary( path, dtype=np.float64 )
+        try:
+            binary = xdatcar.Xdatcar.from_binary( path )
+            np.testing.assert_array_almost_equal( binary[:], self.frames )
+        finally:
+            shutil.rmtree( path )
+
+    def test_write_binary_raises_without_trajectory( self ):
+        with self.assertRaises( ValueError ):
+            xdatcar.Xdatcar().write_binary( self.filename + '.bin' )
+
+class TestVariableCellXdatcar( unittest.TestCase ):
+
+    def setUp( self ):
+        rng = np.random.default_rng( 4 )
+        self.frames = rng.random( ( 4, 3, 3 ) )
+        self.lattices = np.array( [ np.diag( [ 2.0, 2.0, 2.0 ] ) * ( 1.0 + 0.01 * i ) for i in range( 4 ) ] )
+        self.lattices[:,0,1] = 0.1
+        handle, self.filename = tempfile.mkstemp()
+        os.close( handle )
+        write_xdatcar( self.filename, self.frames, lattices=self.lattices )
+
+    def tearDown( self ):
+        os.remove( self.filename )
+        shutil.rmtree( self.filename + '.cache', ignore_errors=True )
+
+    def test_read_frames( self ):
+        xd = xdatcar.Xdatcar()
+        np.testing.assert_array_almost_equal( xd.read_frames( self.filename ), self.frames )
+        np.testing.assert_array_almost_equal( xd.lattices, self.lattices )
+        self.assertTrue( xd.variable_cell )
+
+    def test_scaling_is_applied_to_each_cell( self ):
+        write_xdatcar( self.filename, np.matmul( self.frames, self.lattices ), frame_type='Cartesian', 
+                       lattices=self.lattices, scaling=2.0 )
+        xd = xdatcar.Xdatcar()
+        np.testing.assert_array_almost_equal( xd.read_frames( self.filename ), self.frames )
+        np.testing.assert_array_almost_equal( xd.lattices, self.lattices )
+        frames = list( xd.iter_frames( self.filename, lattices=True ) )
+        np.testing.assert_array_almost_equal( np.array( [ f[1] for f in frames ] ), self.lattices )
+        indexed = xdatcar.Xdatcar()
+        indexed.load_index( self.filename, cache=False )
+        np.testing.assert_array_almost_equal( indexed.lattices, self.lattices )
+        np.testing.assert_array_almost_equal( indexed[:], self.frames )
+
+    def test_fixed_cell_lattices( self ):
+        write_xdatcar( self.filename, self.frames )
+        xd = xdatcar.Xdatcar()
+        xd.read_frames( self.filename )
+        self.assertEqual( xd.lattices.shape, ( 4, 3, 3 ) )
+        self.assertFalse( xd.variable_cell )
+
+    def test_iter_frames_with_lattices( self ):
+        xd = xdatcar.Xdatcar()
+        frames = list( xd.iter_frames( self.filename, lattices=True ) )
+        np.testing.assert_array_almost_equal( np.array( [ f[0] for f in frames ] ), self.frames )
+        np.testing.assert_array_almost_equal( np.array( [ f[1] for f in frames ] ), self.lattices )
+
+    def test_cartesian_frames_use_each_frame_lattice( self ):
+        write_xdatcar( self.filename, np.matmul( self.frames, self.lattices ), frame_type='Cartesian', lattices=self.lattices )
+        xd = xdatcar.Xdatcar()
+        np.testing.assert_array_almost_equal( xd.read_frames( self.filename ), self.frames )
+        np.testing.assert_array_almost_equal( np.array( list( xd.iter_frames( self.filename ) ) ), self.frames )
+
+    def test_indexed_frames_and_cached_lattices( self ):
+        xd = xdatcar.Xdatcar()
+        xd.load_index( self.filename )
+        np.testing.assert_array_almost_equal( xd.lattices, self.lattices )
+        np.testing.assert_array_almost_equal( xd[ [ 2, 1 ] ], self.frames[ [ 2, 1 ] ] )
+        cached = xdatcar.Xdatcar()
+        cached.load_index( self.filename )
+        np.testing.assert_array_almost_equal( cached.lattices, self.lattices )
+
+    def test_read_from_gives_each_frame_its_cell( self ):
+        xd = xdatcar.Xdatcar()
+        xd.read_from( self.filename )
+        for poscar, lattice in zip( xd.poscar, self.lattices ):
+            np.testing.assert_array_almost_equal( poscar.cell.matrix, lattice )
+
+    def test_binary_round_trip( self ):
+        path = self.filename + '.bin'
+        xd = xdatcar.Xdatcar()
+        xd.read_from( self.filename )
+        xd.write_binary( path )
+        try:
+            binary = xdatcar.Xdatcar.from_binary( path )
+            np.testing.assert_array_almost_equal( binary.lattices, self.lattices )
+            np.testing.assert_array_almost_equal( binary.poscar[0].cell.matrix, self.lattices[0] )
+        finally:
+            shutil.rmtree( path )
+
 if __name__ == '__main__':
     unittest.main()
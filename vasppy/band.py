@@ -1,4 +1,5 @@
 import warnings
+import numpy as np
 
 def handle_occupancy( occupancy, negative_occupancies='warn' ):
     valid_negative_occupancies = [ 'warn', 'raise', 'ignore', 'zero' ]
@@ -15,6 +16,32 @@ def handle_occupancy( occupancy, negative_occupancies='warn' ):
            occupancy = 0.0
     return occupancy
 
+def handle_occupancies( occupancies, negative_occupancies='warn' ):
+    """
+    Apply the negative occupancy handling of :func:`handle_occupancy` to an array of occupancies.
+
+    Args:
+        occupancies (np.array): Array of band occupancies.
+        negative_occupancies (:obj:`Str`, optional): One of 'warn', 'raise', 'ignore', or 'zero'.
+            Default is 'warn'.
+
+    Returns:
+        (np.array): The occupancies, with any negative values set to zero if 
+            `negative_occupancies='zero'`.
+    """
+    valid_negative_occupancies = [ 'warn', 'raise', 'ignore', 'zero' ]
+    if negative_occupancies not in valid_negative_occupancies:
+        raise ValueError( "valid options for negative_occupancies are {}".format( valid_negative_occupancies ) )
+    occupancies = np.asarray( occupancies, dtype=float )
+    if ( occupancies < 0 ).any():
+        if negative_occupancies == 'warn':
+            warnings.warn( "One or more occupancies in your PROCAR file are negative." )
+        elif negative_occupancies == 'raise':
+            raise ValueError( "One or more occupancies in your PROCAR file are negative." )
+        elif negative_occupancies == 'zero':
+            occupancies = np.where( occupancies < 0, 0.0, occupancies )
+    return occupancies
+
 class Band():
 
     def __init__( self, index, energy, occupancy, negative_occupancies='warn' ):
@@ -41,6 +41,113 @@ def rotation_matrix(axis, theta):
                        [ 2*(bc-ad), aa+cc-bb-dd, 2*(cd+ab) ],
                        [ 2*(bd+ac), 2*(cd-ab), aa+dd-bb-cc ] ] )
 
+def minimum_image( r1, r2 ):
+    """
+    Find the minimum image vectors from points r1 to points r2, for any number of points.
+
+    Args:
+        r1 (np.array): fractional coordinates of points r1, with shape (..., 3).
+        r2 (np.array): fractional coordinates of points r2, with the same shape as r1
+            (or a shape that broadcasts with it).
+
+    Returns:
+        (np.array): the fractional coordinate vectors from r1 to the nearest images of r2.
+    """
+    delta_r = np.asarray( r2, dtype=float ) - np.asarray( r1, dtype=float )
+    return np.where( np.abs( delta_r ) > 0.5, delta_r - np.sign( delta_r ), delta_r )
+
+def perpendicular_widths( matrix ):
+    """
+    The perpendicular widths of a cell, i.e. the separations between opposite faces.
+
+    Args:
+        matrix (np.array): 3x3 numpy array containing the cell matrix.
+
+    Returns:
+        (np.array): The widths perpendicular to the (b,c), (a,c), and (a,b) faces.
+    """
+    volume = abs( np.linalg.det( matrix ) )
+    areas = np.linalg.norm( np.cross( np.roll( matrix, -1, axis=0 ), np.roll( matrix, -2, axis=0 ) ), axis=1 )
+    return volume / areas
+
+def neighbour_pairs( matrix, frac_coords_i, frac_coords_j, r_max, exclude_self=False ):
+    """
+    Find every pair of points i, j separated by no more than r_max, using a linked-cell list.
+
+    The cell is divided into bins at least r_max wide, so each point only needs to be 
+    compared with the points in neighbouring bins. Every periodic image of j within r_max 
+    of i is returned as a separate pair, and the cost scales linearly with the number
+    of points, rather than quadratically.
+
+    Args:
+        matrix (np.array): 3x3 numpy array containing the cell matrix.
+        frac_coords_i (np.array): (N_i,3) fractional coordinates of the points i.
+        frac_coords_j (np.array): (N_j,3) fractional coordinates of the points j.
+        r_max (float): The maximum separation.
+        exclude_self (:obj:`bool`, optional): If True, `frac_coords_i` and `frac_coords_j` are
+            the same points, and the zero-length pairs of each point with itself are excluded.
+            Defaults to False.
+
+    Returns:
+        (np.array(int), np.array(int), np.array(float)): The indices into `frac_coords_i`
+            and `frac_coords_j` of each pair, and the separation of each pair.
+    """
+    frac_i = np.asarray( frac_coords_i, dtype=float ) % 1.0
+    frac_j = np.asarray( frac_coords_j, dtype=float ) % 1.0
+    widths = perpendicular_widths( matrix )
+    # bins are at least r_max wide, and there are no more (along each axis) than needed
+    # for about one point per bin
+    max_bins = max( 1, int( round( len( frac_j ) ** ( 1.0 / 3.0 ) ) ) )
+    n_bins = np.clip( np.floor( widths / r_max ), 1, max_bins ).astype( int )
+    reach = np.ceil( r_max * n_bins / widths - 1e-12 ).astype( int )
+    bin_i = np.minimum( ( frac_i * n_bins ).astype( int ), n_bins - 1 )
+    bin_j = np.minimum( ( frac_j * n_bins ).astype( int ), n_bins - 1 )
+    flat_bin_j = np.ravel_multi_index( bin_j.T, n_bins )
+    order = np.argsort( flat_bin_j, kind='stable' )
+    counts = np.bincount( flat_bin_j, minlength=np.prod( n_bins ) )
+    starts = np.cumsum( counts ) - counts
+    pairs_i, pairs_j, distances = [], [], []
+    for offset in np.ndindex( *( 2 * reach + 1 ) ):
+        offset = np.array( offset ) - reach
+        shifted = bin_i + offset
+        image = np.floor_divide( shifted, n_bins )
+        neighbour_bin = np.ravel_multi_index( ( shifted - image * n_bins ).T, n_bins )
+        n_candidates = counts[ neighbour_bin ]
+        i = np.repeat( np.arange( len( frac_i ) ), n_candidates )
+        # positions of the candidates in the bin-sorted j list
+        first = np.repeat( starts[ neighbour_bin ] - np.cumsum( n_candidates ) + n_candidates, n_candidates )
+        j = order[ first + np.arange( len( i ) ) ]
+        vectors = ( frac_j[ j ] + image[ i ] - frac_i[ i ] ).dot( matrix )
+        d = np.sqrt( np.einsum( 'ij,ij->i', vectors, vectors ) )
+        keep = d <= r_max
+        if exclude_self and not np.any( offset ):
+            keep &= i != j
+        pairs_i.append( i[ keep ] )
+        pairs_j.append( j[ keep ] )
+        distances.append( d[ keep ] )
+    return np.concatenate( pairs_i ), np.concatenate( pairs_j ), np.concatenate( distances )
+
+def minimum_image_distances( matrix, frac_coords_i, frac_coords_j ):
+    """
+    The N_i x N_j matrix of minimum-image distances between two sets of points,
+    found by checking the 27 nearest periodic images of each separation vector.
+
+    Args:
+        matrix (np.array): 3x3 numpy array containing the cell matrix.
+        frac_coords_i (np.array): (N_i,3) fractional coordinates of the points i.
+        frac_coords_j (np.array): (N_j,3) fractional coordinates of the points j.
+
+    Returns:
+        (np.array): (N_i,N_j) array of distances.
+    """
+    delta_r = np.asarray( frac_coords_j )[ np.newaxis, :, : ] - np.asarray( frac_coords_i )[ :, np.newaxis, : ]
+    delta_r -= np.round( delta_r )
+    distances_squared = np.full( delta_r.shape[:2], np.inf )
+    for image in np.ndindex( 3, 3, 3 ):
+        vectors = ( delta_r + np.array( image ) - 1 ).dot( matrix )
+        np.minimum( distances_squared, np.einsum( 'ijk,ijk->ij', vectors, vectors ), out=distances_squared )
+    return np.sqrt( distances_squared )
+
 class Cell:
 
     def __init__( self, matrix ):
@@ -102,9 +209,7 @@ class Cell:
         Returns:
             (np.array): the fractional coordinate vector from r1 to the nearest image of r2.
         """
-        delta_r = r2 - r1
-        delta_r = np.array( [ x - math.copysign( 1.0, x ) if abs(x) > 0.5 else x for x in delta_r ] )
-        return( delta_r )
+        return( minimum_image( r1, r2 ) )
 
     def minimum_image_dr( self, r1, r2, cutoff=None ):
         """
@@ -209,5 +314,36 @@ class Cell:
         """
         return( ( self.matrix.transpose() / self.lengths() ).transpose() )
 
+    def perpendicular_widths( self ):
+        """
+        The perpendicular widths of the cell, i.e. the separations between opposite faces.
+
+        Args:
+            None
+
+        Returns:
+            (np.array): The widths perpendicular to the (b,c), (a,c), and (a,b) faces.
+        """
+        return perpendicular_widths( self.matrix )
+
+    def neighbour_pairs( self, frac_coords_i, frac_coords_j, r_max, exclude_self=False ):
+        """
+        Find every pair of points i, j in the cell separated by no more than r_max,
+        including periodic images, using a linked-cell list.
+        See :func:`vasppy.cell.neighbour_pairs`.
+
+        Args:
+            frac_coords_i (np.array): (N_i,3) fractional coordinates of the points i.
+            frac_coords_j (np.array): (N_j,3) fractional coordinates of the points j.
+            r_max (float): The maximum separation.
+            exclude_self (:obj:`bool`, optional): If True, exclude the zero-length pair of 
+                each point with itself. Defaults to False.
+
+        Returns:
+            (np.array(int), np.array(int), np.array(float)): The indices into `frac_coords_i`
+                and `frac_coords_j` of each pair, and the separation of each pair.
+        """
+        return neighbour_pairs( self.matrix, frac_coords_i, frac_coords_j, r_max, exclude_self=exclude_self )
+
     def rotate( self, axis, theta ):
         self.matrix = np.array( [ np.dot( rotation_matrix(axis,theta), v) for v in self.matrix ] )
@@ -2,6 +2,9 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib._color_data as mcd
+from collections import deque
+from itertools import islice
+from .utils import write_array_cache, read_array_cache
 
 tableau_grey = '#bab0ac'
 
@@ -22,6 +25,181 @@ def pdos_column_names( lmax, ispin ):
     all_names.insert( 0, 'energy' )
     return all_names
 
+def tdos_column_names( ispin ):
+    """
+    Column names for the total density of states.
+
+    Args:
+        ispin (int): 2 for spin-polarised calculations, otherwise 1 (including non-collinear calculations).
+
+    Returns:
+        list(str): The column names.
+    """
+    if ispin == 2:
+        return [ 'energy', 'up', 'down', 'int_up', 'int_down' ]
+    return [ 'energy', 'dos', 'int_dos' ]
+
+def detect_layout( tdos_row, pdos_row=None ):
+    """
+    Detect the DOSCAR column layout from the first data row of the total DOS,
+    and (optionally) the first data row of the projected DOS.
+
+    The total DOS has 3 columns for non-spin-polarised and non-collinear calculations,
+    and 5 columns for spin-polarised calculations. Each lm-projected channel of the 
+    projected DOS has 1 (ISPIN=1), 2 (ISPIN=2; up, down), or 4 (non-collinear; total, 
+    mx, my, mz) columns.
+
+    Args:
+        tdos_row (str): The first data row of the total DOS.
+        pdos_row (optional:str): The first data row of the projected DOS.
+
+    Returns:
+        dict: The detected `ispin`, `spin_orbit_coupling`, and `lmax` values. 
+            Values that cannot be detected (without `pdos_row`) are None.
+    """
+    tdos_columns = len( tdos_row.split() )
+    if tdos_columns not in [ 3, 5 ]:
+        raise ValueError( 'Unrecognised total DOS layout with {} columns'.format( tdos_columns ) )
+    layout = { 'ispin': 2 if tdos_columns == 5 else 1,
+               'spin_orbit_coupling': False if tdos_columns == 5 else None,
+               'lmax': None }
+    if pdos_row:
+        pdos_layouts = { 1 + channels * components: ( lmax, components )
+                         for lmax, channels in [ ( 2, 9 ), ( 3, 16 ) ] 
+                         for components in [ 1, 2, 4 ] }
+        pdos_columns = len( pdos_row.split() )
+        if pdos_columns not in pdos_layouts:
+            raise ValueError( 'Unrecognised projected DOS layout with {} columns'.format( pdos_columns ) )
+        lmax, components = pdos_layouts[ pdos_columns ]
+        if ( components == 2 ) != ( layout[ 'ispin' ] == 2 ):
+            raise ValueError( 'Inconsistent total and projected DOS layouts' )
+        layout[ 'lmax' ] = lmax
+        layout[ 'spin_orbit_coupling' ] = components == 4
+    return layout
+
+def parse_numeric_rows( lines, block='data' ):
+    """
+    Convert a list of lines of whitespace-separated numbers to a 2D numpy array,
+    using a single bulk conversion.
+
+    Args:
+        lines (list(str)): The lines to convert. Every line must contain the same number of values.
+        block (optional:str): Name of the DOSCAR block being read, used in error messages.
+
+    Returns:
+        np.array: 2D array with one row per line.
+
+    Raises:
+        ValueError: If the lines do not all contain the same number of values.
+    """
+    if not lines:
+        return np.empty( ( 0, 0 ) )
+    number_of_columns = len( lines[0].split() )
+    try:
+        data = np.loadtxt( lines, ndmin=2 )
+    except ValueError as e:
+        raise ValueError( 'Could not read the DOSCAR {} block: {}'.format( block, e ) ) from e
+    if data.size != len( lines ) * number_of_columns:
+        raise ValueError( 'Could not read the DOSCAR {} block: expected {} rows of {} values, but read {} values'.format(
+            block, len( lines ), number_of_columns, data.size ) )
+    return data
+
+def broadening_kernel( kernel, width, energy_spacing, max_half_width=None ):
+    """
+    Discrete broadening kernel on an evenly spaced energy grid, normalised to unit sum.
+
+    Args:
+        kernel (str): 'gaussian' or 'lorentzian'.
+        width (float): The kernel width, in the energy units of the grid. For 'gaussian'
+            this is the standard deviation, and for 'lorentzian' the half width at half maximum.
+        energy_spacing (float): The spacing of the energy grid.
+        max_half_width (optional:int): Maximum number of grid points either side of the centre.
+
+    Returns:
+        np.array: The kernel weights, with an odd number of points centred on zero.
+    """
+    cutoff = { 'gaussian': 5.0, 'lorentzian': 50.0 }
+    if kernel not in cutoff:
+        raise ValueError( "valid kernels are 'gaussian' and 'lorentzian'" )
+    if width <= 0.0:
+        raise ValueError( 'broadening width must be positive' )
+    half_width = int( np.ceil( cutoff[ kernel ] * width / energy_spacing ) )
+    if max_half_width is not None:
+        half_width = min( half_width, max_half_width )
+    x = np.arange( -half_width, half_width + 1 ) * energy_spacing / width
+    if kernel == 'gaussian':
+        weights = np.exp( -0.5 * x**2 )
+    else:
+        weights = 1.0 / ( 1.0 + x**2 )
+    return weights / weights.sum()
+
+def broaden( dos, energy_spacing, width, kernel='gaussian', axis=0, fft_threshold=16 ):
+    """
+    Convolve density of states data with one or more broadening kernels along the energy axis.
+
+    Every other axis (atoms, channels, spins, ...) is broadened at once. Narrow kernels are
+    applied by direct convolution. If the widest kernel has more than `fft_threshold` points
+    the data are convolved by FFT, and the transform of the data is shared between widths.
+    Values outside the energy grid are taken to be zero.
+
+    Args:
+        dos (np.array): The density of states data.
+        energy_spacing (float): The spacing of the (evenly spaced) energy grid.
+        width (float or list(float)): One or more kernel widths. See `broadening_kernel()`.
+        kernel (optional:str): 'gaussian' or 'lorentzian'. Default='gaussian'.
+        axis (optional:int): The energy axis of `dos`. Default=0.
+        fft_threshold (optional:int): Kernel length above which FFT convolution is used. Default=16.
+
+    Returns:
+        np.array: The broadened data, with the same shape as `dos`. If `width` is a list, 
+            the broadened data for each width are stacked along a new leading axis.
+    """
+    dos = np.moveaxis( np.asarray( dos, dtype=float ), axis, 0 )
+    n = dos.shape[0]
+    kernels = [ broadening_kernel( kernel, w, energy_spacing, max_half_width=n - 1 ) 
+                for w in np.atleast_1d( width ) ]
+    half_width = max( len( k ) // 2 for k in kernels )
+    broadcast = ( -1, ) + ( 1, ) * ( dos.ndim - 1 )
+    results = []
+    if 2 * half_width + 1 > fft_threshold:
+        size = n + 2 * half_width
+        spectrum = np.fft.rfft( dos, n=size, axis=0 )
+        for k in kernels:
+            convolved = np.fft.irfft( spectrum * np.fft.rfft( k, n=size ).reshape( broadcast ), n=size, axis=0 )
+            results.append( convolved[ len( k ) // 2 : len( k ) // 2 + n ] )
+    else:
+        padded = np.zeros( ( n + 2 * half_width, ) + dos.shape[1:] )
+        padded[ half_width : half_width + n ] = dos
+        for k in kernels:
+            start = half_width - len( k ) // 2
+            convolved = np.zeros_like( dos )
+            for i, weight in enumerate( k ):
+                convolved += weight * padded[ start + i : start + i + n ]
+            results.append( convolved )
+    results = np.stack( [ np.moveaxis( r, 0, axis ) for r in results ] )
+    return results if np.ndim( width ) else results[0]
+
+def energy_window_rows( emin, emax, number_of_data_points, energy_range ):
+    """
+    The rows of an evenly spaced DOSCAR energy grid that fall inside an energy window.
+
+    Args:
+        emin (float): The lowest energy on the grid.
+        emax (float): The highest energy on the grid.
+        number_of_data_points (int): The number of grid points (NEDOS).
+        energy_range (list(float)): The lower and upper energies of the window.
+
+    Returns:
+        tuple(int, int): The first row inside the window, and one past the last row.
+    """
+    spacing = ( emax - emin ) / ( number_of_data_points - 1 )
+    tolerance = 1e-6
+    start = int( np.ceil( ( energy_range[0] - emin ) / spacing - tolerance ) )
+    stop = int( np.floor( ( energy_range[1] - emin ) / spacing + tolerance ) ) + 1
+    start = min( max( start, 0 ), number_of_data_points )
+    stop = min( max( stop, start ), number_of_data_points )
+    return start, stop
+
 class Doscar:
     '''
     Contains all the data in a VASP DOSCAR file, and methods for manipulating this.
@@ -29,7 +207,7 @@ class Doscar:
 
     number_of_header_lines = 6
 
-    def __init__( self, filename, ispin=2, lmax=2, lorbit=11, spin_orbit_coupling=False, read_pdos=True, species=None ):
+    def __init__( self, filename, ispin=None, lmax=None, lorbit=11, spin_orbit_coupling=None, read_pdos=True, species=None, cache=False, energy_range=None ):
         '''
         Create a Doscar object from a VASP DOSCAR file.
 
@@ -37,84 +215,387 @@ class Doscar:
             filename (str): Filename of the VASP DOSCAR file to read.
             ispin (optional:int): ISPIN flag. 
                 Set to 1 for non-spin-polarised or 2 for spin-polarised calculations.
-                Default = 2.
-            lmax (optional:int): Maximum l angular momentum. (d=2, f=3). Default = 2.
+                Default = None, which detects this from the file.
+            lmax (optional:int): Maximum l angular momentum. (d=2, f=3). 
+                Default = None, which detects this from the file.
             lorbit (optional:int): The VASP LORBIT flag. (Default=11).
-            spin_orbit_coupling (optional:bool): Spin-orbit coupling (Default=False).
+            spin_orbit_coupling (optional:bool): Spin-orbit coupling (non-collinear) calculation.
+                Default = None, which detects this from the file.
+                Values of `ispin`, `lmax`, or `spin_orbit_coupling` that are set must agree with
+                the layout detected from the file, otherwise a ValueError is raised.
             read_pdos (optional:bool): Set to True to read the atom-projected density of states (Default=True).
             species (optional:list(str)): List of atomic species strings, e.g. [ 'Fe', 'Fe', 'O', 'O', 'O' ].
                 Default=None.
+            cache (optional:bool): Set to True to use a binary cache of the parsed data, stored in
+                `filename.cache` beside the DOSCAR file. If a valid cache exists the arrays are
+                memory-mapped from it, otherwise the DOSCAR file is parsed and the cache is written.
+                The cache is invalidated if the size or modification time of the DOSCAR file changes.
+                Default=False.
+            energy_range (optional:list(float)): Lower and upper energies, in eV, of a window to read.
+                Only the rows inside this window are kept, for both the total and projected DOS.
+                The rows are found from the EMIN, EMAX, and NEDOS values in the header.
+                Default=None, which reads every energy.
         '''
         self.filename = filename
         self.ispin = ispin
         self.lmax = lmax
         self.spin_orbit_coupling = spin_orbit_coupling
-        if self.spin_orbit_coupling:
-            raise NotImplementedError( 'Spin-orbit coupling is not yet implemented' )
         self.lorbit = lorbit
         self.pdos = None
         self.species = species
-        self.read_header()
-        self.read_total_dos()
-        if read_pdos:
-            try:
-                self.read_projected_dos()
-            except:
-                raise
+        self.energy_range = energy_range
+        if not ( cache and self.read_from_cache( read_pdos=read_pdos ) ):
+            self.read_header()
+            lines = self.read_lines( read_pdos=read_pdos )
+            self.set_layout( lines )
+            self.read_total_dos( lines )
+            if read_pdos:
+                self.read_projected_dos( lines )
+            if cache:
+                self.save_cache()
         # if species is set, should check that this is consistent with the number of entries in the
         # projected_dos dataset
         
     @property
     def number_of_channels( self ):
         if self.lorbit == 11:
+            if self.lmax not in [ 2, 3 ]:
+                raise ValueError( 'lmax value not supported: {}'.format( self.lmax ) )
             return { 2: 9, 3: 16 }[ self.lmax ]
-        raise notImplementedError
+        raise NotImplementedError
+
+    @property
+    def spin_components( self ):
+        """
+        The number of spin components for each lm-projected channel in `pdos`:
+        1 (ISPIN=1), 2 (ISPIN=2; up, down), or 4 (non-collinear; total, mx, my, mz).
+        """
+        if self.spin_orbit_coupling:
+            return 4
+        return self.ispin
+
+    def set_layout( self, lines ):
+        """
+        Detect the column layout from the first data rows of the total and projected DOS,
+        and set `ispin`, `lmax`, and `spin_orbit_coupling`.
+
+        Args:
+            lines (list(str)): The lines of the DOSCAR file, as returned by `read_lines()`.
+
+        Returns:
+            None
 
-    def read_header( self ):
-        self.header = []
+        Raises:
+            ValueError: If a value set when this Doscar was created disagrees with the file.
+        """
+        first_pdos_row = Doscar.number_of_header_lines + self.number_of_data_points + 1
+        pdos_row = lines[ first_pdos_row ] if len( lines ) > first_pdos_row else None
+        layout = detect_layout( lines[ Doscar.number_of_header_lines ], pdos_row )
+        for key, detected in layout.items():
+            given = getattr( self, key )
+            if detected is None:
+                continue
+            if given is not None and given != detected:
+                raise ValueError( '{} = {} does not match the DOSCAR file ({})'.format( key, given, detected ) )
+            setattr( self, key, detected )
+        if self.spin_orbit_coupling is None:
+            self.spin_orbit_coupling = False
+
+    def read_lines( self, read_pdos=True ):
+        """
+        Read the lines of the DOSCAR file in a single pass.
+
+        If `energy_range` is set, only the header lines, the per-atom block header lines,
+        and the rows inside the energy window are kept, so the returned lines have the 
+        layout of a DOSCAR file with `number_of_data_points` rows per block.
+        The header must have been read first.
+
+        Args:
+            read_pdos (optional:bool): Set to False to stop reading after the total DOS, 
+                and the first row of the projected DOS (Default=True).
+
+        Returns:
+            list(str): The lines of the file.
+        """
         with open( self.filename, 'r' ) as file_in:
-            for i in range( Doscar.number_of_header_lines ):
-                self.header.append( file_in.readline() )
+            if self.energy_range is None and read_pdos:
+                return file_in.readlines()
+            start, stop = self.energy_rows
+            lines = list( islice( file_in, Doscar.number_of_header_lines ) )
+            number_of_blocks = self.number_of_atoms + 1 if read_pdos else 1
+            for block in range( number_of_blocks ):
+                if block > 0:
+                    lines.append( file_in.readline() )
+                deque( islice( file_in, start ), maxlen=0 )
+                lines.extend( islice( file_in, stop - start ) )
+                deque( islice( file_in, self.number_of_data_points_in_file - stop ), maxlen=0 )
+            if not read_pdos:
+                # keep the first projected DOS row, to detect the layout
+                lines.extend( islice( file_in, 2 ) )
+        return lines
+
+    def read_header( self, lines=None ):
+        if lines is None:
+            lines = []
+            with open( self.filename, 'r' ) as file_in:
+                for i in range( Doscar.number_of_header_lines ):
+                    lines.append( file_in.readline() )
+        self.header = lines[:Doscar.number_of_header_lines]
         self.process_header()
 
     def process_header( self ):
         self.number_of_atoms = int( self.header[0].split()[0] )
-        self.number_of_data_points = int( self.header[5].split()[2] )
+        self.number_of_data_points_in_file = int( self.header[5].split()[2] )
         self.efermi = float( self.header[5].split()[3] )
+        emax, emin = [ float( e ) for e in self.header[5].split()[:2] ]
+        if getattr( self, 'energy_range', None ) is None:
+            self.energy_rows = ( 0, self.number_of_data_points_in_file )
+        else:
+            self.energy_rows = energy_window_rows( emin, emax, self.number_of_data_points_in_file, 
+                                                   self.energy_range )
+        self.number_of_data_points = self.energy_rows[1] - self.energy_rows[0]
+        if self.number_of_data_points == 0:
+            raise ValueError( 'energy_range {} contains no data points'.format( self.energy_range ) )
         
-    def read_total_dos( self ): # assumes spin_polarised
-        start_to_read = Doscar.number_of_header_lines
-        df = pd.read_csv( self.filename, 
-                          skiprows=start_to_read, 
-                          nrows=self.number_of_data_points,
-                          delim_whitespace=True, 
-                          names=[ 'energy', 'up', 'down', 'int_up', 'int_down' ],
-                          index_col=False )
+    def read_total_dos( self, lines=None ):
+        """
+        Read the total density of states.
+
+        Args:
+            lines (optional:list(str)): The lines of the DOSCAR file, as returned by `read_lines()`.
+                If not given, the file is read.
+
+        Returns:
+            None
+        """
+        if lines is None:
+            lines = self.read_lines()
+        start = Doscar.number_of_header_lines
+        data = parse_numeric_rows( lines[ start : start + self.number_of_data_points ], block='total DOS' )
+        df = pd.DataFrame( data, columns=tdos_column_names( self.ispin ) )
         self.energy = df.energy.values
-        df.drop( 'energy', axis=1 )
         self.tdos = df
         
-    def read_atomic_dos_as_df( self, atom_number ): # currently assume spin-polarised, no-SO-coupling, no f-states
-        assert atom_number > 0 & atom_number <= self.number_of_atoms
-        start_to_read = Doscar.number_of_header_lines + atom_number * ( self.number_of_data_points + 1 )
-        df = pd.read_csv( self.filename,
-                          skiprows=start_to_read,
-                          nrows=self.number_of_data_points,
-                          delim_whitespace=True,
-                          names=pdos_column_names( lmax=self.lmax, ispin=self.ispin ),
-                          index_col=False )
-        return df.drop('energy', axis=1)
-    
-    def read_projected_dos( self ):
-        """
-        Read the projected density of states data into """
-        pdos_list = []
-        for i in range( self.number_of_atoms ):
-            df = self.read_atomic_dos_as_df( i+1 )
-            pdos_list.append( df )
-        self.pdos = np.vstack( [ np.array( df ) for df in pdos_list ] ).reshape( 
-            self.number_of_atoms, self.number_of_data_points, self.number_of_channels, self.ispin )
+    def read_projected_dos( self, lines=None ):
+        """
+        Read the projected density of states data into a numpy array.
+
+        All the per-atom blocks are parsed with one bulk numeric conversion,
+        and reshaped directly into `self.pdos`, with dimensions
+        [ atom_no, energy_value, lm-projection, spin ]. The spin axis has
+        `spin_components` entries.
+
+        Args:
+            lines (optional:list(str)): The lines of the DOSCAR file, as returned by `read_lines()`.
+                If not given, the file is read.
+
+        Returns:
+            None
+        """
+        if lines is None:
+            lines = self.read_lines()
+        n = self.number_of_data_points
+        # each atom block is one header line followed by n data rows
+        starts = [ Doscar.number_of_header_lines + i * ( n + 1 )
+                   for i in range( 1, self.number_of_atoms + 1 ) ]
+        data = parse_numeric_rows( [ line for start in starts for line in lines[ start : start + n ] ],
+                                   block='projected DOS' )
+        self.pdos = data.reshape( self.number_of_atoms, n, -1 )[ :, :, 1: ].reshape( 
+            self.number_of_atoms, n, self.number_of_channels, self.spin_components )
         
+    def broaden( self, width, kernel='gaussian', projected=True ):
+        """
+        Broaden the total or projected density of states along the energy axis.
+        Results are cached on this Doscar object, keyed by kernel and width.
+
+        Args:
+            width (float or list(float)): One or more kernel widths, in eV. For 'gaussian' 
+                this is the standard deviation, and for 'lorentzian' the half width at half maximum.
+            kernel (optional:str): 'gaussian' or 'lorentzian'. Default='gaussian'.
+            projected (optional:bool): Set to True to broaden `pdos`, or False to broaden 
+                the `tdos` columns other than energy. Default=True.
+
+        Returns:
+            np.array: The broadened data, with the shape of `pdos` or of the `tdos` columns
+                other than energy. If `width` is a list, the broadened data for each width 
+                are stacked along a new leading axis.
+        """
+        if getattr( self, '_broadened', None ) is None:
+            self._broadened = {}
+        target = 'pdos' if projected else 'tdos'
+        widths = [ float( w ) for w in np.atleast_1d( width ) ]
+        missing = [ w for w in widths if ( target, kernel, w ) not in self._broadened ]
+        if missing:
+            if projected:
+                dos, axis = self.pdos, 1
+            else:
+                dos, axis = self.tdos.values[ :, 1: ], 0
+            energy_spacing = ( self.energy[-1] - self.energy[0] ) / ( len( self.energy ) - 1 )
+            for w, broadened in zip( missing, broaden( dos, energy_spacing, missing, kernel=kernel, axis=axis ) ):
+                self._broadened[ ( target, kernel, w ) ] = broadened
+        results = [ self._broadened[ ( target, kernel, w ) ] for w in widths ]
+        return np.stack( results ) if np.ndim( width ) else results[0]
+
+    def save_cache( self ):
+        """
+        Write the energy, total DOS and projected DOS arrays to a binary cache beside the
+        DOSCAR file, for fast reloading with `Doscar( filename, cache=True )`.
+
+        Returns:
+            None
+        """
+        arrays = { 'energy': self.energy,
+                   'tdos': self.tdos.values }
+        if self.pdos is not None:
+            arrays[ 'pdos' ] = self.pdos
+        metadata = { 'header': list( self.header ),
+                     'tdos_columns': list( self.tdos.columns ),
+                     'ispin': self.ispin,
+                     'lmax': self.lmax,
+                     'spin_orbit_coupling': self.spin_orbit_coupling,
+                     'lorbit': self.lorbit,
+                     'energy_rows': list( self.energy_rows ) }
+        write_array_cache( self.filename, arrays, metadata )
+
+    def read_from_cache( self, read_pdos=True ):
+        """
+        Read the energy, total DOS and projected DOS arrays from the binary cache for this
+        DOSCAR file. The arrays are memory-mapped, not read into memory, so the pages of a
+        shared cache are shared between processes.
+
+        Args:
+            read_pdos (optional:bool): Set to True to read the projected density of states (Default=True).
+
+        Returns:
+            bool: True if a valid cache was read. False if there is no cache, if the cache is
+                older than the DOSCAR file, or if it was written with different settings.
+        """
+        cached = read_array_cache( self.filename )
+        if cached is None:
+            return False
+        arrays, metadata = cached
+        layout = [ 'ispin', 'lmax', 'spin_orbit_coupling' ]
+        if any( key not in metadata for key in layout + [ 'energy_rows' ] ):
+            return False
+        if any( getattr( self, key ) is not None and getattr( self, key ) != metadata[ key ]
+                for key in layout ):
+            return False
+        if metadata[ 'lorbit' ] != self.lorbit:
+            return False
+        if read_pdos and 'pdos' not in arrays:
+            return False
+        self.header = metadata[ 'header' ]
+        self.process_header()
+        if list( self.energy_rows ) != metadata[ 'energy_rows' ]:
+            return False
+        for key in layout:
+            setattr( self, key, metadata[ key ] )
+        self.energy = arrays[ 'energy' ]
+        self.tdos = pd.DataFrame( arrays[ 'tdos' ], columns=metadata[ 'tdos_columns' ] )
+        if read_pdos:
+            self.pdos = arrays[ 'pdos' ]
+        return True
+
+    @property
+    def channel_table( self ):
+        """
+        Index table for the lm-projected channels of `pdos`, computed once and cached.
+
+        Returns:
+            dict: Nested dictionary mapping each angular momentum label ('s', 'p', 'd', 'f')
+                to a dictionary of {m: channel index}. The single s channel has m = ''.
+        """
+        if getattr( self, '_channel_table', None ) is None:
+            table = {}
+            for i, name in enumerate( pdos_column_names( lmax=self.lmax, ispin=1 )[1:] ):
+                l, _, m = name.partition( '_' )
+                table.setdefault( l, {} )[ m ] = i
+            self._channel_table = table
+        return self._channel_table
+
+    def species_indices( self, species ):
+        """
+        Indices of the atoms of one species. The index arrays for every species are 
+        computed once from `self.species` and cached.
+
+        Args:
+            species (str): The species string, e.g. 'Fe'.
+
+        Returns:
+            np.array: The (zero-based) indices of the atoms of this species.
+        """
+        if getattr( self, '_species_indices', None ) is None:
+            species_array = np.array( self.species )
+            self._species_indices = { s: np.flatnonzero( species_array == s ) 
+                                      for s in set( self.species ) }
+        return self._species_indices[ species ]
+
+    def atom_index( self, atoms=None ):
+        """
+        Atom indices for a pdos selection.
+
+        Args:
+            atoms (optional:int or list(int)): Atom indices to select. Default is to select all atoms.
+
+        Returns:
+            np.array: The selected atom indices.
+        """
+        if atoms is None or np.size( atoms ) == 0:
+            return np.arange( self.number_of_atoms )
+        return np.atleast_1d( np.asarray( atoms, dtype=int ) )
+
+    def spin_index( self, spin=None ):
+        """
+        Spin indices for a pdos selection.
+
+        Args:
+            spin (optional:str): For spin-polarised calculations, 'up', 'down', or 'both'.
+                Default is to select both spins.
+                For non-collinear calculations, 'total', 'mx', 'my', or 'mz'.
+                Default is to select the total.
+                For non-spin-polarised calculations, 'total' (the default).
+
+        Returns:
+            np.array: The selected spin indices.
+        """
+        if self.spin_orbit_coupling:
+            options = { 'total': [ 0 ], 'mx': [ 1 ], 'my': [ 2 ], 'mz': [ 3 ] }
+            default = [ 0 ]
+        elif self.ispin == 2:
+            options = { 'up': [ 0 ], 'down': [ 1 ], 'both': [ 0, 1 ] }
+            default = [ 0, 1 ]
+        else:
+            options = { 'total': [ 0 ] }
+            default = [ 0 ]
+        if not spin:
+            return np.array( default )
+        if spin not in options:
+            raise ValueError( 'valid spin values for this calculation are {}'.format( 
+                ', '.join( "'{}'".format( o ) for o in options ) ) )
+        return np.array( options[ spin ] )
+
+    def channel_index( self, l=None, m=None ):
+        """
+        lm-projected channel indices for a pdos selection.
+
+        Args:
+            l (optional:str): Angular momentum, one of 's', 'p', 'd', or 'f'.
+                Default is to select all channels.
+            m (optional:list(str)): One or more m-values. Requires `l` to be set.
+                Default is to select all m-values for `l`.
+
+        Returns:
+            np.array: The selected channel indices, in channel order.
+        """
+        if not l:
+            return np.arange( self.number_of_channels )
+        if l not in self.channel_table:
+            raise ValueError( 'l value not supported: {}'.format( l ) )
+        channels = self.channel_table[ l ]
+        if not m:
+            return np.array( sorted( channels.values() ) )
+        return np.array( sorted( i for label, i in channels.items() if label in m ), dtype=int )
+
     def pdos_select( self, atoms=None, spin=None, l=None, m=None ):
         """
         Returns a subset of the projected density of states array.
@@ -124,6 +605,8 @@ class Doscar:
                                    Default is to select all atoms.
             spin (str): Select up or down, or both spin channels to include in the selection.
                         Accepted options are 'up', 'down', and 'both'. Default is to select both spins.
+                        For non-collinear calculations the options are 'total', 'mx', 'my', and 'mz',
+                        and the default is 'total'. See `spin_index()`.
             l (str): Select one angular momentum to include in the selectrion.
                      Accepted options are 's', 'p', 'd', and 'f'. Default is to include all l-values.
                      Setting `l` and not setting `m` will return all projections for that angular momentum value.
@@ -139,51 +622,61 @@ class Doscar:
             The array dimensions are [ atom_no, energy_value, lm-projection, spin ]
 
         """
-        valid_m_values = { 's': [],
-                           'p': [ 'x', 'y', 'z' ],
-                           'd': [ 'xy', 'yz', 'z2-r2', 'xz', 'x2-y2' ],
-                           'f': [ 'y(3x2-y2)', 'xyz', 'yz2', 'z3', 'xz2', 'z(x2-y2)', 'x(x2-3y2)' ] }
-        if not atoms:
-            atom_idx = list(range( self.number_of_atoms ))
-        else:
-            atom_idx = atoms
-        to_return = self.pdos[ atom_idx, :, :, : ]
-        if not spin:
-            spin_idx = list(range( self.ispin ))
-        elif spin is 'up':
-            spin_idx = [0]
-        elif spin is 'down':
-            spin_idx = [1]
-        elif spin is 'both':
-            spin_idx = [0,1]
-        else:
-            raise ValueError( "valid spin values are 'up', 'down', and 'both'. The default is 'both'" )
-        to_return = to_return[ :, :, :, spin_idx ]
-        if not l:
-            channel_idx = list(range( self.number_of_channels ))
-        elif l == 's':
-            channel_idx = [ 0 ]
-        elif l == 'p':
-            if not m:
-                channel_idx = [ 1, 2, 3 ]
-            else: # TODO this looks like it should be i+1
-                channel_idx = [ i+1 for i, v in enumerate( valid_m_values['p'] ) if v in m ]
-        elif l == 'd':
-            if not m:
-                channel_idx = [ 4, 5, 6, 7, 8 ]
-            else: # TODO this looks like it should be i+4
-                channel_idx = [ i+4 for i, v in enumerate( valid_m_values['d'] ) if v in m ]
-        elif l == 'f':
-            if not m:
-                channel_idx = [ 9, 10, 11, 12, 13, 14, 15 ]
-            else: # TODO this looks like it should be i+9
-                channel_idx = [ i+9 for i, v in enumerate( valid_m_values['f'] ) if v in m ]
-        else:
-            raise ValueError
-        return to_return[ :, :, channel_idx, : ]
-    
+        return self.pdos[ np.ix_( self.atom_index( atoms ), 
+                                  np.arange( self.pdos.shape[1] ),
+                                  self.channel_index( l=l, m=m ), 
+                                  self.spin_index( spin ) ) ]
+
+    def pdos_weights( self, atoms=None, spin=None, l=None, m=None ):
+        """
+        Weight vectors over the atom, channel, and spin axes of `pdos` for a selection.
+        Atoms that appear more than once in `atoms` are weighted by their count.
+
+        Args:
+            atoms, spin, l, m: As for `pdos_select()`.
+
+        Returns:
+            tuple(np.array, np.array, np.array): The atom, channel, and spin weights.
+        """
+        atom_weights = np.bincount( self.atom_index( atoms ), minlength=self.number_of_atoms ).astype( float )
+        channel_weights = np.zeros( self.number_of_channels )
+        channel_weights[ self.channel_index( l=l, m=m ) ] = 1.0
+        spin_weights = np.zeros( self.spin_components )
+        spin_weights[ self.spin_index( spin ) ] = 1.0
+        return atom_weights, channel_weights, spin_weights
+
+    def weighted_atoms( self, atom_weights ):
+        """
+        The rows of `pdos` for the atoms with non-zero weight, and their weights.
+        Only the selected atoms are copied, or none if every atom is selected.
+
+        Args:
+            atom_weights (np.array): Atom weights, as returned by `pdos_weights()`.
+
+        Returns:
+            tuple(np.array, np.array): The selected `pdos` rows and atom weights.
+        """
+        selected = np.flatnonzero( atom_weights )
+        if len( selected ) == self.number_of_atoms:
+            return self.pdos, atom_weights
+        return self.pdos[ selected ], atom_weights[ selected ]
+
     def pdos_sum( self, atoms=None, spin=None, l=None, m=None ):
-        return np.sum( self.pdos_select( atoms=atoms, spin=spin, l=l, m=m ), axis=(0,2,3) )
+        """
+        Sum of the projected density of states over a selection of atoms, spins, and channels.
+        The selected atoms are taken from `pdos` first, and then reduced with
+        weight vectors over the channel and spin axes, and then the atom axis.
+
+        Args:
+            atoms, spin, l, m: As for `pdos_select()`.
+
+        Returns:
+            np.array: The summed density of states at each energy.
+        """
+        atom_weights, channel_weights, spin_weights = self.pdos_weights( atoms=atoms, spin=spin, l=l, m=m )
+        pdos, atom_weights = self.weighted_atoms( atom_weights )
+        channel_spin_weights = np.outer( channel_weights, spin_weights ).ravel()
+        return atom_weights @ ( pdos.reshape( pdos.shape[0], pdos.shape[1], -1 ) @ channel_spin_weights )
 
     def plot_pdos(self, ax=None, to_plot=None, colors=None, 
                   plot_total_dos=True, xrange=None, ymax=None, 
@@ -206,6 +699,8 @@ class Doscar:
             e_range = np.ma.make_mask( self.energy )
             
         auto_ymax = 0.0
+        # only spin-polarised data are plotted as mirrored up and down spins
+        spin_polarised = self.spin_components == 2
             
         if not to_plot:
             to_plot = {}
@@ -215,13 +710,17 @@ class Doscar:
                     to_plot[s].append('f')
                     
         for species in to_plot.keys():
-            index = [i for i, s in enumerate(self.species) if s is species]
+            atom_weights, _, _ = self.pdos_weights(atoms=self.species_indices(species))
+            species_pdos, atom_weights = self.weighted_atoms(atom_weights)
             for state in to_plot[species]:
                 assert state in ['s', 'p', 'd', 'f']
                 color = next( color_iterator )
                 label = '{} {}'.format(species, state)
-                up_dos = self.pdos_sum(atoms=index, l=state, spin='up')[e_range]
-                down_dos = self.pdos_sum(atoms=index, l=state, spin='down')[e_range]
+                _, channel_weights, _ = self.pdos_weights(l=state)
+                # contract the channels for both spins at once, giving (spin, energy)
+                dos = np.tensordot(atom_weights, np.swapaxes(species_pdos, 2, 3) @ channel_weights, axes=1).T
+                up_dos = dos[0][e_range]
+                down_dos = dos[1][e_range] if spin_polarised else np.zeros_like(up_dos)
                 if species in scaling:
                     if state in scaling[species]:
                         up_dos *= scaling[species][state]
@@ -229,18 +728,24 @@ class Doscar:
                         label = r'{} {} $\times${}'.format( species, state, scaling[species][state] )
                 auto_ymax = max( [ auto_ymax, up_dos.max(), down_dos.max() ] )
                 ax.plot(self.energy[e_range], up_dos, label=label, c=color)
-                ax.plot(self.energy[e_range], down_dos * -1.0,  c=color)
+                if spin_polarised:
+                    ax.plot(self.energy[e_range], down_dos * -1.0,  c=color)
         if plot_total_dos:
-            ax.fill_between(self.energy[e_range], self.tdos.up.values[e_range], 
-                            self.tdos.down.values[e_range] * -1.0, facecolor=tableau_grey, alpha=0.2)
-            auto_ymax = max( [ auto_ymax, self.tdos.up.values[e_range].max(), self.tdos.down.values[e_range].max() ] )
+            if spin_polarised:
+                ax.fill_between(self.energy[e_range], self.tdos.up.values[e_range], 
+                                self.tdos.down.values[e_range] * -1.0, facecolor=tableau_grey, alpha=0.2)
+                auto_ymax = max( [ auto_ymax, self.tdos.up.values[e_range].max(), self.tdos.down.values[e_range].max() ] )
+            else:
+                ax.fill_between(self.energy[e_range], self.tdos.dos.values[e_range], 
+                                0.0, facecolor=tableau_grey, alpha=0.2)
+                auto_ymax = max( [ auto_ymax, self.tdos.dos.values[e_range].max() ] )
     
         if xrange:
             ax.set_xlim( xrange[0], xrange[1] )
             
         if not ymax:
             ymax = 1.1 * auto_ymax
-        ax.set_ylim(-ymax*1.1,ymax*1.1)
+        ax.set_ylim(-ymax*1.1 if spin_polarised else 0.0,ymax*1.1)
         if legend_pos == 'outside':
             ax.legend(bbox_to_anchor=(1.01, 1.04), loc='upper left')
         else:
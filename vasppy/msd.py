@@ -0,0 +1,219 @@
+"""
+This module provides functions and a class for calculating mean-squared displacements
+and diffusion coefficients from molecular dynamics trajectories.
+"""
+
+import numpy as np
+from vasppy.cell import minimum_image
+
+def unwrap_trajectory( frac_coords ):
+    """
+    Unwrap a trajectory of fractional coordinates, so that atoms that cross a periodic
+    boundary continue moving smoothly instead of jumping back into the cell.
+
+    Each step between consecutive frames is taken as the minimum image displacement,
+    so atoms must move less than half a cell length between frames.
+
+    Args:
+        frac_coords (np.array): (n_frames, n_atoms, 3) fractional coordinates.
+
+    Returns:
+        (np.array): (n_frames, n_atoms, 3) unwrapped fractional coordinates, starting
+            from the coordinates in the first frame.
+    """
+    frac_coords = np.asarray( frac_coords, dtype=float )
+    unwrapped = np.empty_like( frac_coords )
+    unwrapped[0] = frac_coords[0]
+    steps = minimum_image( frac_coords[:-1], frac_coords[1:] )
+    np.cumsum( steps, axis=0, out=unwrapped[1:] )
+    unwrapped[1:] += frac_coords[0]
+    return unwrapped
+
+def frame_displacements( frac_coords, lattice ):
+    """
+    The minimum image displacement of every atom between consecutive frames,
+    in Cartesian coordinates.
+
+    Args:
+        frac_coords (np.array): (n_frames, n_atoms, 3) fractional coordinates.
+        lattice (np.array): 3x3 cell matrix, or (n_frames, 3, 3) cell matrices
+            for a variable-cell trajectory. Each displacement is converted using
+            the cell of the earlier frame.
+
+    Returns:
+        (np.array): (n_frames-1, n_atoms, 3) Cartesian displacements.
+    """
+    frac_coords = np.asarray( frac_coords, dtype=float )
+    lattice = np.asarray( lattice, dtype=float )
+    if lattice.ndim == 3:
+        lattice = lattice[:-1]
+    return np.matmul( minimum_image( frac_coords[:-1], frac_coords[1:] ), lattice )
+
+def to_cartesian( frac_coords, lattice ):
+    """
+    Convert a trajectory of fractional coordinates to Cartesian coordinates.
+
+    Args:
+        frac_coords (np.array): (n_frames, n_atoms, 3) fractional coordinates.
+        lattice (np.array): 3x3 cell matrix, or (n_frames, 3, 3) cell matrices
+            for a variable-cell trajectory.
+
+    Returns:
+        (np.array): (n_frames, n_atoms, 3) Cartesian coordinates.
+    """
+    return np.matmul( frac_coords, np.asarray( lattice, dtype=float ) )
+
+def unwrapped_positions( frac_coords, lattice ):
+    """
+    Unwrapped Cartesian positions for a trajectory, starting from the Cartesian positions
+    in the first frame and adding the Cartesian displacement between each pair of frames.
+
+    For a variable-cell trajectory each displacement is converted using the cell of the
+    earlier frame (see `frame_displacements()`), so a change of cell alone, with fixed
+    fractional coordinates, does not displace the atoms.
+
+    Args:
+        frac_coords (np.array): (n_frames, n_atoms, 3) fractional coordinates.
+        lattice (np.array): 3x3 cell matrix, or (n_frames, 3, 3) cell matrices
+            for a variable-cell trajectory.
+
+    Returns:
+        (np.array): (n_frames, n_atoms, 3) unwrapped Cartesian positions.
+    """
+    frac_coords = np.asarray( frac_coords, dtype=float )
+    lattice = np.asarray( lattice, dtype=float )
+    positions = np.empty_like( frac_coords )
+    positions[0] = np.matmul( frac_coords[0], lattice[0] if lattice.ndim == 3 else lattice )
+    np.cumsum( frame_displacements( frac_coords, lattice ), axis=0, out=positions[1:] )
+    positions[1:] += positions[0]
+    return positions
+
+def msd_fft( positions ):
+    """
+    Calculate the mean-squared displacement of each atom for every lag time,
+    averaged over all time origins, using the FFT (Wiener-Khinchin) algorithm.
+
+    For each lag m, MSD(m) = S1(m) - 2 S2(m), where S2 is the position autocorrelation
+    function (calculated by FFT), and S1 is calculated from cumulative sums of the
+    squared positions. The cost is O(N log N) in the number of frames.
+
+    Args:
+        positions (np.array): (n_frames, n_atoms, 3) unwrapped Cartesian positions.
+
+    Returns:
+        (np.array): (n_frames, n_atoms) mean-squared displacements, for lags 0 to n_frames-1.
+    """
+    positions = np.asarray( positions, dtype=float )
+    n_frames = positions.shape[0]
+    lag_counts = ( n_frames - np.arange( n_frames ) ).reshape( ( -1, ) + ( 1, ) * ( positions.ndim - 2 ) )
+    # S2: autocorrelation of the positions, summed over x, y, and z
+    transform = np.fft.rfft( positions, n=2*n_frames, axis=0 )
+    s2 = np.fft.irfft( np.abs( transform )**2, n=2*n_frames, axis=0 )[:n_frames].sum( axis=-1 ) / lag_counts
+    # S1: Q(m) = 2 sum(D) - sum_{k<m} D(k) - sum_{k<m} D(N-1-k), with D the squared positions
+    d = np.sum( positions**2, axis=-1 )
+    q = 2.0 * d.sum( axis=0 ) - np.cumsum( d, axis=0 ) - np.cumsum( d[::-1], axis=0 )
+    s1 = np.concatenate( [ 2.0 * d.sum( axis=0, keepdims=True ), q[:-1] ] ) / lag_counts
+    return s1 - 2.0 * s2
+
+def tracer_msd( positions ):
+    """
+    The tracer mean-squared displacement, averaged over atoms and time origins.
+
+    Args:
+        positions (np.array): (n_frames, n_atoms, 3) unwrapped Cartesian positions.
+
+    Returns:
+        (np.array): (n_frames) mean-squared displacements.
+    """
+    return msd_fft( positions ).mean( axis=1 )
+
+def collective_msd( positions ):
+    """
+    The collective mean-squared displacement, |sum_i dr_i(t)|^2 / n_atoms, averaged over
+    time origins. This is the MSD of the centre of mass multiplied by the number of atoms.
+
+    Args:
+        positions (np.array): (n_frames, n_atoms, 3) unwrapped Cartesian positions.
+
+    Returns:
+        (np.array): (n_frames) collective mean-squared displacements.
+    """
+    positions = np.asarray( positions, dtype=float )
+    return msd_fft( positions.sum( axis=1, keepdims=True ) )[:,0] / positions.shape[1]
+
+class MeanSquaredDisplacement:
+    """
+    Mean-squared displacements for each species in a trajectory.
+
+    Attributes:
+        time (np.array): Lag times.
+        species (list(str)): The species, in order of first appearance.
+        tracer (dict(str:np.array)): Tracer MSD for each species.
+        collective (dict(str:np.array)): Collective MSD for each species.
+    """
+
+    def __init__( self, frac_coords, lattice, species, timestep=1.0 ):
+        """
+        Initialise a MeanSquaredDisplacement object.
+
+        Args:
+            frac_coords (np.array): (n_frames, n_atoms, 3) fractional coordinates.
+                These can be wrapped into the cell: the trajectory is unwrapped first.
+            lattice (np.array): 3x3 cell matrix, or (n_frames, 3, 3) cell matrices
+                for a variable-cell trajectory. See `unwrapped_positions()`.
+            species (list(str)): The species of each atom.
+            timestep (:obj:`float`, optional): The time between frames. Defaults to 1.0.
+
+        Returns:
+            None
+        """
+        positions = unwrapped_positions( frac_coords, lattice )
+        self.time = np.arange( positions.shape[0] ) * timestep
+        self.species = list( dict.fromkeys( species ) )
+        species = np.array( species )
+        per_atom = msd_fft( positions )
+        self.tracer = {}
+        self.collective = {}
+        for s in self.species:
+            atoms = species == s
+            self.tracer[s] = per_atom[:,atoms].mean( axis=1 )
+            self.collective[s] = collective_msd( positions[:,atoms] )
+
+    def diffusion_coefficient( self, species, fit_range=None, collective=False ):
+        """
+        Estimate a diffusion coefficient from the slope of a linear fit to the MSD,
+        D = slope / 6.
+
+        Args:
+            species (str): The species.
+            fit_range (:obj:`tuple(float, float)`, optional): The range of lag times to fit.
+                Defaults to None, which fits from 10% to 50% of the longest lag time.
+            collective (:obj:`bool`, optional): If True, use the collective MSD. Defaults to False.
+
+        Returns:
+            (float): The diffusion coefficient, in units of length^2 / time.
+        """
+        msd = self.collective[ species ] if collective else self.tracer[ species ]
+        if fit_range is None:
+            fit_range = ( 0.1 * self.time[-1], 0.5 * self.time[-1] )
+        in_range = ( self.time >= fit_range[0] ) & ( self.time <= fit_range[1] )
+        if np.count_nonzero( in_range ) < 2:
+            raise ValueError( 'At least two lag times are needed in fit_range' )
+        slope = np.polyfit( self.time[ in_range ], msd[ in_range ], 1 )[0]
+        return slope / 6.0
+
+    @classmethod
+    def from_xdatcar( cls, xdatcar, timestep=1.0 ):
+        """
+        Initialise a MeanSquaredDisplacement object from an Xdatcar trajectory, including
+        memory-mapped binary trajectories (see `vasppy.xdatcar.Xdatcar.from_binary()`).
+
+        Args:
+            xdatcar (vasppy.xdatcar.Xdatcar): The trajectory.
+            timestep (:obj:`float`, optional): The time between frames. Defaults to 1.0.
+
+        Returns:
+            (MeanSquaredDisplacement)
+        """
+        lattice = xdatcar.poscar[0].cell.matrix if xdatcar.lattices is None else xdatcar.lattices
+        return cls( xdatcar[:], lattice, xdatcar.poscar[0].labels(), timestep=timestep )
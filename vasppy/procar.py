@@ -1,12 +1,16 @@
 import numpy as np
 import re
 import math
+import sys
 import warnings
 from .units import angstrom_to_bohr, ev_to_hartree
-from .band import Band
-from copy import deepcopy
+from .band import Band, handle_occupancies
+from .utils import write_array_cache, read_array_cache
+import os
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor
 import fortranformat as ff
-from functools import reduce
+from functools import partial
 
 class KPoint():
 
@@ -75,6 +79,191 @@ def projections_parser( string ):
     data = np.array( [ x.split() for x in data ], dtype = float )
     return data
 
+band_regex = re.compile( r"band\s*(\d+)\s*#\s*energy\s*([-.\d]+)\s?\s*#\s*occ.\s*([-.\d]+)" )
+
+def _index_map( selected, size ):
+    """Map each of `size` indices to its position in the (sorted) selection, or -1 if 
+    it is not selected. If `selected` is None, every index is selected."""
+    index_map = np.full( size, -1, dtype=int )
+    if selected is None:
+        selected = np.arange( size )
+    selected = np.unique( selected )
+    index_map[ selected ] = np.arange( len( selected ) )
+    return index_map
+
+def _header_counts( file_in ):
+    """Read the numbers of k-points, bands, and ions from the header of a PROCAR file,
+    opened in binary mode, leaving the file positioned after the first ``# of k-points`` line."""
+    file_in.readline()
+    return [ int( f ) for f in get_numbers_from_string( file_in.readline().decode() ) ]
+
+def _check_indices( name, indices, size ):
+    """Raise a ValueError if any selected index is outside ``range( size )``."""
+    if indices is None:
+        return
+    indices = np.atleast_1d( indices )
+    if indices.size and ( indices.min() < 0 or indices.max() >= size ):
+        raise ValueError( '{} indices must be between 0 and {}: {}'.format( name, size - 1, indices.tolist() ) )
+
+def _allocate_projections( first_band_rows, number_of_k_points, number_of_bands, rows_per_block, 
+                           ion_rows, orbitals, store_first_band ):
+    """Allocate the projections array, sized from the rows read for the first band
+    in the file and the selected ions and orbitals, and optionally store the first band."""
+    first_band = np.array( first_band_rows, dtype=float ).reshape( -1, rows_per_block, len( first_band_rows[0] ) )
+    first_band = first_band[ :, ion_rows ]
+    if orbitals is not None:
+        first_band = first_band[ :, :, orbitals ]
+    projections = np.zeros( ( 1, number_of_k_points, number_of_bands ) + first_band.shape )
+    if store_first_band:
+        projections[ 0, 0, 0 ] = first_band
+    return projections
+
+def stream_parser( file_in, number_of_k_points, number_of_bands, number_of_ions, lazy=False,
+                   k_point_filter=None, bands=None, ions=None, orbitals=None ):
+    """Parse the body of a PROCAR file in a single pass.
+
+    Reads the file line by line after the first ``# of k-points`` header, and writes
+    k-point, band, and projection data directly into preallocated numpy arrays.
+    The number of lm-projections is taken from the first ``ion`` header line, and
+    the number of projection blocks per band (1, or 4 for non-collinear calculations)
+    from the first band. A second ``# of k-points`` header marks the start of the 
+    spin-down block of a spin-polarised calculation.
+
+    The byte offset of the first projection row for each band is recorded, so that
+    projections can be read later with :func:`read_projection_block`.
+
+    k-points, bands, ions, and orbitals can be selected as the file is read, so that
+    data for the unselected rows and columns are never stored. Selections are returned in 
+    file order. The ``tot`` row (the sum over all ions in the file) is always kept as the 
+    last ion row.
+
+    Args:
+        file_in (file): PROCAR file, opened in binary mode and positioned after the 
+            first ``# of k-points`` header.
+        number_of_k_points (int): The number of k-points, from the PROCAR header.
+        number_of_bands (int): The number of bands, from the PROCAR header.
+        number_of_ions (int): The number of ions, from the PROCAR header.
+        lazy (:obj:`bool`, optional): If ``True``, the projections are not parsed, and the 
+            projections array is left as zeros. Default is ``False``.
+        k_point_filter (:obj:`func`, optional): Function taking the k-point index (counting from 0)
+            and :obj:`procar.KPoint` and returning ``True`` if that k-point should be kept. 
+            Default is to keep all k-points.
+        bands (:obj:`list(int)`, optional): Band indices (counting from 0) to keep. Default is all bands.
+        ions (:obj:`list(int)`, optional): Ion indices (counting from 0) to keep. Default is all ions.
+        orbitals (:obj:`list(int)`, optional): lm-projection column indices to keep. Default is all columns.
+
+    Returns:
+        (np.array, np.array, np.array, np.array, np.array, np.array): The k-point fractional coordinates, 
+            k-point weights, band energies, band occupancies, projections, and projection offsets. 
+            Energies, occupancies, and offsets have shape (k_point_blocks, k-points, bands). 
+            Projections have shape (k_point_blocks, k-points, bands, channels, ions+1, lm-projections).
+
+    """
+    rows_per_block = number_of_ions + 1
+    band_map = _index_map( bands, number_of_bands )
+    number_of_selected_bands = np.count_nonzero( band_map >= 0 )
+    ion_map = _index_map( None if ions is None else np.append( ions, number_of_ions ), rows_per_block )
+    ion_rows = np.flatnonzero( ion_map >= 0 )
+    if orbitals is not None:
+        orbitals = np.unique( orbitals ).tolist()
+    k_point_map = np.full( number_of_k_points, -1, dtype=int )
+    number_of_selected_k_points = 0
+    k_point_frac_coords = np.zeros( ( number_of_k_points, 3 ) )
+    k_point_weights = np.zeros( number_of_k_points )
+    energies = np.zeros( ( 1, number_of_k_points, number_of_selected_bands ) )
+    occupancies = np.zeros( ( 1, number_of_k_points, number_of_selected_bands ) )
+    offsets = np.zeros( ( 1, number_of_k_points, number_of_selected_bands ), dtype=np.int64 )
+    projections = None
+    first_band_rows = []
+    block, k, b, row = 0, -1, -1, 0
+    kk, bb = -1, -1
+    position = file_in.tell()
+    for line in file_in:
+        line_start = position
+        position += len( line )
+        stripped = line.lstrip()
+        if not stripped:
+            continue
+        if stripped[:1].isdigit() or stripped.startswith( b'-' ) or stripped.startswith( b'tot' ):
+            if projections is None:
+                first_band_rows.append( stripped.split()[1:] )
+            if kk >= 0 and bb >= 0:
+                if row == 0:
+                    offsets[ block, kk, bb ] = line_start
+                if projections is not None and not lazy:
+                    channel, ion = divmod( row, rows_per_block )
+                    if ion_map[ ion ] >= 0:
+                        values = stripped.split()[1:]
+                        if orbitals is not None:
+                            values = [ values[ i ] for i in orbitals ]
+                        projections[ block, kk, bb, channel, ion_map[ ion ] ] = values
+            row += 1
+            continue
+        if projections is None and first_band_rows and not stripped.startswith( b'ion' ):
+            projections = _allocate_projections( first_band_rows, number_of_k_points, number_of_selected_bands, 
+                rows_per_block, ion_rows, orbitals, k_point_map[0] >= 0 and band_map[0] >= 0 )
+        if stripped.startswith( b'band' ):
+            b += 1
+            row = 0
+            bb = band_map[ b ]
+            if kk >= 0 and bb >= 0:
+                _, energy, occupancy = band_regex.match( stripped.decode() ).groups()
+                energies[ block, kk, bb ] = float( energy )
+                occupancies[ block, kk, bb ] = float( occupancy )
+        elif stripped.startswith( b'k-point' ):
+            k += 1
+            b = -1
+            if block == 0:
+                k_point = k_point_parser( line.decode() )[0]
+                if k_point_filter is None or k_point_filter( k, k_point ):
+                    k_point_map[ k ] = number_of_selected_k_points
+                    k_point_frac_coords[ number_of_selected_k_points ] = k_point.frac_coords
+                    k_point_weights[ number_of_selected_k_points ] = k_point.weight
+                    number_of_selected_k_points += 1
+            kk = k_point_map[ k ]
+        elif stripped.startswith( b'# of k-points' ):
+            block += 1
+            k = -1
+            for a in ( energies, occupancies, offsets, projections ):
+                a.resize( ( block + 1, ) + a.shape[1:], refcheck=False )
+    if projections is None:
+        projections = _allocate_projections( first_band_rows, number_of_k_points, number_of_selected_bands, 
+            rows_per_block, ion_rows, orbitals, k_point_map[0] >= 0 and band_map[0] >= 0 )
+    n = number_of_selected_k_points
+    return ( k_point_frac_coords[ :n ], k_point_weights[ :n ], energies[ :, :n ], occupancies[ :, :n ], 
+             projections[ :, :n ], offsets[ :, :n ] )
+
+def read_projection_block( file_in, offset, shape ):
+    """Read the projections for a single band from a PROCAR file.
+
+    Args:
+        file_in (file): PROCAR file, opened in binary mode.
+        offset (int): Byte offset of the first projection row for this band.
+        shape (tuple(int)): Shape of the projection block ( channels, ions+1, lm-projections ).
+            The number of lm-projections can be given as -1.
+
+    Returns:
+        (np.array): The projections for this band.
+
+    """
+    file_in.seek( offset )
+    rows = [ file_in.readline().split()[1:] for _ in range( shape[0] * shape[1] ) ]
+    return np.array( rows, dtype=float ).reshape( shape )
+
+def _read_procar_arrays( filename, **kwargs ):
+    """Read a PROCAR file, and return only its arrays and metadata, for :meth:`Procar.from_files`.
+
+    Args:
+        filename (str): Filename of the PROCAR file.
+        **kwargs: See :meth:`Procar.from_file`.
+
+    Returns:
+        (dict, dict): The arrays, and the metadata, keyed by name.
+
+    """
+    arrays, metadata = Procar.from_file( filename, **kwargs )._get_arrays()
+    return { name: np.asarray( a ) for name, a in arrays.items() }, metadata
+
 def area_of_a_triangle_in_cartesian_space( a, b, c ):
     """
     Returns the area of a triangle defined by three points in Cartesian space.
@@ -161,7 +350,12 @@ class Procar:
                     Axes are k-points, bands, spin-channels, ions and sum over ions, lm-projections.
 
         bands (numpy.array(:obj:`Band`)): A numpy array of ``Band`` objects, that contain band index, energy, and occupancy data.
+        band_energies (numpy.array(float)): A 3D numpy array of band energies.
+            Axes are k-point blocks (spin channels for spin-polarised calculations), k-points, and bands.
+        band_occupancies (numpy.array(float)): A 3D numpy array of band occupancies, with the same axes as ``band_energies``.
         k_points (numpy.array(:obj:`KPoint`)): A numpy array of ``KPoint`` objects, that contain fractional coordinates and weights for each k-point.
+        k_point_frac_coords (numpy.array(float)): A (number_of_k_points, 3) numpy array of k-point fractional coordinates.
+        k_point_weights (numpy.array(float)): A numpy array of k-point weights.
         number_of_k_points (int): The number of k-points.
         number_of_bands (int): The number of bands.
         spin_channels (int): Number of spin channels in the PROCAR data:
@@ -185,19 +379,143 @@ class Procar:
         self._number_of_projections = None
         self._k_point_blocks = None
         self._data = None
-        self._bands = None
-        self._k_points = None
+        self._raw_projections = None
+        self._projection_offsets = None
+        self._projections_loaded = None
+        self._projection_selection = None
+        self._band_numbers = None
+        self._band_energies = None
+        self._band_occupancies = None
+        self._k_point_frac_coords = None
+        self._k_point_weights = None
+        self.filename = None
         self.calculation = { 'non_spin_polarised': False, 'non_collinear': False, 'spin_polarised': False }
         if negative_occupancies not in [ 'warn', 'raise', 'zero' ]:
             raise ValueError( "negative_occupancies can be one of [ 'warn', 'raise', 'zero' ]" )
         self.negative_occupancies = negative_occupancies
         #self.non_spin_polarised = None
 
+    @property
+    def _data( self ):
+        """The projection data. For a :obj:`Procar` read with ``lazy=True``, any projections
+        that have not yet been read are read from the ``PROCAR`` file on first access."""
+        if self._projections_loaded is not None and not self._projections_loaded.all():
+            self._load_projections( ~self._projections_loaded )
+        return self._projection_data
+
+    @_data.setter
+    def _data( self, data ):
+        self._projection_data = data
+        self._raw_projections = None
+        self._projection_offsets = None
+        self._projections_loaded = None
+        self._projection_selection = None
+
+    def _load_projections( self, required ):
+        """Read the projections for a set of bands from the ``PROCAR`` file, using the 
+        byte offsets recorded when the file was first read.
+
+        Args:
+            required (np.array(bool)): ( k_point_blocks, k-points, bands ) boolean mask 
+                of the bands to read.
+
+        Returns:
+            None
+
+        """
+        ion_rows, orbitals = self._projection_selection
+        shape = ( self._raw_projections.shape[3], self._number_of_ions_in_file + 1, -1 )
+        with open( self.filename, 'rb' ) as file_in:
+            for block, k, b in zip( *np.nonzero( required ) ):
+                projections = read_projection_block( file_in, self._projection_offsets[ block, k, b ], shape )[ :, ion_rows ]
+                if orbitals is not None:
+                    projections = projections[ :, :, orbitals ]
+                self._raw_projections[ block, k, b ] = projections
+        self._projections_loaded |= required
+
+    def projections( self, k_points=None, bands=None, ions=None, orbitals=None ):
+        """Select a subset of the projection data.
+
+        For a :obj:`Procar` read with ``lazy=True``, only the projections for the selected 
+        k-points and bands are read from the ``PROCAR`` file.
+
+        Args:
+            k_points (:obj:`list(int)`, optional): k-point indices (counting from 0). Default is all k-points.
+            bands (:obj:`list(int)`, optional): Band indices (counting from 0). Default is all bands.
+            ions (:obj:`list(int)`, optional): Ion indices (counting from 0, with the number of ions 
+                as the index for the total over all ions). Default is all ions and the total.
+            orbitals (:obj:`list(int)`, optional): lm-projection indices. Default is all projections.
+
+        Returns:
+            (np.array): 5D numpy array of the selected projections, with the same axes as ``_data``.
+
+        """
+        k_points = np.arange( self._number_of_k_points ) if k_points is None else np.atleast_1d( k_points )
+        bands = np.arange( self._number_of_bands ) if bands is None else np.atleast_1d( bands )
+        if self._projections_loaded is not None:
+            required = np.zeros_like( self._projections_loaded )
+            required[ np.ix_( range( self._k_point_blocks ), k_points, bands ) ] = True
+            required &= ~self._projections_loaded
+            if required.any():
+                self._load_projections( required )
+        data = self._projection_data[ k_points ][ :, bands ]
+        if ions is not None:
+            data = data[ :, :, :, ions ]
+        if orbitals is not None:
+            data = data[ :, :, :, :, orbitals ]
+        return data
+
     @property
     def occupancy( self ):
-        return np.array( [ [ band.index, band.occupancy ] for band in self._bands ] )
+        return np.column_stack( ( self._band_indices.ravel(), self._band_occupancies.ravel() ) )
+
+    @property
+    def _band_indices( self ):
+        if self._band_numbers is None:
+            band_numbers = np.arange( 1, self._number_of_bands + 1, dtype=float )
+        else:
+            band_numbers = np.asarray( self._band_numbers, dtype=float )
+        return np.broadcast_to( band_numbers, self._band_energies.shape )
+
+    @property
+    def _bands( self ):
+        """:obj:`Band` views of the band data, ordered by k-point block, k-point, and band."""
+        if self._band_energies is None:
+            return None
+        return np.array( [ Band( i, e, o, negative_occupancies='ignore' ) for i, e, o in 
+            zip( self._band_indices.ravel().tolist(), self._band_energies.ravel().tolist(), self._band_occupancies.ravel().tolist() ) ] )
+
+    @_bands.setter
+    def _bands( self, bands ):
+        if bands is None:
+            self._band_energies = None
+            self._band_occupancies = None
+        else:
+            shape = ( -1, self._number_of_k_points, self._number_of_bands )
+            self._band_energies = np.array( [ band.energy for band in bands ] ).reshape( shape )
+            self._band_occupancies = np.array( [ band.occupancy for band in bands ] ).reshape( shape )
+
+    @property
+    def _k_points( self ):
+        """:obj:`KPoint` views of the k-point data."""
+        if self._k_point_weights is None:
+            return None
+        return [ KPoint( index=i, frac_coords=c, weight=w ) for i, ( c, w ) in 
+            enumerate( zip( self._k_point_frac_coords, self._k_point_weights.tolist() ), 1 ) ]
+
+    @_k_points.setter
+    def _k_points( self, k_points ):
+        if k_points is None:
+            self._k_point_frac_coords = None
+            self._k_point_weights = None
+        else:
+            self._k_point_frac_coords = np.array( [ kp.frac_coords for kp in k_points ], dtype=float ).reshape( -1, 3 )
+            self._k_point_weights = np.array( [ kp.weight for kp in k_points ], dtype=float )
 
     def __add__( self, other ):
+        return self.concatenate( [ self, other ] )
+
+    def _check_can_concatenate( self, other ):
         if self.spin_channels != other.spin_channels:
             raise ValueError( 'Can only concatenate Procars with equal spin_channels: {}, {}'.format( self.spin_channels, other.spin_channels ) )
         if self.number_of_ions != other.number_of_ions:
@@ -210,73 +528,108 @@ class Procar:
             raise ValueError( 'Can only concatenate Procars with equal k_point_blocks: {}, {}'.format( self._k_point_blocks, other._k_point_blocks ) )
         if self.calculation != other.calculation:
             raise ValueError( 'Can only concatenate Procars from equal calculations: {}, {}'.format( self.calculation, other.calculation ) )
-        new_procar = deepcopy( self )
-        new_procar._data = np.concatenate( ( self._data, other._data ), axis=0 )
-        new_procar._number_of_k_points = self.number_of_k_points + other.number_of_k_points
-        new_procar._bands = []
-        new_procar._bands = np.ravel( np.concatenate( [ self.bands, other.bands ], axis=1 ) )
-        new_procar._k_points = self._k_points + other._k_points
-        for i, kp in enumerate( new_procar._k_points, 1 ):
-            kp.index = i    
-        new_procar.sanity_check()
-        return new_procar
- 
-    def parse_projections( self ):
-        self.projection_data = projections_parser( self.read_in )
-        try:
-            assert( self._number_of_bands * self._number_of_k_points == len( self.projection_data ) )
-            self._spin_channels = 1 # non-magnetic, non-spin-polarised
-            self._k_point_blocks = 1
-            self.calculation[ 'non_spin_polarised' ] = True
-        except:
-            if self._number_of_bands * self._number_of_k_points * 4 == len( self.projection_data ):
-                self._spin_channels = 4 # non-collinear (spin-orbit coupling)
-                self._k_point_blocks = 1
-                self.calculation[ 'non_collinear' ] = True
-                pass
-            elif self._number_of_bands * self._number_of_k_points * 2 == len( self.projection_data ):
-                self._spin_channels = 2 # spin-polarised
-                self._k_point_blocks = 2
-                self.calculation[ 'spin_polarised' ] = True
-                pass
-            else:
-                raise
-        self._number_of_projections = int( self.projection_data.shape[1] / ( self._number_of_ions + 1 ) ) - 1
 
-    def parse_k_points( self ):
-        self._k_points = k_point_parser( self.read_in )[:self._number_of_k_points]
+    @classmethod
+    def concatenate( cls, pcars ):
+        """Concatenate a sequence of :obj:`Procar` objects along the k-point axis.
 
-    def parse_bands( self ):
-        band_data = re.findall( r"band\s*(\d+)\s*#\s*energy\s*([-.\d]+)\s?\s*#\s"r"*occ.\s*([-.\d]+)", self.read_in )
-        self._bands = np.array( [ Band( float(i), float(e), float(o), negative_occupancies=self.negative_occupancies ) for i, e, o in band_data ] )
+        The projection data for every :obj:`Procar` are copied once into a single preallocated 
+        array, and the k-points are renumbered once at the end.
 
+        Args:
+            pcars (list(:obj:`Procar`)): The :obj:`Procar` objects to concatenate, in order.
+
+        Returns:
+            (:obj:`vasppy.Procar`)
+
+        """
+        first = pcars[0]
+        for other in pcars[1:]:
+            first._check_can_concatenate( other )
+        new_procar = copy( first )
+        new_procar.filename = None
+        new_procar.calculation = dict( first.calculation )
+        new_procar._number_of_k_points = sum( p.number_of_k_points for p in pcars )
+        new_procar._data = np.empty( ( new_procar._number_of_k_points, ) + first._data.shape[1:], 
+                                     dtype=first._data.dtype )
+        k = 0
+        for p in pcars:
+            new_procar._data[ k:k+p.number_of_k_points ] = p._data
+            k += p.number_of_k_points
+        new_procar._band_energies = np.concatenate( [ p._band_energies for p in pcars ], axis=1 )
+        new_procar._band_occupancies = np.concatenate( [ p._band_occupancies for p in pcars ], axis=1 )
+        new_procar._k_point_frac_coords = np.concatenate( [ p._k_point_frac_coords for p in pcars ], axis=0 )
+        new_procar._k_point_weights = np.concatenate( [ p._k_point_weights for p in pcars ] )
+        new_procar.sanity_check()
+        return new_procar
+ 
     def sanity_check( self ):
-        assert( self._number_of_k_points == len( self._k_points ) ), "k-point number mismatch: {} in header; {} in file".format( self._number_of_k_points, len( self._k_points ) )
-        read_bands = len( self._bands ) / self._number_of_k_points / self._k_point_blocks
+        assert( self._number_of_k_points == len( self._k_point_weights ) ), "k-point number mismatch: {} in header; {} in file".format( self._number_of_k_points, len( self._k_point_weights ) )
+        read_bands = self._band_energies.size / self._number_of_k_points / self._k_point_blocks
         assert( self._number_of_bands == read_bands ), "band mismatch: {} in header; {} in file".format( self._number_of_bands, read_bands )
 
     @classmethod
-    def from_files( cls, filenames, **kwargs ):
+    def from_files( cls, filenames, n_jobs=1, **kwargs ):
         """Create a :obj:`Procar` object by reading the projected wavefunction character of each band
         from a series of VASP ``PROCAR`` files.
 
         Useful when e.g. a band-structure calculation has been split over multiple VASP calculations,
         for example, when using hybrid functionals.
 
+        Each file can be parsed in a separate worker process. Only the parsed arrays are returned 
+        from each worker, and these are copied into a single set of preallocated arrays.
+
         Args:
-            filename (str): Filename of the ``PROCAR`` file.
+            filenames (list(str)): Filenames of the ``PROCAR`` files.
+            n_jobs (:obj:`int`, optional): Number of worker processes used to parse the files.
+                Default is 1, which parses the files serially in the current process.
+                ``None`` or -1 uses one process per CPU.
             **kwargs: See the ``from_file()`` method for a description of keyword arguments.
 
         Returns:
             (:obj:`vasppy.Procar`)
         
         """
-        pcars = [ cls.from_file( f, **kwargs ) for f in filenames ]
-        return reduce( cls.__add__, pcars )
+        filenames = list( filenames )
+        if n_jobs is None or n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs < 1:
+            raise ValueError( 'n_jobs must be a positive integer, -1, or None: {}'.format( n_jobs ) )
+        read = partial( _read_procar_arrays, **kwargs )
+        if n_jobs > 1 and len( filenames ) > 1:
+            with ProcessPoolExecutor( max_workers=min( n_jobs, len( filenames ) ) ) as executor:
+                results = list( executor.map( read, filenames ) )
+        else:
+            results = [ read( f ) for f in filenames ]
+        first_arrays, metadata = results[0]
+        for _, other in results[1:]:
+            for key in [ 'spin_channels', 'number_of_ions', 'number_of_bands', 'number_of_projections', 
+                         'k_point_blocks', 'calculation' ]:
+                if metadata[ key ] != other[ key ]:
+                    raise ValueError( 'Can only combine PROCAR files with equal {}: {}, {}'.format( key, metadata[ key ], other[ key ] ) )
+        metadata = dict( metadata, number_of_k_points=sum( m[ 'number_of_k_points' ] for _, m in results ) )
+        # the axis of each array that runs over k-points
+        k_point_axes = { 'data': 0, 'energies': 1, 'occupancies': 1, 'k_point_frac_coords': 0, 'k_point_weights': 0 }
+        arrays = { 'band_numbers': first_arrays[ 'band_numbers' ] }
+        for name, axis in k_point_axes.items():
+            shape = list( first_arrays[ name ].shape )
+            shape[ axis ] = metadata[ 'number_of_k_points' ]
+            arrays[ name ] = np.empty( shape, dtype=first_arrays[ name ].dtype )
+        k = 0
+        for file_arrays, file_metadata in results:
+            n = file_metadata[ 'number_of_k_points' ]
+            for name, axis in k_point_axes.items():
+                arrays[ name ][ ( slice( None ), ) * axis + ( slice( k, k+n ), ) ] = file_arrays[ name ]
+            k += n
+        pcar = cls( negative_occupancies=kwargs.get( 'negative_occupancies', 'warn' ) )
+        pcar._set_arrays( arrays, metadata )
+        pcar.sanity_check()
+        return pcar
 
     @classmethod
     def from_file( cls, filename, negative_occupancies='warn',
-                   select_zero_weighted_k_points=False ):
+                   select_zero_weighted_k_points=False, cache=False, lazy=False,
+                   k_points=None, bands=None, ions=None, orbitals=None ):
         """Create a :obj:`Procar` object by reading the projected wavefunction character of each band
         from a VASP ``PROCAR`` file.
 
@@ -291,85 +644,277 @@ class Procar:
                     - ``zero``:           Negative partial occupancies will be set to zero.
             select_zero_weighted_k_points (:obj:`bool`, optional): Set to ``True`` to only 
                 read in zero-weighted k-points from the ``PROCAR`` file. Default is ``False``.
+            cache (:obj:`bool`, optional): Set to ``True`` to use a binary cache of the parsed data,
+                stored in ``filename.cache`` beside the ``PROCAR`` file. If a valid cache exists 
+                it is loaded as memory-mapped arrays, otherwise the ``PROCAR`` file is parsed and 
+                the cache is written. The cache is invalidated if the size or modification time of the
+                ``PROCAR`` file changes. Default is ``False``.
+            lazy (:obj:`bool`, optional): Set to ``True`` to read only the k-point and band data 
+                from the ``PROCAR`` file, and to index the position of the projections for each band.
+                Projections are then read only when they are first requested, either through
+                ``projections()``, or for the full data set when ``_data`` is first accessed.
+                Default is ``False``.
+            k_points (:obj:`list(int)`, optional): Indices of the k-points to read (counting from 0).
+                Default is to read all k-points.
+            bands (:obj:`list(int)`, optional): Indices of the bands to read (counting from 0), e.g. 
+                ``range( 10, 20 )``. Default is to read all bands.
+            ions (:obj:`list(int)`, optional): Indices of the ions to read (counting from 0). The 
+                total over all ions in the file is always kept. Default is to read all ions.
+            orbitals (:obj:`list(int)`, optional): Indices of the lm-projections to read. 
+                Default is to read all projections.
+
+            k-points, bands, ions, and orbitals are selected as the ``PROCAR`` file is read, 
+            and are stored in file order. A ValueError is raised if any k-point, band, or ion
+            index is outside the range given in the ``PROCAR`` header. If ``cache`` is ``True``, 
+            the full ``PROCAR`` file is cached, and the selection is applied after reading the cache.
 
         Returns:
             (:obj:`vasppy.Procar`)
         
         """
+        with open( filename, 'rb' ) as file_in:
+            number_of_k_points, number_of_bands, number_of_ions = _header_counts( file_in )
+        _check_indices( 'k-point', k_points, number_of_k_points )
+        _check_indices( 'band', bands, number_of_bands )
+        _check_indices( 'ion', ions, number_of_ions )
         pcar = cls( negative_occupancies=negative_occupancies )
-        pcar._read_from_file( filename=filename )
-        if select_zero_weighted_k_points:
-            k_point_indices = [ i for i, kp in enumerate( pcar.k_points ) if kp.weight == 0.0 ]
-            pcar = pcar.select_k_points( k_point_indices )
+        selection = { 'k_points': k_points, 'bands': bands, 'ions': ions, 'orbitals': orbitals }
+        if cache:
+            if not pcar._read_from_cache( filename=filename ):
+                pcar._read_from_file( filename=filename, lazy=lazy )
+                pcar.save_cache()
+            if select_zero_weighted_k_points:
+                zero_weighted = np.flatnonzero( pcar._k_point_weights == 0.0 )
+                selection[ 'k_points' ] = zero_weighted if k_points is None else np.intersect1d( k_points, zero_weighted )
+            if any( v is not None for v in selection.values() ):
+                pcar = pcar._select( **{ k: None if v is None else np.unique( v ) for k, v in selection.items() } )
+        else:
+            pcar._read_from_file( filename=filename, lazy=lazy,
+                select_zero_weighted_k_points=select_zero_weighted_k_points, **selection )
         return pcar
        
     def read_from_file( self, filename ):
         warnings.warn( "read_from_file() is deprecated as a part of the public API.\nPlease use Procar.from_file() or Procar.from_files() instead" )
         return self._read_from_file( filename=filename )
  
-    def _read_from_file( self, filename ):
+    def _read_from_file( self, filename, lazy=False, select_zero_weighted_k_points=False, 
+                         k_points=None, bands=None, ions=None, orbitals=None ):
         """Reads the projected wavefunction character of each band from a VASP PROCAR file.
 
+        The file is parsed in a single pass, line by line, and the k-point, band, and
+        projection data are written directly into preallocated numpy arrays, so the
+        full file contents are never held in memory as a string.
+
         Args:
             filename (str): Filename of the PROCAR file.
+            lazy (:obj:`bool`, optional): If ``True``, only index the projection data, 
+                and read it when it is first requested. Default is ``False``.
+            select_zero_weighted_k_points (:obj:`bool`, optional): If ``True``, only read 
+                zero-weighted k-points. Default is ``False``.
+            k_points, bands, ions, orbitals (:obj:`list(int)`, optional): Indices of the
+                k-points, bands, ions, and lm-projections to read. See ``from_file()``.
 
         Returns:
             None
         
         """
-        with open( filename, 'r' ) as file_in:
-            file_in.readline()
-            self._number_of_k_points, self._number_of_bands, self._number_of_ions = [ int( f ) for f in get_numbers_from_string( file_in.readline() ) ]
-            self.read_in = file_in.read()
-        self.parse_k_points()
-        self.parse_bands()
-        self.parse_projections()
-        self.sanity_check()
-        self.read_in = None # clear memory
-        if self.calculation[ 'spin_polarised' ]:
-            self._data = self.projection_data.reshape( self._spin_channels, self._number_of_k_points, self._number_of_bands, self._number_of_ions+1, self._number_of_projections+1 )[:,:,:,:,1:].swapaxes( 0, 1).swapaxes( 1, 2 )
+        with open( filename, 'rb' ) as file_in:
+            number_of_k_points, number_of_bands, number_of_ions = _header_counts( file_in )
+            k_point_filter = None
+            if k_points is not None or select_zero_weighted_k_points:
+                k_point_set = None if k_points is None else set( np.asarray( k_points ).tolist() )
+                k_point_filter = lambda i, kp: ( ( k_point_set is None or i in k_point_set ) and
+                                                 ( not select_zero_weighted_k_points or kp.weight == 0.0 ) )
+            k_point_frac_coords, k_point_weights, energies, occupancies, projections, offsets = stream_parser( file_in,
+                number_of_k_points, number_of_bands, number_of_ions, lazy=lazy,
+                k_point_filter=k_point_filter, bands=bands, ions=ions, orbitals=orbitals )
+        self._k_point_blocks, self._number_of_k_points, self._number_of_bands, channels, ions_plus_one, self._number_of_projections = projections.shape
+        self._number_of_ions = ions_plus_one - 1
+        self._number_of_ions_in_file = number_of_ions
+        self._band_numbers = np.flatnonzero( _index_map( bands, number_of_bands ) >= 0 ) + 1
+        if self._k_point_blocks == 2:
+            self._spin_channels = 2 # spin-polarised
+            self.calculation[ 'spin_polarised' ] = True
+            self._data = projections[ :, :, :, 0 ].transpose( 1, 2, 0, 3, 4 )
         else:
-            self._data = self.projection_data.reshape( self._number_of_k_points, self._number_of_bands, self._spin_channels, self._number_of_ions+1, self._number_of_projections+1 )[:,:,:,:,1:]
+            self._spin_channels = channels
+            if channels == 4:
+                self.calculation[ 'non_collinear' ] = True # non-collinear (spin-orbit coupling)
+            else:
+                self.calculation[ 'non_spin_polarised' ] = True # non-magnetic, non-spin-polarised
+            self._data = projections[ 0 ]
+        self._k_point_frac_coords = k_point_frac_coords
+        self._k_point_weights = k_point_weights
+        self._band_energies = energies
+        self._band_occupancies = handle_occupancies( occupancies, negative_occupancies=self.negative_occupancies )
+        self.filename = filename
+        if lazy:
+            self._raw_projections = projections
+            self._projection_offsets = offsets
+            self._projections_loaded = np.zeros( offsets.shape, dtype=bool )
+            self._projection_selection = ( np.flatnonzero( _index_map( None if ions is None else np.append( ions, number_of_ions ), number_of_ions + 1 ) >= 0 ),
+                                           None if orbitals is None else np.unique( orbitals ) )
+        self.sanity_check()
+
+    def save_cache( self, filename=None ):
+        """Write the parsed data for this :obj:`Procar` to a binary cache beside the source
+        ``PROCAR`` file, for fast reloading with ``Procar.from_file( filename, cache=True )``.
+
+        Args:
+            filename (:obj:`str`, optional): Filename of the source ``PROCAR`` file.
+                Default is the file this :obj:`Procar` was read from.
+
+        Returns:
+            None
+
+        """
+        if filename is None:
+            filename = self.filename
+        if filename is None:
+            raise ValueError( 'No source PROCAR filename to cache this Procar against' )
+        write_array_cache( filename, *self._get_arrays() )
+
+    def _get_arrays( self ):
+        """The arrays and metadata that fully describe this :obj:`Procar`.
+
+        Returns:
+            (dict, dict): The arrays, and the metadata, keyed by name.
+
+        """
+        arrays = { 'data': self._data,
+                   'band_numbers': self._band_indices[ 0, 0 ],
+                   'energies': self._band_energies,
+                   'occupancies': self._band_occupancies,
+                   'k_point_frac_coords': self._k_point_frac_coords,
+                   'k_point_weights': self._k_point_weights }
+        metadata = { 'number_of_k_points': self._number_of_k_points,
+                     'number_of_bands': self._number_of_bands,
+                     'number_of_ions': self._number_of_ions,
+                     'number_of_projections': self._number_of_projections,
+                     'k_point_blocks': self._k_point_blocks,
+                     'spin_channels': self._spin_channels,
+                     'calculation': self.calculation }
+        return arrays, metadata
+
+    def _set_arrays( self, arrays, metadata ):
+        """Set the data for this :obj:`Procar` from arrays and metadata, as returned by ``_get_arrays()``.
+
+        Args:
+            arrays (dict): The arrays, keyed by name.
+            metadata (dict): The metadata, keyed by name.
+
+        Returns:
+            None
+
+        """
+        self._number_of_k_points = metadata[ 'number_of_k_points' ]
+        self._number_of_bands = metadata[ 'number_of_bands' ]
+        self._number_of_ions = metadata[ 'number_of_ions' ]
+        self._number_of_projections = metadata[ 'number_of_projections' ]
+        self._k_point_blocks = metadata[ 'k_point_blocks' ]
+        self._spin_channels = metadata[ 'spin_channels' ]
+        self.calculation = metadata[ 'calculation' ]
+        self._data = arrays[ 'data' ]
+        self._k_point_frac_coords = arrays[ 'k_point_frac_coords' ]
+        self._k_point_weights = arrays[ 'k_point_weights' ]
+        self._band_numbers = arrays[ 'band_numbers' ]
+        self._band_energies = arrays[ 'energies' ]
+        self._band_occupancies = arrays[ 'occupancies' ]
+
+    def _read_from_cache( self, filename ):
+        """Reads the projected wavefunction character of each band from the binary cache 
+        for a VASP PROCAR file. The projection data are memory-mapped, not read into memory.
+
+        Args:
+            filename (str): Filename of the PROCAR file.
+
+        Returns:
+            (bool): True if a valid cache was read. False if there is no cache, or if the
+                cache is older than the PROCAR file.
+
+        """
+        cached = read_array_cache( filename )
+        if cached is None:
+            return False
+        self._set_arrays( *cached )
+        self.filename = filename
+        self.sanity_check()
+        return True
 
     @property
     def number_of_k_points( self ):
         """The number of k-points described by this :obj:`Procar` object."""
-        assert( self._number_of_k_points == self._data.shape[0] ), "Number of k-points in metadata ({}) not equal to number in PROCAR data ({})".format( self._number_of_k_points, self._data.shape[0] )
+        assert( self._number_of_k_points == self._projection_data.shape[0] ), "Number of k-points in metadata ({}) not equal to number in PROCAR data ({})".format( self._number_of_k_points, self._projection_data.shape[0] )
         return self._number_of_k_points
 
     @property
     def number_of_bands( self ):
         """The number of bands described by this :obj:`Procar` object."""
-        assert( self._number_of_bands == self._data.shape[1] ), "Number of bands in metadata ({}) not equal to number in PROCAR data ({})".format( self._number_of_bands, self._data.shape[1] )
+        assert( self._number_of_bands == self._projection_data.shape[1] ), "Number of bands in metadata ({}) not equal to number in PROCAR data ({})".format( self._number_of_bands, self._projection_data.shape[1] )
         return self._number_of_bands
 
     @property
     def spin_channels( self ):
         """The number of spin-channels described by this :obj:`Procar` object."""
-        assert( self._spin_channels == self._data.shape[2] ), "Number of spin channels in metadata ({}) not equal to number in PROCAR data ({})".format( self._spin_channels, self._data.shape[2] )
+        assert( self._spin_channels == self._projection_data.shape[2] ), "Number of spin channels in metadata ({}) not equal to number in PROCAR data ({})".format( self._spin_channels, self._projection_data.shape[2] )
         return self._spin_channels
 
     @property
     def number_of_ions( self ):
         """The number of ions described by thie :obj:`Procar` object."""
-        assert( self._number_of_ions == self._data.shape[3]-1 ), "Number of ions in metadata ({}) not equal to number in PROCAR data ({})".format( self._number_of_ions, self._data.shape[3]-1 )
+        assert( self._number_of_ions == self._projection_data.shape[3]-1 ), "Number of ions in metadata ({}) not equal to number in PROCAR data ({})".format( self._number_of_ions, self._projection_data.shape[3]-1 )
         return self._number_of_ions
 
     @property
     def number_of_projections( self ):
         """The number of lm-projections described by this :obj:`Procar` object."""
-        assert (self._number_of_projections == self._data.shape[4]), "Number of projections in metadata ({}) not equal to number in PROCAR data ({})".format( self._number_of_projections, self._data.shape[4] ) 
+        assert (self._number_of_projections == self._projection_data.shape[4]), "Number of projections in metadata ({}) not equal to number in PROCAR data ({})".format( self._number_of_projections, self._projection_data.shape[4] ) 
         return self._number_of_projections
 
-    def print_weighted_band_structure( self, spins=None, ions=None, orbitals=None, scaling=1.0, e_fermi=0.0, reciprocal_lattice=None ):
+    def print_weighted_band_structure( self, spins=None, ions=None, orbitals=None, scaling=1.0, e_fermi=0.0, 
+                                       reciprocal_lattice=None, stream=None, fmt='%.10g' ):
+        """Write the weighted band structure, as blocks of ( x, energy, weight ) rows for each band.
+
+        Each band is formatted with a single string-formatting operation and written to the
+        output stream as one block.
+
+        Args:
+            spins, ions, orbitals, scaling, e_fermi, reciprocal_lattice: See ``weighted_band_structure()``.
+            stream (:obj:`file`, optional): Output stream. Default is ``sys.stdout``.
+            fmt (:obj:`str`, optional): Format string for each value. Default is ``'%.10g'``.
+
+        Returns:
+            None
+
+        """
+        if stream is None:
+            stream = sys.stdout
         band_structure_data = self.weighted_band_structure( spins=spins, ions=ions, orbitals=orbitals, scaling=scaling, e_fermi=e_fermi, reciprocal_lattice=reciprocal_lattice ) 
+        row_format = ' '.join( [ fmt ] * 3 ) + '\n'
+        block_format = row_format * band_structure_data.shape[1]
         for i, band_data in enumerate( band_structure_data, 1 ):
-            print( '# band: {}'.format( i ) )
-            for k_point_data in band_data:
-                print( ' '.join( [ str(f) for f in k_point_data ] ) )
-            print()
+            stream.write( '# band: {}\n'.format( i ) + block_format % tuple( band_data.ravel() ) + '\n' )
 
     def weighted_band_structure( self, spins=None, ions=None, orbitals=None, scaling=1.0, e_fermi=0.0, reciprocal_lattice=None ):
+        """Band energies and projected weights, for plotting a "fat-band" band structure.
+
+        Args:
+            spins (:obj:`list(int)`, optional): Spin channels (counting from 1) to sum the projections over.
+                Default is all spin channels.
+            ions (:obj:`list(int)`, optional): Ion indices (counting from 0) to sum the projections over.
+                Default is the total over all ions.
+            orbitals (:obj:`list(int)`, optional): lm-projection indices to sum the projections over.
+                Default is all projections.
+            scaling (:obj:`float`, optional): Scaling factor for the projected weights. Default is 1.0.
+            e_fermi (:obj:`float`, optional): Reference energy subtracted from the band energies. Default is 0.0.
+            reciprocal_lattice (:obj:`np.array`, optional): 3x3 Cartesian reciprocal lattice,
+                used to generate the x-axis values. See ``x_axis()``. Default is ``None``.
+
+        Returns:
+            (np.array): ( number_of_bands, number_of_k_points, 3 ) numpy array of
+                ( x, energy, weight ) values.
+
+        """
         if spins:
             spins = [ s - 1 for s in spins ]
         else:
@@ -379,36 +924,102 @@ class Procar:
         if not orbitals:
             orbitals = list( range( self.number_of_projections ) )
         if self.calculation[ 'spin_polarised' ]:
-            band_energies = np.array( [ band.energy for band in self._bands ] ).reshape( self.spin_channels, self.number_of_k_points, self.number_of_bands )[ spins[0] ].T
+            band_energies = self._band_energies[ spins[0] ].T
         else:
-            band_energies = np.array( [ band.energy for band in self._bands ] ).reshape( self.number_of_k_points, self.number_of_bands ).T
-        orbital_projection = np.sum( self._data[ :, :, :, :, orbitals ], axis = 4 )
-        ion_projection = np.sum( orbital_projection[ :, :, :, ions ], axis = 3 )
-        spin_projection = np.sum( ion_projection[ :, :, spins ], axis = 2 )
+            band_energies = self._band_energies[ 0 ].T
+        projection = self._data[ :, :, spins ][ :, :, :, ions ][ :, :, :, :, orbitals ].sum( axis=( 2, 3, 4 ) )
         x_axis = self.x_axis( reciprocal_lattice )
-        to_return = []
-        for i in range( self.number_of_bands ):
-            for k, ( e, p ) in enumerate( zip( band_energies[i], spin_projection.T[i] ) ):
-                to_return.append( [ x_axis[ k ], e - e_fermi, p * scaling ] )
-        to_return = np.array( to_return ).reshape( self.number_of_bands, -1, 3 )
+        to_return = np.empty( ( self.number_of_bands, self.number_of_k_points, 3 ) )
+        to_return[ :, :, 0 ] = x_axis
+        to_return[ :, :, 1 ] = band_energies - e_fermi
+        to_return[ :, :, 2 ] = projection.T * scaling
         return to_return
 
     def effective_mass_calc( self, k_point_indices, band_index, reciprocal_lattice, spin=1, printing=False ):
-        assert( spin <= self.k_point_blocks )
+        assert( spin <= self._k_point_blocks )
         assert( len( k_point_indices ) > 1 ) # we need at least 2 k-points
-        band_energies = self._bands[:,1:].reshape( self.k_point_blocks, self.number_of_k_points, self.number_of_bands )
-        frac_k_point_coords = np.array( [ self._k_points[ k - 1 ].frac_coords for k in k_point_indices ] )
-        eigenvalues = np.array( [ band_energies[ spin - 1 ][ k - 1 ][ band_index - 1 ] for k in k_point_indices ] )
         if printing:
+            k = np.asarray( k_point_indices ) - 1
+            eigenvalues = self._band_energies[ spin - 1, k, band_index - 1 ]
             print( '# h k l e' )
-            [ print( ' '.join( [ str( f ) for f in row ] ) ) for row in np.concatenate( ( frac_k_point_coords, np.array( [ eigenvalues ] ).T ), axis = 1 ) ]
+            [ print( ' '.join( [ str( f ) for f in row ] ) ) for row in np.concatenate( ( self._k_point_frac_coords[ k ], np.array( [ eigenvalues ] ).T ), axis = 1 ) ]
+        return self.effective_masses( [ k_point_indices ], reciprocal_lattice, band_indices=[ band_index ], spin=spin )[ 0, 0 ]
+
+    def effective_masses( self, k_point_segments, reciprocal_lattice, band_indices=None, spin=1, tolerance=1e-7 ):
+        """Calculate effective masses for a set of bands along a set of k-point segments.
+
+        For segments of two k-points the effective mass is calculated as for 
+        :func:`two_point_effective_mass`. For longer segments the band energies are fitted 
+        to a quadratic in the distance from the first k-point, as for 
+        :func:`least_squares_effective_mass`. All the quadratic fits, for every segment and band, 
+        are solved together as one stacked least-squares problem. Shorter segments are padded 
+        with zero-weighted rows.
+
+        Args:
+            k_point_segments (list(list(int))): Each segment is a list of at least two collinear
+                k-point indices (counting from 1).
+            reciprocal_lattice (np.array): 3x3 Cartesian reciprocal lattice, as read from
+                a VASP ``OUTCAR`` file.
+            band_indices (:obj:`list(int)`, optional): Band indices (counting from 1). 
+                Default is all bands.
+            spin (:obj:`int`, optional): Spin channel (counting from 1). Default is 1.
+                Only spin-polarised calculations have band energies for a second spin channel.
+            tolerance (:obj:`float`, optional): The maximum triangle size for the k-points in 
+                each segment to be considered collinear. Default is 1e-7.
+
+        Returns:
+            (np.array): ( number of segments, number of bands ) numpy array of effective masses.
+
+        Notes:
+            If the k-points in any segment do not sit on a straight line, or if ``spin`` is not 
+            a spin channel in the band energies, a ValueError will be raised.
+
+        """
+        spin_blocks = self._band_energies.shape[0]
+        if not 1 <= spin <= spin_blocks:
+            raise ValueError( 'spin must be between 1 and {}: {}'.format( spin_blocks, spin ) )
+        if band_indices is None:
+            band_indices = np.arange( 1, self._number_of_bands + 1 )
+        band_indices = np.atleast_1d( band_indices ) - 1
+        lengths = np.array( [ len( segment ) for segment in k_point_segments ] )
+        if lengths.min() < 2:
+            raise ValueError( 'Each k-point segment needs at least two k-points' )
+        mask = np.arange( lengths.max() ) < lengths[ :, np.newaxis ]
+        k_point_indices = np.zeros( mask.shape, dtype=int )
+        k_point_indices[ mask ] = np.concatenate( [ np.asarray( segment ) - 1 for segment in k_point_segments ] )
         reciprocal_lattice = reciprocal_lattice * 2 * math.pi * angstrom_to_bohr
-        cart_k_point_coords = np.array( [ k.cart_coords( reciprocal_lattice ) for k in k_points ] ) # convert k-points to cartesian
-        if len( k_point_indices ) == 2:
-            effective_mass_function = two_point_effective_mass
-        else:
-            effective_mass_function = least_squares_effective_mass
-        return effective_mass_function( cart_k_point_coords, eigenvalues )
+        cart_k_point_coords = np.dot( self._k_point_frac_coords[ k_point_indices ], reciprocal_lattice )
+        dk = cart_k_point_coords - cart_k_point_coords[ :, :1 ]
+        areas = 0.5 * np.linalg.norm( np.cross( dk[ :, 1:2 ], dk[ :, 2: ] ), axis=-1 )
+        if ( areas[ mask[ :, 2: ] ] > tolerance ).any():
+            raise ValueError( 'k-points are not collinear' )
+        mod_dk = np.linalg.norm( dk, axis=-1 )
+        eigenvalues = self._band_energies[ spin - 1 ][ k_point_indices ][ :, :, band_indices ] * mask[ :, :, np.newaxis ]
+        design = np.stack( ( mod_dk**2, mod_dk, np.ones_like( mod_dk ) ), axis=-1 ) * mask[ :, :, np.newaxis ]
+        curvature = np.matmul( np.linalg.pinv( design ), eigenvalues )[ :, 0 ]
+        two_point = lengths == 2
+        curvature[ two_point ] = ( ( eigenvalues[ two_point, 1 ] - eigenvalues[ two_point, 0 ] ) 
+                                   / mod_dk[ two_point, 1, np.newaxis ]**2 )
+        return 1.0 / ( curvature * ev_to_hartree * 2.0 )
+
+    def band_edges( self, spin=1, occupancy_threshold=0.5 ):
+        """Indices of the highest occupied and lowest unoccupied bands.
+
+        Args:
+            spin (:obj:`int`, optional): Spin channel (counting from 1). Default is 1.
+            occupancy_threshold (:obj:`float`, optional): Bands with occupancies above this value 
+                at any k-point are considered occupied. Default is 0.5.
+
+        Returns:
+            (int, int): The band indices (counting from 1) of the highest occupied band 
+                and the lowest unoccupied band.
+
+        """
+        occupied = ( self._band_occupancies[ spin - 1 ] > occupancy_threshold ).any( axis=0 )
+        highest_occupied = int( np.flatnonzero( occupied ).max() ) + 1
+        if highest_occupied == self._number_of_bands:
+            raise ValueError( 'All bands are occupied' )
+        return highest_occupied, highest_occupied + 1
 
     def x_axis( self, reciprocal_lattice=None ):
         """Generate the x-axis values for a band-structure plot.
@@ -426,15 +1037,11 @@ class Procar:
  
         """
         if reciprocal_lattice is not None:
-            cartesian_k_points = np.array( [ k.cart_coords( reciprocal_lattice ) for k in k_points ] )
-            x_axis = [ 0.0 ]
-            for i in range( 1, len( cartesian_k_points ) ):
-                dk = cartesian_k_points[ i - 1 ] - cartesian_k_points[ i ]
-                mod_dk = np.sqrt( np.dot( dk, dk ) )
-                x_axis.append( mod_dk + x_axis[-1] )
-            x_axis = np.array( x_axis )
+            cartesian_k_points = np.dot( self._k_point_frac_coords, reciprocal_lattice )
+            mod_dk = np.linalg.norm( np.diff( cartesian_k_points, axis=0 ), axis=1 )
+            x_axis = np.concatenate( ( [ 0.0 ], np.cumsum( mod_dk ) ) )
         else:
-            x_axis = np.arange( len( self._k_points ) )
+            x_axis = np.arange( len( self._k_point_weights ) )
         return x_axis
 
     @property
@@ -446,18 +1053,66 @@ class Procar:
     @property
     def k_points( self ):
         return self._k_points
+
+    @property
+    def band_energies( self ):
+        return self._band_energies
+
+    @property
+    def band_occupancies( self ):
+        return self._band_occupancies
+
+    @property
+    def k_point_frac_coords( self ):
+        return self._k_point_frac_coords
+
+    @property
+    def k_point_weights( self ):
+        return self._k_point_weights
  
     def select_bands_by_kpoint( self, band_indices ):
         return np.ravel( self.bands[:,band_indices,:] )
 
     def select_k_points( self, band_indices ):
-        new_procar = deepcopy( self )
-        new_procar._bands = np.ravel( new_procar.bands[:,band_indices,:] )
-        new_procar._data = np.array( [ kp for i, kp in enumerate( new_procar._data ) if i in band_indices ] )
-        new_procar._number_of_k_points = len( band_indices )
-        new_procar._k_points = [ kp for i, kp in enumerate( new_procar._k_points ) if i in band_indices ]
-        for i, kp in enumerate( new_procar._k_points, 1 ):
-            kp.index = i
+        """Select a subset of k-points, as a new :obj:`Procar` object.
+
+        Args:
+            band_indices (list(int)): Indices of the k-points to select (counting from 0).
+
+        Returns:
+            (:obj:`vasppy.Procar`)
+
+        """
+        return self._select( k_points=band_indices )
+
+    def _select( self, k_points=None, bands=None, ions=None, orbitals=None ):
+        """Select a subset of k-points, bands, ions, and lm-projections, as a new :obj:`Procar` object.
+
+        The selection uses numpy fancy indexing on each array. The ``tot`` row (the sum over 
+        all ions) is always kept as the last ion row.
+
+        Args:
+            k_points, bands, ions, orbitals (:obj:`list(int)`, optional): Indices (counting from 0)
+                of the k-points, bands, ions, and lm-projections to select. Default is all.
+
+        Returns:
+            (:obj:`vasppy.Procar`)
+
+        """
+        k_points = np.arange( self._number_of_k_points ) if k_points is None else np.atleast_1d( k_points )
+        bands = np.arange( self._number_of_bands ) if bands is None else np.atleast_1d( bands )
+        ion_rows = None if ions is None else np.append( ions, self._number_of_ions )
+        new_procar = copy( self )
+        new_procar.calculation = dict( self.calculation )
+        new_procar._data = self.projections( k_points=k_points, bands=bands, ions=ion_rows, orbitals=orbitals )
+        new_procar._band_numbers = self._band_indices[ 0, 0, bands ]
+        new_procar._band_energies = self._band_energies[ :, k_points ][ :, :, bands ]
+        new_procar._band_occupancies = self._band_occupancies[ :, k_points ][ :, :, bands ]
+        new_procar._k_point_frac_coords = self._k_point_frac_coords[ k_points ]
+        new_procar._k_point_weights = self._k_point_weights[ k_points ]
+        new_procar._number_of_k_points, new_procar._number_of_bands = len( k_points ), len( bands )
+        new_procar._number_of_ions = new_procar._projection_data.shape[3] - 1
+        new_procar._number_of_projections = new_procar._projection_data.shape[4]
         new_procar.sanity_check()
         return new_procar
 
@@ -1,11 +1,164 @@
+import os
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from scipy.ndimage.filters import gaussian_filter1d
+from vasppy.cell import neighbour_pairs, perpendicular_widths, minimum_image_distances
 
 """
 This module provides classes for calculating radial disitrbution functions
 and Van Hove correlation functions.
 """
 
+def frame_pairs(matrix, frac_coords_i, frac_coords_j, r_max):
+    """
+    Find the minimum-image i-j pairs separated by no more than r_max in one frame.
+
+    If r_max is no more than half the smallest perpendicular width of the cell,
+    a linked-cell neighbour list is used. Otherwise the full N_i x N_j matrix of
+    minimum-image distances is calculated.
+
+    Args:
+        matrix (np.array): 3x3 cell matrix.
+        frac_coords_i (np.array): (N_i,3) fractional coordinates of the atoms i.
+        frac_coords_j (np.array): (N_j,3) fractional coordinates of the atoms j.
+        r_max (float): The maximum separation.
+
+    Returns:
+        (np.array(int), np.array(int), np.array(float)): The indices into `frac_coords_i`
+            and `frac_coords_j` of each pair, and the separation of each pair.
+
+    """
+    if r_max <= 0.5 * min(perpendicular_widths(matrix)):
+        return neighbour_pairs(matrix, frac_coords_i, frac_coords_j, r_max)
+    dr_ij = minimum_image_distances(matrix, frac_coords_i, frac_coords_j)
+    i, j = np.nonzero(dr_ij <= r_max)
+    return i, j, dr_ij[i, j]
+
+def share_array(array):
+    """
+    Copy a numpy array into a new block of shared memory, so that worker processes 
+    can read it without it being pickled.
+
+    Args:
+        array (np.array): The array to share.
+
+    Returns:
+        (multiprocessing.shared_memory.SharedMemory, tuple): The shared memory block, 
+            which the caller must close and unlink, and a (name, shape, dtype) descriptor
+            for :func:`attach_array`.
+
+    """
+    # shared_memory needs Python 3.8, so it is only imported when n_jobs > 1
+    from multiprocessing import shared_memory
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+def attach_array(descriptor):
+    """
+    Attach to an array in shared memory created by :func:`share_array`.
+
+    Args:
+        descriptor (tuple): The (name, shape, dtype) descriptor returned by :func:`share_array`.
+
+    Returns:
+        (multiprocessing.shared_memory.SharedMemory, np.array): The shared memory block,
+            which the caller must close, and the array view of it.
+
+    """
+    from multiprocessing import shared_memory
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def resolve_n_jobs(n_jobs):
+    """
+    The number of worker processes to use for an `n_jobs` argument.
+
+    Args:
+        n_jobs (int): Number of worker processes. `None` or -1 uses one process per CPU.
+
+    Returns:
+        (int): The number of worker processes.
+
+    Raises:
+        ValueError: If `n_jobs` is 0 or less than -1.
+
+    """
+    if n_jobs is None or n_jobs == -1:
+        return os.cpu_count() or 1
+    if n_jobs < 1:
+        raise ValueError('n_jobs must be a positive integer, -1, or None: {}'.format(n_jobs))
+    return n_jobs
+
+def map_frame_chunks(function, n_frames, n_jobs):
+    """
+    Split a range of frames into one chunk per worker, and map a function over 
+    the chunks in a process pool.
+
+    Args:
+        function (callable): Function taking a 1D array of frame indices.
+        n_frames (int): Number of frames.
+        n_jobs (int): Number of worker processes. `None` or -1 uses one process per CPU.
+
+    Returns:
+        (list): The result for each chunk.
+
+    """
+    n_jobs = resolve_n_jobs(n_jobs)
+    chunks = [c for c in np.array_split(np.arange(n_frames), n_jobs) if len(c)]
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        return list(executor.map(function, chunks))
+
+def _rdf_frames(frames, coordinates, lattices, weights, indices_i, indices_j, 
+                nbins, r_min, r_max):
+    """
+    Accumulate the RDF histograms for a chunk of frames.
+    The fractional coordinates are read from shared memory.
+
+    Returns:
+        (RDFAccumulator): The accumulated histograms for this chunk.
+
+    """
+    shm, frac_coords = attach_array(coordinates)
+    try:
+        accumulator = RDFAccumulator(indices_i, indices_j, nbins=nbins, r_min=r_min, r_max=r_max)
+        for frame in frames:
+            accumulator.add_frame(frac_coords[frame], lattices[frame], weight=weights[frame])
+    finally:
+        shm.close()
+    return accumulator
+
+def _van_hove_frames(frames, coordinates, matrix, indices, d_steps, nbins, r_max):
+    """
+    Accumulate the self and distinct Van Hove histograms for a chunk of time origins.
+    The fractional coordinates are read from shared memory, or can be passed as an array.
+
+    Returns:
+        (np.array, np.array): The summed distinct and self histograms.
+
+    """
+    if isinstance(coordinates, np.ndarray):
+        shm, frac_coords = None, coordinates
+    else:
+        shm, frac_coords = attach_array(coordinates)
+    try:
+        rho = len(indices) / abs(np.linalg.det(matrix))
+        gdrt = np.zeros(nbins)
+        gsrt = np.zeros(nbins)
+        for frame in frames:
+            i, j, dr_ij = frame_pairs(matrix, frac_coords[frame, indices], 
+                                      frac_coords[frame + d_steps, indices], r_max)
+            distinct = i != j
+            gdrt += np.histogram(dr_ij[distinct], bins=nbins, range=(0.0, r_max), density=False)[0] / rho
+            gsrt += np.histogram(dr_ij[~distinct], bins=nbins, range=(0.0, r_max), density=False)[0] / rho
+    finally:
+        if shm is not None:
+            shm.close()
+    return gdrt, gsrt
+
 class RadialDistributionFunction(object):
     """
     Class for computing radial distribution functions.
@@ -22,7 +175,7 @@ class RadialDistributionFunction(object):
     """
     
     def __init__(self, structures, indices_i, indices_j=None, 
-                 nbins=500, r_min=0.0, r_max=10.0, weights=None):
+                 nbins=500, r_min=0.0, r_max=10.0, weights=None, n_jobs=1):
         """
         Initialise a RadialDistributionFunction instance.
 
@@ -36,11 +189,18 @@ class RadialDistributionFunction(object):
             rmax (:obj:`float`, optional): Maximum r value. Optional, default is 10.0.
             weights (:obj:`list(int)`, optional): List of weights for each structure.
                 Optional, default is `None`.
+            n_jobs (:obj:`int`, optional): Number of worker processes. If more than 1, the 
+                structures are split into one chunk of frames per process, each chunk is 
+                histogrammed independently, and the partial histograms and coordination
+                numbers are summed. The fractional coordinates are passed to the workers
+                through shared memory, which needs Python 3.8 or later. Set to `None` or -1 
+                to use one process per CPU. Optional, default is 1 (serial).
 
         Returns:
              None
 
         """
+        n_jobs = resolve_n_jobs(n_jobs)
         if weights:
             if len(weights) != len(structures):
                 raise ValueError('List of structure weights needs to be the same length'
@@ -60,14 +220,29 @@ class RadialDistributionFunction(object):
         ff = shell_volumes(self.intervals)
         self.coordination_number = np.zeros(nbins)
         self.rdf = np.zeros((nbins), dtype=np.double)
-        for structure, weight in zip(structures, weights):
-            hist = np.histogram(self.__dr_ij(structure), 
-                                bins=nbins, 
-                                range=(r_min, r_max), 
-                                density=False)[0]
-            rho = float(len(self.indices_i)) / structure.lattice.volume
-            self.rdf += hist * weight / rho
-            self.coordination_number += np.cumsum(hist)
+        if n_jobs == 1:
+            for structure, weight in zip(structures, weights):
+                hist = np.histogram(self.__dr_ij(structure), 
+                                    bins=nbins, 
+                                    range=(r_min, r_max), 
+                                    density=False)[0]
+                rho = float(len(self.indices_i)) / structure.lattice.volume
+                self.rdf += hist * weight / rho
+                self.coordination_number += np.cumsum(hist)
+        else:
+            shm, coordinates = share_array(np.array([s.frac_coords for s in structures]))
+            try:
+                worker = partial(_rdf_frames, coordinates=coordinates,
+                                 lattices=np.array([s.lattice.matrix for s in structures]),
+                                 weights=np.array(weights, dtype=float),
+                                 indices_i=self.indices_i, indices_j=None if self.self_reference else self.indices_j,
+                                 nbins=nbins, r_min=r_min, r_max=r_max)
+                for accumulator in map_frame_chunks(worker, len(structures), n_jobs):
+                    self.rdf += accumulator.histogram
+                    self.coordination_number += accumulator.cumulative_histogram
+            finally:
+                shm.close()
+                shm.unlink()
         self.rdf = self.rdf / ff / sum(weights) / float(len(indices_j))
         self.coordination_number = self.coordination_number / sum(weights) / float(len(self.indices_j))
 
@@ -111,20 +286,61 @@ class RadialDistributionFunction(object):
             indices_j = None
         return cls(structures, indices_i, indices_j, **kwargs)
 
+    @classmethod
+    def from_trajectory(cls, frac_coords, lattice, indices_i, indices_j=None, 
+                        nbins=500, r_min=0.0, r_max=10.0, weights=None):
+        """
+        Initialise a RadialDistributionFunction instance from an array of fractional
+        coordinates, e.g. the memory-mapped frames of a binary trajectory
+        (see :func:`vasppy.xdatcar.Xdatcar.from_binary`).
+
+        Args:
+            frac_coords (np.array): (n_frames,n_atoms,3) fractional coordinates.
+            lattice (np.array): The 3x3 cell matrix, or a (n_frames,3,3) array of cell
+                matrices for a variable-cell trajectory. Each frame is normalised by
+                the volume of its own cell.
+            indices_i (list(int)): List of indices for species i.
+            indices_j (:obj:`list(int)`, optional): List of indices for species j. Optional,
+                default is `None`.
+            nbins (:obj:`int`, optional): Number of bins used for the RDF. Optional, default is 500.
+            r_min (:obj:`float`, optional): Minimum r value. Optional, default is 0.0.
+            r_max (:obj:`float`, optional): Maximum r value. Optional, default is 10.0.
+            weights (:obj:`list(float)`, optional): List of weights for each frame. Optional,
+                default is `None`.
+
+        Returns:
+            (RadialDistributionFunction)
+
+        """
+        if weights is not None and len(weights) != len(frac_coords):
+            raise ValueError('List of structure weights needs to be the same length'
+                ' as the list of structures.')
+        accumulator = RDFAccumulator(indices_i, indices_j, nbins=nbins, r_min=r_min, r_max=r_max)
+        return accumulator.partial_fit(frac_coords, lattice=lattice, weights=weights).result()
+
     def __dr_ij(self, structure):
         """
-        Calculate all i-j interatomic distances for a single pymatgen Structure.
+        Calculate the i-j interatomic distances for a single pymatgen Structure.
+
+        If `r_max` is no more than half the smallest perpendicular width of the cell,
+        each pair has at most one periodic image within `r_max`, and only the
+        distances up to `r_max` are found, using a linked-cell neighbour list.
+        Otherwise the full N_i x N_j matrix of minimum-image distances is calculated.
 
         Args:
             structure (:obj:`pymatgen.Structure`): A pymatgen Structure.
 
         Returns:
-            np.array: 1D numpy array of length N_i x N_j of distances.
+            np.array: 1D numpy array of distances.
 
         """
         lattice = structure.lattice
         i_frac_coords = structure.frac_coords[self.indices_i]
         j_frac_coords = structure.frac_coords[self.indices_j]
+        r_max = self.range[1]
+        if r_max <= 0.5 * min(perpendicular_widths(lattice.matrix)):
+            return neighbour_pairs(lattice.matrix, i_frac_coords, j_frac_coords, r_max,
+                                   exclude_self=self.self_reference)[2]
         dr_ij = lattice.get_all_distances(i_frac_coords, j_frac_coords)
         # Mask dr_ij 2D array to remove i==j dr=0 terms
         mask = np.ones(dr_ij.shape, dtype=bool)
@@ -132,6 +348,345 @@ class RadialDistributionFunction(object):
             np.fill_diagonal(mask, 0)
         return np.ndarray.flatten(dr_ij[mask])
 
+class RDFAccumulator(object):
+    """
+    Incremental accumulator for radial distribution functions.
+
+    Frames are added one at a time (or from any iterable, e.g. a generator reading
+    an XDATCAR file), so the trajectory never needs to be held in memory. The running
+    histograms can be saved to a checkpoint file and reloaded to resume an analysis.
+
+    Attributes:
+        histogram (np.array(float)): Sum over frames of the weighted, density-normalised histograms.
+        cumulative_histogram (np.array(float)): Sum over frames of the cumulative histograms.
+        total_weight (float): Sum of the frame weights.
+        n_frames (int): Number of frames added.
+
+    """
+
+    def __init__(self, indices_i, indices_j=None, nbins=500, r_min=0.0, r_max=10.0):
+        """
+        Initialise an RDFAccumulator instance.
+
+        Args:
+            indices_i (list(int)): List of indices for species i.
+            indices_j (:obj:`list(int)`, optional): List of indices for species j. Optional,
+                default is `None`.
+            nbins (:obj:`int`, optional): Number of bins used for the RDF. Optional, default is 500.
+            r_min (:obj:`float`, optional): Minimum r value. Optional, default is 0.0.
+            r_max (:obj:`float`, optional): Maximum r value. Optional, default is 10.0.
+
+        Returns:
+             None
+
+        """
+        indices_i = list(indices_i)
+        indices_j = list(indices_j) if indices_j is not None and len(indices_j) else None
+        self.self_reference = (not indices_j) or (indices_j == indices_i)
+        self.indices_i = indices_i
+        self.indices_j = indices_j if indices_j else indices_i
+        self.nbins = nbins
+        self.range = (r_min, r_max)
+        self.histogram = np.zeros(nbins)
+        self.cumulative_histogram = np.zeros(nbins)
+        self.total_weight = 0.0
+        self.n_frames = 0
+
+    def add_frame(self, frac_coords, lattice, weight=1.0):
+        """
+        Add the pair distances for one frame to the running histograms.
+
+        Args:
+            frac_coords (np.array): (n_atoms,3) fractional coordinates of every atom.
+            lattice (np.array|pymatgen.Lattice|vasppy.Cell): The cell, either as a 3x3
+                matrix or an object with a `matrix` attribute.
+            weight (:obj:`float`, optional): Weight for this frame. Optional, default is 1.0.
+
+        Returns:
+             None
+
+        """
+        matrix = np.asarray(getattr(lattice, 'matrix', lattice), dtype=float)
+        frac_coords = np.asarray(frac_coords, dtype=float)
+        i, j, dr_ij = frame_pairs(matrix, frac_coords[self.indices_i], 
+                                  frac_coords[self.indices_j], self.range[1])
+        if self.self_reference:
+            dr_ij = dr_ij[i != j]
+        hist = np.histogram(dr_ij, bins=self.nbins, range=self.range, density=False)[0]
+        rho = float(len(self.indices_i)) / abs(np.linalg.det(matrix))
+        self.histogram += hist * weight / rho
+        self.cumulative_histogram += np.cumsum(hist)
+        self.total_weight += weight
+        self.n_frames += 1
+
+    def partial_fit(self, frames, lattice=None, weights=None):
+        """
+        Add a sequence of frames to the running histograms.
+
+        Args:
+            frames (iterable): The frames to add. Each frame can be a pymatgen Structure,
+                a (frac_coords, lattice) tuple, or a (n_atoms,3) array of fractional
+                coordinates, in which case `lattice` must be given.
+            lattice (:obj:`np.array`, optional): The cell for frames given as coordinate
+                arrays, either as one 3x3 matrix or as a (n_frames,3,3) array with a 
+                matrix for each frame (e.g. from a variable-cell trajectory).
+                Optional, default is `None`.
+            weights (:obj:`iterable(float)`, optional): Weights for each frame. Optional,
+                default is `None` (every frame has weight 1).
+
+        Returns:
+            (RDFAccumulator): This accumulator.
+
+        Raises:
+            ValueError: If the number of weights does not match the number of frames.
+                When `frames` and `weights` both have a length this is checked before
+                any frames are added.
+
+        """
+        if weights is not None and hasattr(frames, '__len__') and hasattr(weights, '__len__'):
+            if len(weights) != len(frames):
+                raise ValueError('The number of weights needs to be the same as the number of frames.')
+        check_weights = weights is not None
+        weights = iter(weights) if check_weights else iter(lambda: 1.0, None)
+        if lattice is not None:
+            lattice = np.asarray(getattr(lattice, 'matrix', lattice), dtype=float)
+        for n, frame in enumerate(frames):
+            weight = next(weights, None)
+            if weight is None:
+                raise ValueError('The number of weights needs to be the same as the number of frames.')
+            if hasattr(frame, 'frac_coords'):
+                self.add_frame(frame.frac_coords, frame.lattice, weight=weight)
+            elif isinstance(frame, tuple):
+                self.add_frame(frame[0], frame[1], weight=weight)
+            else:
+                if lattice is None:
+                    raise ValueError('A lattice is needed for frames given as coordinate arrays')
+                self.add_frame(frame, lattice[n] if lattice.ndim == 3 else lattice, weight=weight)
+        if check_weights and next(weights, None) is not None:
+            raise ValueError('The number of weights needs to be the same as the number of frames.')
+        return self
+
+    def merge(self, other):
+        """
+        Add the histograms accumulated by another RDFAccumulator to this one.
+
+        Args:
+            other (RDFAccumulator): An accumulator with the same indices and bins.
+
+        Returns:
+            (RDFAccumulator): This accumulator.
+
+        """
+        if ((other.indices_i, other.indices_j, other.nbins, other.range)
+            != (self.indices_i, self.indices_j, self.nbins, self.range)):
+            raise ValueError('RDFAccumulators with different indices or bins cannot be merged')
+        self.histogram += other.histogram
+        self.cumulative_histogram += other.cumulative_histogram
+        self.total_weight += other.total_weight
+        self.n_frames += other.n_frames
+        return self
+
+    def result(self):
+        """
+        The radial distribution function for the frames added so far.
+
+        Returns:
+            (RadialDistributionFunction)
+
+        """
+        if self.n_frames == 0:
+            raise ValueError('No frames have been added')
+        rdf = RadialDistributionFunction.__new__(RadialDistributionFunction)
+        rdf.self_reference = self.self_reference
+        rdf.indices_i = self.indices_i
+        rdf.indices_j = self.indices_j
+        rdf.nbins = self.nbins
+        rdf.range = self.range
+        rdf.intervals = np.linspace(self.range[0], self.range[1], self.nbins+1)
+        rdf.dr = (self.range[1] - self.range[0])/self.nbins
+        rdf.r = rdf.intervals[:-1]+rdf.dr/2.0
+        rdf.rdf = (self.histogram / shell_volumes(rdf.intervals) / self.total_weight 
+                   / float(len(self.indices_j)))
+        rdf.coordination_number = (self.cumulative_histogram / self.total_weight 
+                                   / float(len(self.indices_j)))
+        return rdf
+
+    def save(self, filename):
+        """
+        Save the running histograms to a checkpoint file.
+
+        Args:
+            filename (str): The checkpoint filename. The file is written in numpy `.npz`
+                format under exactly this name (no suffix is added).
+
+        Returns:
+             None
+
+        """
+        with open(filename, 'wb') as f:
+            np.savez(f, indices_i=self.indices_i, indices_j=self.indices_j,
+                     self_reference=self.self_reference, nbins=self.nbins, range=self.range,
+                     histogram=self.histogram, cumulative_histogram=self.cumulative_histogram,
+                     total_weight=self.total_weight, n_frames=self.n_frames)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reload an RDFAccumulator from a checkpoint file written by :meth:`save`, to 
+        resume adding frames.
+
+        Args:
+            filename (str): The checkpoint filename.
+
+        Returns:
+            (RDFAccumulator)
+
+        """
+        with np.load(filename) as data:
+            indices_i = data['indices_i'].tolist()
+            indices_j = None if data['self_reference'] else data['indices_j'].tolist()
+            accumulator = cls(indices_i, indices_j, nbins=int(data['nbins']), 
+                              r_min=float(data['range'][0]), r_max=float(data['range'][1]))
+            accumulator.histogram = data['histogram'].copy()
+            accumulator.cumulative_histogram = data['cumulative_histogram'].copy()
+            accumulator.total_weight = float(data['total_weight'])
+            accumulator.n_frames = int(data['n_frames'])
+        return accumulator
+
+class PartialRadialDistributionFunctions(object):
+    """
+    Class for computing every partial radial distribution function of a multi-component 
+    system in one pass over a trajectory.
+
+    Each pair distance is found once per frame, and binned into a 
+    (n_species, n_species, nbins) histogram with a single `np.bincount` over combined
+    species-pair and bin indices.
+
+    Attributes:
+        species (list(str)): The species, in order of first appearance.
+        nbins (int): Number of bins.
+        range ((float, float)): Minimum and maximum values of r.
+        intervals (np.array(float)): r values of the bin edges.
+        dr (float): bin width.
+        r (float): mid-points of each bin.
+        rdf (np.array(float)): (n_species, n_species, nbins) array of partial RDF values.
+            `rdf[a, b]` is the RDF for species_i = species[a] and species_j = species[b].
+        coordination_number (np.array(float)): (n_species, n_species, nbins) array of 
+            volume integrals of the partial RDFs.
+
+    """
+
+    def __init__(self, structures, species=None, nbins=500, r_min=0.0, r_max=10.0, weights=None):
+        """
+        Initialise a PartialRadialDistributionFunctions instance.
+
+        Args:
+            structures (iterable): The frames. Each frame can be a pymatgen Structure,
+                or a (frac_coords, lattice) tuple, in which case `species` must be given.
+                Any iterable, including a generator, can be used.
+            species (:obj:`list(str)`, optional): The species string of each atom. Optional,
+                default is `None`, which takes the species from the first Structure.
+            nbins (:obj:`int`, optional): Number of bins used for the RDF. Optional, default is 500.
+            r_min (:obj:`float`, optional): Minimum r value. Optional, default is 0.0.
+            r_max (:obj:`float`, optional): Maximum r value. Optional, default is 10.0.
+            weights (:obj:`list(float)`, optional): List of weights for each structure.
+                Optional, default is `None`.
+
+        Returns:
+             None
+
+        """
+        self.nbins = nbins
+        self.range = (r_min, r_max)
+        self.intervals = np.linspace(r_min, r_max, nbins+1)
+        self.dr = (r_max - r_min)/nbins
+        self.r = self.intervals[:-1]+self.dr/2.0
+        self.species = None
+        if species is not None:
+            self.__set_species(species)
+        histogram = None
+        cumulative_histogram = None
+        total_weight = 0.0
+        frames = iter(structures)
+        check_weights = weights is not None
+        weights = iter(lambda: 1.0, None) if weights is None else iter(weights)
+        for frame in frames:
+            try:
+                weight = next(weights)
+            except StopIteration:
+                raise ValueError('List of structure weights needs to be the same length'
+                    ' as the list of structures.')
+            if hasattr(frame, 'frac_coords'):
+                if self.species is None:
+                    self.__set_species([site.species_string for site in frame])
+                frac_coords, matrix = frame.frac_coords, frame.lattice.matrix
+            else:
+                if self.species is None:
+                    raise ValueError('species is needed for frames given as (frac_coords, lattice)')
+                frac_coords, lattice = frame
+                matrix = getattr(lattice, 'matrix', lattice)
+            hist = self.__frame_histogram(np.asarray(frac_coords), np.asarray(matrix, dtype=float))
+            volume = abs(np.linalg.det(matrix))
+            if histogram is None:
+                histogram = np.zeros(hist.shape)
+                cumulative_histogram = np.zeros(hist.shape)
+            # divide by rho_i = N_i / V
+            histogram += hist * weight * volume / self.counts[:, np.newaxis, np.newaxis]
+            cumulative_histogram += np.cumsum(hist, axis=2)
+            total_weight += weight
+        if histogram is None:
+            raise ValueError('No structures were given')
+        if check_weights and next(weights, None) is not None:
+            raise ValueError('List of structure weights needs to be the same length'
+                ' as the list of structures.')
+        n_j = self.counts[np.newaxis, :, np.newaxis]
+        self.rdf = histogram / shell_volumes(self.intervals) / total_weight / n_j
+        self.coordination_number = cumulative_histogram / total_weight / n_j
+
+    def __set_species(self, species):
+        self.species = list(dict.fromkeys(species))
+        self.species_index = np.array([self.species.index(s) for s in species])
+        self.counts = np.bincount(self.species_index, minlength=len(self.species)).astype(float)
+
+    def __frame_histogram(self, frac_coords, matrix):
+        """
+        Histogram every pair distance in one frame by species pair.
+
+        Args:
+            frac_coords (np.array): (n_atoms,3) fractional coordinates.
+            matrix (np.array): 3x3 cell matrix.
+
+        Returns:
+            np.array: (n_species, n_species, nbins) histogram.
+
+        """
+        n_species = len(self.species)
+        i, j, dr_ij = frame_pairs(matrix, frac_coords, frac_coords, self.range[1])
+        not_self = i != j
+        i, j, dr_ij = i[not_self], j[not_self], dr_ij[not_self]
+        bins = np.floor((dr_ij - self.range[0]) / self.dr).astype(int)
+        # the upper edge of the last bin is included, as in np.histogram
+        bins[dr_ij == self.range[1]] = self.nbins - 1
+        in_range = (bins >= 0) & (bins < self.nbins)
+        pair_index = self.species_index[i[in_range]] * n_species + self.species_index[j[in_range]]
+        return np.bincount(pair_index * self.nbins + bins[in_range], 
+                           minlength=n_species * n_species * self.nbins).reshape(n_species, n_species, self.nbins)
+
+    def partial(self, species_i, species_j):
+        """
+        The partial RDF and coordination number for one pair of species.
+
+        Args:
+            species_i (str): String for species i, e.g. ``"Na"``.
+            species_j (str): String for species j, e.g. ``"Cl"``.
+
+        Returns:
+            (np.array, np.array): The RDF and coordination number.
+
+        """
+        a, b = self.species.index(species_i), self.species.index(species_j)
+        return self.rdf[a, b], self.coordination_number[a, b]
+
 class VanHoveAnalysis(object):
     """
     Class for computing Van Hove correlation functions.
@@ -147,7 +702,7 @@ class VanHoveAnalysis(object):
 
     """
     
-    def __init__(self, structures, indices, d_steps, nbins=500, r_min=0.0, r_max=10.0):
+    def __init__(self, structures, indices, d_steps, nbins=500, r_min=0.0, r_max=10.0, n_jobs=1):
         """
         Initialise a VanHoveCorrelationFunction instance.
 
@@ -158,36 +713,41 @@ class VanHoveAnalysis(object):
             nbins (:obj:`int`, optional): Number of bins used for the RDF. Optional, default is 500.
             rmin (:obj:`float`, optional): Minimum r value. Optional, default is 0.0.
             rmax (:obj:`float`, optional): Maximum r value. Optional, default is 10.0.
+            n_jobs (:obj:`int`, optional): Number of worker processes. If more than 1, the time
+                origins are split into one chunk per process, and the partial histograms are
+                summed. The fractional coordinates are passed to the workers through shared
+                memory. Set to `None` or -1 to use one process per CPU. 
+                Optional, default is 1 (serial).
 
         Returns:
              None
 
         """
+        n_jobs = resolve_n_jobs(n_jobs)
         self.nbins = nbins
         self.range = (r_min, r_max)
         self.intervals = np.linspace(r_min, r_max, nbins+1)
         self.dr = (r_max - r_min)/nbins
         self.r = self.intervals[:-1]+self.dr/2.0
-        self.gdrt = np.zeros((nbins), dtype=np.double)
-        self.gsrt = np.zeros((nbins), dtype=np.double)
-        rho = len(indices) / structures[0].lattice.volume
         lattice = structures[0].lattice
-        ff = shell_volumes(intervals)
-        rho = len(indices) / lattice.volume
-        for struc_i, struc_j in zip( structures[:len(structures)-d_steps], structures[d_steps:]):
-            i_frac_coords = struc_i.frac_coords[indices]
-            j_frac_coords = struc_j.frac_coords[indices]
-            dr_ij = lattice.get_all_distances(i_frac_coords, j_frac_coords)
-            mask = np.ones(dr_ij.shape, dtype=bool)
-            np.fill_diagonal(mask, 0)
-            distinct_dr_ij = np.ndarray.flatten(dr_ij[mask])
-            hist = np.histogram(distinct_dr_ij, bins=nbins, range=(0.0, r_max), density=False)[0]
-            self.gdrt += hist / rho
-            self_dr_ij = np.ndarray.flatten(dr_ij[np.invert(mask)])
-            hist = np.histogram(self_dr_ij, bins=nbins, range=(0.0, r_max), density=False)[0]
-            self.gsrt += hist / rho
-        self.gdrt = self.gdrt / ff / (len(structures)-d_steps) / float(len(indices))
-        self.gsrt = self.gsrt / (len(structures)-d_steps) / float(len(indices))        
+        ff = shell_volumes(self.intervals)
+        n_origins = len(structures) - d_steps
+        frac_coords = np.array([s.frac_coords for s in structures])
+        indices = np.array(indices)
+        worker = partial(_van_hove_frames, matrix=lattice.matrix, indices=indices, 
+                         d_steps=d_steps, nbins=nbins, r_max=r_max)
+        if n_jobs == 1:
+            self.gdrt, self.gsrt = worker(np.arange(n_origins), coordinates=frac_coords)
+        else:
+            shm, coordinates = share_array(frac_coords)
+            try:
+                partial_histograms = map_frame_chunks(partial(worker, coordinates=coordinates), n_origins, n_jobs)
+            finally:
+                shm.close()
+                shm.unlink()
+            self.gdrt, self.gsrt = np.sum(partial_histograms, axis=0)
+        self.gdrt = self.gdrt / ff / n_origins / float(len(indices))
+        self.gsrt = self.gsrt / n_origins / float(len(indices))        
        
     def self(self, sigma=None):
         if sigma:
@@ -229,6 +789,106 @@ class VanHoveAnalysis(object):
         sigma_n_bins = sigma / self.dr
         return gaussian_filter1d(self.gdrt, sigma=sigma_n_bins)
 
+class MultiLagVanHoveAnalysis(VanHoveAnalysis):
+    """
+    Class for computing Van Hove correlation functions for many lag times
+    in a single sweep over a trajectory.
+
+    The positions of the most recent frames are kept in a ring buffer as long as the
+    largest lag, so each frame is read once, and is compared with the earlier frames
+    at every requested lag.
+    
+    Attributes:
+        lags (np.array(int)): The lags, in frames.
+        n_origins (np.array(int)): The number of time origins averaged over for each lag.
+        nbins (int): Number of bins.
+        range ((float, float)): Minimum and maximum values of r.
+        intervals (np.array(float)): r values of the bin edges.
+        dr (float): bin width.
+        r (float): mid-points of each bin.
+        gsrt (np.array(float)): (n_lags, nbins) self part of the Van Hove correlation function.
+        gdrt (np.array(float)): (n_lags, nbins) distinct part of the Van Hove correlation function.
+
+    """
+
+    def __init__(self, structures, indices, lags, origins=1, nbins=500, r_min=0.0, r_max=10.0, 
+                 lattice=None):
+        """
+        Initialise a MultiLagVanHoveAnalysis instance.
+
+        Args:
+            structures (iterable): The frames. Each frame can be a pymatgen Structure,
+                or an (n_atoms,3) array of fractional coordinates, in which case `lattice`
+                must be given. Any iterable, including a generator, can be used.
+            indices (list(int)): List of indices for species to consider.
+            lags (list(int)): The lags (numbers of steps between the structures at dt=0 and
+                dt=t) to calculate, e.g. `range(0, 100, 10)`.
+            origins (:obj:`int` or `list(int)`, optional): The time origins. If an int,
+                every `origins`-th frame is used as a time origin, and it must be at least 1.
+                Otherwise, the frame indices of the time origins. Optional, default is 1
+                (every frame).
+            nbins (:obj:`int`, optional): Number of bins. Optional, default is 500.
+            r_min (:obj:`float`, optional): Minimum r value. Optional, default is 0.0.
+            r_max (:obj:`float`, optional): Maximum r value. Optional, default is 10.0.
+            lattice (:obj:`np.array`, optional): The cell, for frames given as coordinate arrays.
+                Optional, default is `None`, which uses the lattice of the first Structure.
+
+        Returns:
+             None
+
+        """
+        self.lags = np.array(sorted(set(lags)), dtype=int)
+        if len(self.lags) == 0 or self.lags[0] < 0:
+            raise ValueError('lags must be a non-empty list of non-negative integers')
+        if isinstance(origins, (int, np.integer)):
+            if origins < 1:
+                raise ValueError('An integer origins must be at least 1')
+            is_origin = lambda t: t % origins == 0
+        else:
+            origin_set = set(origins)
+            is_origin = lambda t: t in origin_set
+        self.nbins = nbins
+        self.range = (r_min, r_max)
+        self.intervals = np.linspace(r_min, r_max, nbins+1)
+        self.dr = (r_max - r_min)/nbins
+        self.r = self.intervals[:-1]+self.dr/2.0
+        indices = np.array(indices)
+        n_lags = len(self.lags)
+        buffer_length = self.lags[-1] + 1
+        ring_buffer = None
+        gdrt = np.zeros((n_lags, nbins))
+        gsrt = np.zeros((n_lags, nbins))
+        self.n_origins = np.zeros(n_lags, dtype=int)
+        matrix = None if lattice is None else np.asarray(getattr(lattice, 'matrix', lattice), dtype=float)
+        for t, frame in enumerate(structures):
+            if hasattr(frame, 'frac_coords'):
+                if matrix is None:
+                    matrix = frame.lattice.matrix
+                frac_coords = frame.frac_coords[indices]
+            else:
+                if matrix is None:
+                    raise ValueError('A lattice is needed for frames given as coordinate arrays')
+                frac_coords = np.asarray(frame)[indices]
+            if ring_buffer is None:
+                ring_buffer = np.empty((buffer_length,) + frac_coords.shape)
+                origin_flags = np.zeros(buffer_length, dtype=bool)
+            ring_buffer[t % buffer_length] = frac_coords
+            origin_flags[t % buffer_length] = is_origin(t)
+            for k, lag in enumerate(self.lags):
+                if lag > t or not origin_flags[(t - lag) % buffer_length]:
+                    continue
+                i, j, dr_ij = frame_pairs(matrix, ring_buffer[(t - lag) % buffer_length], frac_coords, r_max)
+                distinct = i != j
+                gdrt[k] += np.histogram(dr_ij[distinct], bins=nbins, range=(0.0, r_max), density=False)[0]
+                gsrt[k] += np.histogram(dr_ij[~distinct], bins=nbins, range=(0.0, r_max), density=False)[0]
+                self.n_origins[k] += 1
+        if matrix is None:
+            raise ValueError('No structures were given')
+        rho = len(indices) / abs(np.linalg.det(matrix))
+        n_origins = np.maximum(self.n_origins, 1)[:, np.newaxis]
+        self.gdrt = gdrt / rho / shell_volumes(self.intervals) / n_origins / float(len(indices))
+        self.gsrt = gsrt / rho / n_origins / float(len(indices))
+
 def shell_volumes(intervals):
     """Volumes of concentric spherical shells.
 
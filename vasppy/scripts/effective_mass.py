@@ -3,6 +3,7 @@
 from vasppy import procar
 from vasppy.outcar import reciprocal_lattice_from_outcar
 import argparse
+import numpy as np
 
 def minimum_length( nmin ):
     class MinimumLength( argparse.Action ):
@@ -10,29 +11,43 @@ def minimum_length( nmin ):
             if not nmin <= len( values ):
                 msg = 'argument "{f}" requires at least {nmin} arguments'.format( f = self.dest, nmin = nmin )
                 raise argparse.ArgumentError( self, msg )
-            setattr( args, self.dest, values )
+            segments = getattr( args, self.dest ) or []
+            segments.append( values )
+            setattr( args, self.dest, segments )
     return MinimumLength
-            
+
 def main():
-    parser = argparse.ArgumentParser( description='Calculate an effective mass from a VASP PROCAR using a fitted quadratic' )
-    parser.add_argument( '-k', '--k-points', help='index of k-points for calculating effective mass', nargs='+', type=int, required=True, action=minimum_length( 2 ) )
-    parser.add_argument( '-b', '--band-index', help='index of band for calculating effective mass', type=int, required=True )
+    parser = argparse.ArgumentParser( description='Calculate effective masses from a VASP PROCAR using fitted quadratics' )
+    parser.add_argument( '-k', '--k-points', help='index of k-points for calculating effective mass. Repeat to give more than one k-point segment', nargs='+', type=int, required=True, action=minimum_length( 2 ) )
+    parser.add_argument( '-b', '--band-index', help='index of bands for calculating effective mass (default: the highest occupied and lowest unoccupied bands)', nargs='+', type=int )
     parser.add_argument( '-f', '--procar', help='PROCAR filename (default PROCAR)', type=str, default='PROCAR' )
     parser.add_argument( '-v', '--verbose', help='Verbose output', action='store_true' )
     parser.add_argument( '-o', '--outcar', help='OUTCAR filename (default OUTCAR)', type=str, default='OUTCAR' )
     parser.add_argument( '-s', '--spin', help='select spin channel (default 1 / non-spin-polarised)', type=int, default='1' )
     args = parser.parse_args()
 
-    reciprocal_lattice = reciprocal_lattice_from_outcar( 'OUTCAR' ) # Move reading the reciprocal lattice to procar.py
+    reciprocal_lattice = reciprocal_lattice_from_outcar( args.outcar ) # Move reading the reciprocal lattice to procar.py
 
-    pcar = procar.Procar()
-    pcar.read_from_file( args.procar )
-    effective_mass = pcar.effective_mass_calc( k_point_indices = args.k_points, 
-                                               band_index = args.band_index, 
-                                               reciprocal_lattice = reciprocal_lattice,
-                                               spin = args.spin,
-                                               printing = args.verbose )
-    print( effective_mass )
+    pcar = procar.Procar.from_file( args.procar, lazy=True )
+    if args.band_index:
+        band_indices = args.band_index
+    else:
+        band_indices = list( pcar.band_edges( spin=args.spin ) )
+    if args.verbose:
+        for segment in args.k_points:
+            k = np.array( segment ) - 1
+            print( '# h k l ' + ' '.join( [ 'e_{}'.format( b ) for b in band_indices ] ) )
+            for coords, energies in zip( pcar.k_point_frac_coords[ k ],
+                                         pcar.band_energies[ args.spin - 1 ][ k ][ :, np.array( band_indices ) - 1 ] ):
+                print( ' '.join( [ str( f ) for f in np.concatenate( ( coords, energies ) ) ] ) )
+    effective_masses = pcar.effective_masses( k_point_segments = args.k_points,
+                                              reciprocal_lattice = reciprocal_lattice,
+                                              band_indices = band_indices,
+                                              spin = args.spin )
+    print( '# k-points band effective_mass' )
+    for segment, masses in zip( args.k_points, effective_masses ):
+        for band_index, effective_mass in zip( band_indices, masses ):
+            print( '{} {} {}'.format( ','.join( [ str( k ) for k in segment ] ), band_index, effective_mass ) )
 
 if __name__ == '__main__':
     main()
@@ -44,8 +44,7 @@ def main():
     else:
         reciprocal_lattice = None
 
-    pcar = procar.Procar()
-    pcar.read_from_file( args.procar )
+    pcar = procar.Procar.from_file( args.procar )
     pcar.print_weighted_band_structure( spins = args.spins, 
                                         ions = args.ions, 
                                         orbitals = args.orbitals, 
@@ -1,26 +1,45 @@
 #! /usr/bin/env python3
 
 from vasppy.xdatcar import Xdatcar
+from vasppy.msd import frame_displacements, unwrapped_positions
 import argparse
-import copy
+import os
+import sys
+import numpy as np
 
 def parse_command_line_arguments():
     # command line arguments
-    parser = argparse.ArgumentParser()
-    parser.add_argument( 'xdatcar' )
+    parser = argparse.ArgumentParser( description='Calculate the displacement of every atom between consecutive frames of a VASP XDATCAR' )
+    parser.add_argument( 'xdatcar', help='XDATCAR filename, or a binary trajectory directory written by Xdatcar.write_binary()' )
+    parser.add_argument( '-u', '--unwrap', help='output the unwrapped Cartesian positions of every atom in every frame, instead of displacements', action='store_true' )
+    parser.add_argument( '-o', '--output', help='save the (frames, atoms, 3) array to this .npy file instead of printing it', type=str )
+    parser.add_argument( '-b', '--block-size', help='number of frames formatted and written at a time for text output (default 1000)', type=int, default=1000 )
     args = parser.parse_args()
     return( args )
 
+def read_trajectory( filename ):
+    if os.path.isdir( filename ):
+        return Xdatcar.from_binary( filename )
+    xdatcar = Xdatcar()
+    xdatcar.frames = xdatcar.read_frames( filename )
+    return xdatcar
+
+def write_blocks( data, block_size, f=None ):
+    f = f or sys.stdout
+    for start in range( 0, len( data ), block_size ):
+        np.savetxt( f, data[ start:start+block_size ].reshape( -1, 3 ), fmt='%.8f' )
+
 def main():
     args = parse_command_line_arguments()
-    xdatcar = Xdatcar()
-    xdatcar.read_from( args.xdatcar )
-    poscar1 = copy.deepcopy( xdatcar.poscar[0] )
-    for p in xdatcar.poscar[1:]:
-        poscar2 = p
-        for i, c in enumerate( poscar1.coordinates ):
-            print( ' '.join( [ str(e) for e in ( poscar1.cell.minimum_image( poscar1.coordinates[i], poscar2.coordinates[i] ).dot( poscar1.cell.matrix ) ) ] ) )
-        poscar1 = copy.deepcopy( p )
+    xdatcar = read_trajectory( args.xdatcar )
+    if args.unwrap:
+        data = unwrapped_positions( xdatcar.frames, xdatcar.lattices )
+    else:
+        data = frame_displacements( xdatcar.frames, xdatcar.lattices )
+    if args.output:
+        np.save( args.output, data )
+    else:
+        write_blocks( data, args.block_size )
 
 if __name__ == "__main__":
     main()
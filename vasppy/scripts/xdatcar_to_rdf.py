@@ -1,29 +1,42 @@
 #! /usr/bin/env python3
 
 from pymatgen.io.vasp import Xdatcar
-from vasppy.rdf import RadialDistributionFunction
+from vasppy.rdf import RadialDistributionFunction, PartialRadialDistributionFunctions
 import argparse
 import copy
 import math
 import numpy as np
+import sys
 
 def parse_command_line_arguments():
     # command line arguments
     parser = argparse.ArgumentParser()
     parser.add_argument( 'xdatcar' )
-    parser.add_argument( 'label', nargs=2 )
+    parser.add_argument( 'label', nargs='*', help='two species labels. If omitted, every partial RDF is calculated in one pass' )
     parser.add_argument( 'max_r', type=float )
     parser.add_argument( 'n_bins', type=int )
     args = parser.parse_args()
+    if len( args.label ) not in [ 0, 2 ]:
+        parser.error( 'give either two species labels, or none' )
     return( args )
 
+def print_all_partials( structures, max_r, number_of_bins ):
+    rdfs = PartialRadialDistributionFunctions( structures, nbins=number_of_bins, r_max=max_r )
+    pairs = [ ( a, b ) for a in range( len( rdfs.species ) ) for b in range( a, len( rdfs.species ) ) ]
+    print( '# r ' + ' '.join( '{}-{}'.format( rdfs.species[a], rdfs.species[b] ) for a, b in pairs ) )
+    data = np.column_stack( [ rdfs.r ] + [ rdfs.rdf[ a, b ] for a, b in pairs ] )
+    np.savetxt( sys.stdout, data, fmt='%.10g' )
+
 def main():
     args = parse_command_line_arguments()
     max_r = args.max_r
     number_of_bins = args.n_bins
+    xdatcar = Xdatcar( args.xdatcar )
+    if not args.label:
+        print_all_partials( xdatcar.structures, max_r, number_of_bins )
+        return
     species_1 = args.label[ 0 ]
     species_2 = args.label[ 1 ]
-    xdatcar = Xdatcar( args.xdatcar )
     indices_i = [ i for i, s in enumerate(xdatcar.structures[0]) 
                   if s.species_string == species_1 ]
     if not indices_i:
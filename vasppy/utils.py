@@ -1,4 +1,5 @@
 import hashlib
+import numpy as np
 from monty.io import zopen
 from pathlib import Path
 import os
@@ -85,3 +86,120 @@ def validate_checksum( filename, md5sum ):
     md5_hash = file_md5( filename=filename )
     if md5_hash != md5sum:
         raise ValueError('md5 checksums are inconsistent: {}'.format( filename ))
+
+def cache_directory( filename ):
+    """
+    The directory used to store a binary cache of the data parsed from a file.
+
+    Args:
+        filename (Str): Path for the source file.
+
+    Returns:
+        (Path): The cache directory, `filename.cache`, beside the source file.
+    """
+    return Path( '{}.cache'.format( filename ) )
+
+def source_stamp( filename ):
+    """
+    The size and modification time of a file, used to detect when a cache is stale.
+
+    Args:
+        filename (Str): Path for the source file.
+
+    Returns:
+        (dict): Dictionary with keys 'size' and 'mtime_ns'.
+    """
+    stat = os.stat( filename )
+    return { 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns }
+
+def write_arrays( directory, arrays, metadata=None ):
+    """
+    Write a set of numpy arrays, and a YAML metadata file, to a directory.
+
+    Each array is stored as a separate `.npy` file, so that it can be reloaded as a 
+    memory-mapped array. The metadata file is written last, so an interrupted write
+    leaves an invalid directory rather than a corrupt one.
+
+    Args:
+        directory (Str|Path): The directory. This is created if it does not exist.
+        arrays (dict(Str:np.array)): The arrays to be written.
+        metadata (:obj:`dict`, optional): Additional metadata to be stored with the arrays.
+            Values must be serialisable as YAML.
+
+    Returns:
+        None
+    """
+    directory = Path( directory )
+    directory.mkdir( exist_ok=True )
+    metadata_file = directory / 'metadata.yaml'
+    if metadata_file.exists():
+        metadata_file.unlink()
+    for key, array in arrays.items():
+        np.save( directory / '{}.npy'.format( key ), np.asarray( array ) )
+    metadata = dict( metadata ) if metadata else {}
+    metadata[ 'arrays' ] = sorted( arrays )
+    with open( metadata_file, 'w' ) as f:
+        yaml.safe_dump( metadata, f )
+
+def read_arrays( directory, mmap_mode='r' ):
+    """
+    Read a set of numpy arrays, written by `write_arrays()`, from a directory.
+
+    Args:
+        directory (Str|Path): The directory.
+        mmap_mode (:obj:`Str`, optional): Memory-map mode passed to `np.load()`. Default is 'r'.
+
+    Returns:
+        (dict(Str:np.array), dict)|None: The arrays and metadata. If the directory has no
+            metadata file, the return value is None.
+    """
+    directory = Path( directory )
+    metadata_file = directory / 'metadata.yaml'
+    if not metadata_file.exists():
+        return None
+    with open( metadata_file, 'r' ) as f:
+        metadata = yaml.safe_load( f )
+    arrays = { key: np.load( directory / '{}.npy'.format( key ), mmap_mode=mmap_mode )
+               for key in metadata[ 'arrays' ] }
+    return arrays, metadata
+
+def write_array_cache( filename, arrays, metadata=None ):
+    """
+    Write a set of numpy arrays to a binary cache beside a source file.
+
+    The arrays are written with `write_arrays()` to the cache directory, along with
+    the size and modification time of the source file.
+
+    Args:
+        filename (Str): Path for the source file.
+        arrays (dict(Str:np.array)): The arrays to be cached.
+        metadata (:obj:`dict`, optional): Additional metadata to be stored with the arrays.
+            Values must be serialisable as YAML.
+
+    Returns:
+        None
+    """
+    metadata = dict( metadata ) if metadata else {}
+    metadata[ 'source' ] = source_stamp( filename )
+    write_arrays( cache_directory( filename ), arrays, metadata )
+
+def read_array_cache( filename, mmap_mode='r' ):
+    """
+    Read a set of numpy arrays from the binary cache for a source file.
+
+    Args:
+        filename (Str): Path for the source file.
+        mmap_mode (:obj:`Str`, optional): Memory-map mode passed to `np.load()`. Default is 'r'.
+
+    Returns:
+        (dict(Str:np.array), dict)|None: The cached arrays and metadata. If no cache exists,
+            or the source file has changed since the cache was written, the return value is None.
+    """
+    metadata_file = cache_directory( filename ) / 'metadata.yaml'
+    if not metadata_file.exists():
+        return None
+    with open( metadata_file, 'r' ) as f:
+        metadata = yaml.safe_load( f )
+    if metadata.get( 'source' ) != source_stamp( filename ):
+        return None
+    return read_arrays( cache_directory( filename ), mmap_mode=mmap_mode )
@@ -1,9 +1,119 @@
 from vasppy.poscar import Poscar
+from vasppy.cell import Cell
+from .utils import write_array_cache, read_array_cache, write_arrays, read_arrays
+from collections import deque
+from itertools import islice
+from pathlib import Path
+import mmap
 import re
 import copy
 import numpy as np
 
+def is_frame_header( line ):
+    """
+    Test whether a line is an XDATCAR frame header, e.g. "Direct configuration=     1".
+
+    Args:
+        line (str): The line to test.
+
+    Returns:
+        (bool): True if the line is a frame header.
+    """
+    return 'configuration=' in line
+
+def parse_coordinates( lines, n_atoms ):
+    """
+    Parse a block of coordinate lines into an array.
+
+    Args:
+        lines (list(str)): The coordinate lines, with three values per line.
+        n_atoms (int): The number of atoms per frame.
+
+    Returns:
+        (np.array): (n_frames, n_atoms, 3) coordinates.
+    """
+    return np.fromstring( ''.join( lines ), sep=' ' ).reshape( -1, n_atoms, 3 )
+
+def parse_lattices( lines ):
+    """
+    Parse a block of lattice vector lines into an array of cell matrices.
+
+    Args:
+        lines (list(str)): The lattice vector lines, with three lines per cell.
+
+    Returns:
+        (np.array): (n_cells, 3, 3) cell matrices.
+    """
+    return np.fromstring( ''.join( lines ), sep=' ' ).reshape( -1, 3, 3 )
+
+def parse_scaling( line ):
+    """
+    Parse an XDATCAR scaling factor line.
+
+    Args:
+        line (str): The scaling factor line.
+
+    Returns:
+        (float): The scaling factor.
+
+    Raises:
+        ValueError: If the scaling factor is not positive. VASP reads a negative
+            scaling factor as the cell volume, which is not supported.
+    """
+    scaling = float( line.strip() )
+    if scaling <= 0.0:
+        raise ValueError( 'Only positive XDATCAR scaling factors are supported: {}'.format( scaling ) )
+    return scaling
+
+def parse_cells( headers ):
+    """
+    Parse the cell matrices from the structure headers of a variable-cell XDATCAR,
+    multiplying each cell by its scaling factor.
+
+    Args:
+        headers (list(list(str))): The seven structure header lines before each frame.
+
+    Returns:
+        (np.array): (n_cells, 3, 3) scaled cell matrices.
+    """
+    scalings = np.array( [ parse_scaling( header[1] ) for header in headers ] )
+    lattices = parse_lattices( [ line for header in headers for line in header[2:5] ] )
+    return lattices * scalings[ :, np.newaxis, np.newaxis ]
+
+def preceding_lines( mm, offset, n ):
+    """
+    The lines before a byte offset in a memory-mapped file.
+
+    Args:
+        mm (mmap.mmap): The memory-mapped file.
+        offset (int): The byte offset of the start of a line.
+        n (int): The number of lines.
+
+    Returns:
+        (list(str)): Up to n lines, including their line endings.
+    """
+    start = offset
+    for i in range( n ):
+        start = mm.rfind( b'\n', 0, max( start - 1, 0 ) ) + 1
+    return mm[ start:offset ].decode().splitlines( True )
+
 class Xdatcar:
+    """
+    Class for reading VASP XDATCAR trajectories.
+
+    For variable-cell (e.g. ISIF=3) calculations, VASP writes the structure header,
+    including the lattice vectors, before every frame. These per-frame cells are read
+    into `lattices`. For fixed-cell trajectories `lattices` repeats the header cell.
+    Every cell is multiplied by the scaling factor in its header.
+
+    Attributes:
+        poscar (list(Poscar)): The header, as a Poscar object, followed by any frames
+            read with `read_from()`.
+        frames (np.array): (n_frames, n_atoms, 3) fractional coordinates, or None.
+        lattices (np.array): (n_frames, 3, 3) cell matrices, or None.
+        filename (str): The indexed XDATCAR filename (see `load_index()`), or None.
+        frame_offsets (np.array): The byte offset of each frame in `filename`, or None.
+    """
 
     lines_offset = 9
 
@@ -19,14 +129,325 @@ class Xdatcar:
         """
         self.poscar = []
         self.poscar.append( Poscar() )
-  
-    def read_from( self, filename ):
-        self.poscar[ 0 ].read_from( filename )
+        self.filename = None
+        self.frame_offsets = None
+        self.frames = None
+        self.lattices = None
+
+    @property
+    def number_of_atoms( self ):
+        return sum( self.poscar[0].atom_numbers )
+
+    @property
+    def variable_cell( self ):
+        return self.lattices is not None and bool( np.any( self.lattices != self.lattices[0] ) )
+
+    def fixed_lattices( self, n_frames ):
+        return np.broadcast_to( self.poscar[0].cell.matrix, ( n_frames, 3, 3 ) )
+
+    def read_header( self, f ):
+        """
+        Read the XDATCAR header (title, scaling, lattice, and atom types and numbers)
+        from an open file into self.poscar[0], which is shared by every frame.
+        The scaling factor is applied to the cell matrix, and `scaling` is set to 1.0.
+
+        Args:
+            f (file): The open XDATCAR file, positioned at the start.
+
+        Returns:
+            None
+        """
+        header = self.poscar[0]
+        header.title = f.readline().strip()
+        scaling = parse_scaling( f.readline() )
+        header.cell.matrix = np.array( [ [ float( e ) for e in f.readline().split() ] for i in range( 3 ) ] ) * scaling
+        header.scaling = 1.0
+        header.cell.inv_matrix = np.linalg.inv( header.cell.matrix )
+        header.atoms = f.readline().split()
+        header.atom_numbers = [ int( element ) for element in f.readline().split() ]
+        header.coordinate_type = 'Direct'
+
+    def is_structure_header( self, lines ):
+        """
+        Test whether the seven lines before a frame header repeat the structure header,
+        as in a variable-cell XDATCAR.
+
+        Args:
+            lines (list(str)): The lines before the frame header.
+
+        Returns:
+            (bool)
+        """
+        return len( lines ) == 7 and lines[5].split() == self.poscar[0].atoms
+
+    def to_fractional( self, coordinates, frame_header, lattices=None ):
+        if re.match( r'\A\s*[CcKk]', frame_header ):
+            if lattices is None:
+                lattices = self.poscar[0].cell.matrix
+            return np.matmul( coordinates, np.linalg.inv( lattices ) )
+        return coordinates
+
+    def iter_frames( self, filename, lattices=False ):
+        """
+        Iterate over the frames in an XDATCAR file, reading one frame at a time.
+        The header is read once, into self.poscar[0].
+
+        Args:
+            filename (str): The XDATCAR filename.
+            lattices (:obj:`bool`, optional): If True, yield the cell matrix for each
+                frame with its coordinates. Default is False.
+
+        Yields:
+            (np.array): (n_atoms, 3) fractional coordinates for each frame, or a
+                (coordinates, lattice) tuple if `lattices` is True.
+                An incomplete final frame is skipped.
+        """
         with open( filename ) as f:
-            lines = f.read()
-        frame_header = re.compile( '\nDirect configuration=\s+\d+\n' )
-        frame_coordinates = [ frame.split("\n") for frame in frame_header.split( lines )[2:] ]
-        for f, frame in enumerate( frame_coordinates ):
-            self.poscar.append( copy.deepcopy( self.poscar[ 0 ] ) ) 
-            self.poscar[-1].coordinates = np.array( [ [ float( e ) for e in frame.pop(0).split()[0:3] ] for i in range( sum( self.poscar[0].atom_numbers ) ) ] )
+            self.read_header( f )
+            n_atoms = self.number_of_atoms
+            lattice = self.poscar[0].cell.matrix
+            previous_lines = deque( maxlen=7 )
+            for line in f:
+                if not is_frame_header( line ):
+                    previous_lines.append( line )
+                    continue
+                if self.is_structure_header( previous_lines ):
+                    lattice = parse_cells( [ list( previous_lines ) ] )[0]
+                previous_lines.clear()
+                lines = list( islice( f, n_atoms ) )
+                if len( lines ) < n_atoms:
+                    return
+                coordinates = self.to_fractional( parse_coordinates( lines, n_atoms )[0], line, lattice )
+                yield ( coordinates, lattice ) if lattices else coordinates
 
+    def read_frames( self, filename ):
+        """
+        Read every frame in an XDATCAR file into a single array.
+        The cell matrix for each frame is stored in `lattices`.
+
+        Args:
+            filename (str): The XDATCAR filename.
+
+        Returns:
+            (np.array): (n_frames, n_atoms, 3) fractional coordinates.
+                An incomplete final frame is skipped.
+        """
+        with open( filename ) as f:
+            self.read_header( f )
+            lines = f.readlines()
+        n_atoms = self.number_of_atoms
+        starts = [ i + 1 for i, line in enumerate( lines ) if is_frame_header( line ) ]
+        if starts and len( lines ) - starts[-1] < n_atoms:
+            starts.pop()
+        if not starts:
+            self.lattices = self.fixed_lattices( 0 )
+            return np.empty( ( 0, n_atoms, 3 ) )
+        # in a variable-cell file every frame after the first follows a structure header
+        if len( starts ) > 1 and self.is_structure_header( lines[ max( starts[1] - 8, 0 ):starts[1] - 1 ] ):
+            cells = parse_cells( [ lines[ s-8:s-1 ] for s in starts[1:] ] )
+            self.lattices = np.concatenate( [ self.poscar[0].cell.matrix[ np.newaxis ], cells ] )
+        else:
+            self.lattices = self.fixed_lattices( len( starts ) )
+        coordinates = parse_coordinates( [ line for s in starts for line in lines[ s:s+n_atoms ] ], n_atoms )
+        return self.to_fractional( coordinates, lines[ starts[0] - 1 ], self.lattices )
+
+    def build_index( self, filename ):
+        """
+        Find the byte offset of every frame header in an XDATCAR file.
+        The cell matrix for each frame is stored in `lattices`.
+
+        Args:
+            filename (str): The XDATCAR filename.
+
+        Returns:
+            (np.array): The byte offsets of the frame headers for every complete frame.
+        """
+        with open( filename ) as f:
+            self.read_header( f )
+        with open( filename, 'rb' ) as f:
+            offsets = []
+            with mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ ) as mm:
+                position = mm.find( b'configuration=' )
+                while position != -1:
+                    offsets.append( mm.rfind( b'\n', 0, position ) + 1 )
+                    position = mm.find( b'configuration=', mm.find( b'\n', position ) )
+                if offsets:
+                    f.seek( offsets[-1] )
+                    f.readline()
+                    if len( [ line for line in islice( f, self.number_of_atoms ) if line.endswith( b'\n' ) ] ) < self.number_of_atoms:
+                        offsets.pop()
+                if len( offsets ) > 1 and self.is_structure_header( preceding_lines( mm, offsets[1], 7 ) ):
+                    cells = parse_cells( [ preceding_lines( mm, offset, 7 ) for offset in offsets[1:] ] )
+                    self.lattices = np.concatenate( [ self.poscar[0].cell.matrix[ np.newaxis ], cells ] )
+                else:
+                    self.lattices = self.fixed_lattices( len( offsets ) )
+        return np.array( offsets, dtype=np.int64 )
+
+    def load_index( self, filename, cache=True ):
+        """
+        Prepare an XDATCAR file for random access to its frames, using `xdatcar[i]`.
+
+        The frame index is read from the binary cache beside the file if it is present
+        and up to date. Otherwise it is built by scanning the file, and then saved.
+
+        Args:
+            filename (str): The XDATCAR filename.
+            cache (:obj:`bool`, optional): If True, read and write the frame index cache.
+                Default is True.
+
+        Returns:
+            None
+        """
+        self.filename = filename
+        cached = read_array_cache( filename ) if cache else None
+        if cached and 'frame_offsets' in cached[0]:
+            arrays = cached[0]
+            with open( filename ) as f:
+                self.read_header( f )
+            self.frame_offsets = np.array( arrays[ 'frame_offsets' ] )
+            if 'lattices' in arrays:
+                self.lattices = np.array( arrays[ 'lattices' ] )
+            else:
+                self.lattices = self.fixed_lattices( len( self.frame_offsets ) )
+        else:
+            self.frame_offsets = self.build_index( filename )
+            if cache:
+                arrays = { 'frame_offsets': self.frame_offsets }
+                if self.variable_cell:
+                    arrays[ 'lattices' ] = self.lattices
+                write_array_cache( filename, arrays, { 'number_of_atoms': self.number_of_atoms } )
+
+    def __len__( self ):
+        if self.frames is not None:
+            return len( self.frames )
+        if self.frame_offsets is None:
+            return len( self.poscar )
+        return len( self.frame_offsets )
+
+    def __getitem__( self, key ):
+        """
+        Select frames from the trajectory. If the frames are held in an array
+        (see `read_from()` and `from_binary()`) this indexes the array directly.
+        Otherwise the frames are read from an indexed XDATCAR file (see `load_index()`),
+        seeking directly to each requested frame.
+        The matching cell matrices are given by `lattices[key]`.
+
+        Args:
+            key (int|slice|list(int)|np.array): The frame index or indices.
+
+        Returns:
+            (np.array): (n_atoms, 3) fractional coordinates for an integer index,
+                otherwise (n_frames, n_atoms, 3) fractional coordinates.
+        """
+        if self.frames is not None:
+            return self.frames[ key ]
+        if self.frame_offsets is None:
+            raise ValueError( 'No frame index: call load_index() first' )
+        indices = np.arange( len( self.frame_offsets ) )[ key ]
+        n_atoms = self.number_of_atoms
+        frames = np.empty( ( indices.size, n_atoms, 3 ) )
+        with open( self.filename, 'rb' ) as f:
+            for i, index in enumerate( indices.ravel() ):
+                f.seek( self.frame_offsets[ index ] )
+                frame_header = f.readline().decode()
+                lines = [ b''.join( islice( f, n_atoms ) ).decode() ]
+                frames[i] = self.to_fractional( parse_coordinates( lines, n_atoms )[0], frame_header,
+                                                self.lattices[ index ] )
+        return frames.reshape( indices.shape + ( n_atoms, 3 ) )
+
+    def read_from( self, filename ):
+        """
+        Read an XDATCAR file, storing each frame as a Poscar object in self.poscar.
+        Every frame shares the atom lists of self.poscar[0]. For a fixed-cell
+        trajectory every frame also shares the cell of self.poscar[0].
+
+        Args:
+            filename (str): The XDATCAR filename.
+
+        Returns:
+            None
+        """
+        frames = self.read_frames( filename )
+        self.frames = frames
+        variable_cell = self.variable_cell
+        self.poscar[0].coordinates = frames[0]
+        for frame, lattice in zip( frames[1:], self.lattices[1:] ):
+            poscar = copy.copy( self.poscar[0] )
+            poscar.coordinates = frame
+            if variable_cell:
+                poscar.cell = Cell( np.array( lattice ) )
+            self.poscar.append( poscar )
+
+    def write_binary( self, path, dtype=np.float32 ):
+        """
+        Export the trajectory to a binary directory that can be reopened with `from_binary()`.
+
+        The directory contains the coordinates, as an (n_frames, n_atoms, 3) `.npy` array,
+        the cell matrix (or an (n_frames, 3, 3) array of cell matrices for a variable-cell
+        trajectory), and a YAML header with the title and atom types and numbers.
+        For an indexed XDATCAR file (see `load_index()`) the frames are streamed from the
+        file into the output, so the trajectory is never held in memory.
+
+        Args:
+            path (str): The output directory.
+            dtype (:obj:`np.dtype`, optional): The coordinate data type. Default is np.float32.
+
+        Returns:
+            None
+        """
+        if self.frames is not None:
+            frames = self.frames
+        elif self.frame_offsets is not None:
+            frames = self.iter_frames( self.filename )
+        else:
+            raise ValueError( 'No trajectory to export: call read_from() or load_index() first' )
+        path = Path( path )
+        path.mkdir( exist_ok=True )
+        if ( path / 'metadata.yaml' ).exists():
+            ( path / 'metadata.yaml' ).unlink()
+        coordinates = np.lib.format.open_memmap( path / 'coordinates.npy', mode='w+', dtype=dtype,
+                                                 shape=( len( self ), self.number_of_atoms, 3 ) )
+        for i, frame in enumerate( frames ):
+            coordinates[i] = frame
+        coordinates.flush()
+        del coordinates
+        header = self.poscar[0]
+        metadata = { 'title': header.title,
+                     'scaling': header.scaling,
+                     'atoms': list( header.atoms ),
+                     'atom_numbers': list( header.atom_numbers ) }
+        lattice = self.lattices if self.variable_cell else header.cell.matrix
+        write_arrays( path, { 'lattice': lattice }, metadata )
+
+    @classmethod
+    def from_binary( cls, path, mmap_mode='r' ):
+        """
+        Open a binary trajectory written by `write_binary()`.
+
+        The coordinates are memory-mapped, so nothing is parsed and frames are only
+        read from disk when they are used.
+
+        Args:
+            path (str): The binary trajectory directory.
+            mmap_mode (:obj:`str`, optional): Memory-map mode passed to `np.load()`. Default is 'r'.
+
+        Returns:
+            (Xdatcar): The trajectory, with the coordinates in `frames`.
+        """
+        data = read_arrays( path, mmap_mode=mmap_mode )
+        if data is None:
+            raise ValueError( 'No binary trajectory found at {}'.format( path ) )
+        arrays, metadata = data
+        xdatcar = cls()
+        header = xdatcar.poscar[0]
+        header.title = metadata[ 'title' ]
+        header.scaling = metadata[ 'scaling' ]
+        header.atoms = metadata[ 'atoms' ]
+        header.atom_numbers = metadata[ 'atom_numbers' ]
+        lattice = arrays[ 'lattice' ]
+        header.cell.matrix = np.array( lattice[0] if lattice.ndim == 3 else lattice )
+        header.cell.inv_matrix = np.linalg.inv( header.cell.matrix )
+        xdatcar.frames = np.load( Path( path ) / 'coordinates.npy', mmap_mode=mmap_mode )
+        xdatcar.lattices = lattice if lattice.ndim == 3 else xdatcar.fixed_lattices( len( xdatcar.frames ) )
+        header.coordinates = xdatcar.frames[0]
+        return xdatcar